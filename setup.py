@@ -9,9 +9,18 @@ setup(
         version='0.1',
         author=u'Vytautas Astrauskas'.encode('utf-8'),
         author_email=u'vastrauskas@gmail.com'.encode('utf-8'),
-        packages=['nmadb_contacts',],
+        packages=[
+            'nmadb_contacts',
+            'nmadb_contacts.management',
+            'nmadb_contacts.management.commands',
+            ],
         package_dir={'': 'src'},
-        #package_data={'nmadb_contacts': []},
+        package_data={'nmadb_contacts': [
+            'sql/*.sql',
+            'templates/admin/nmadb_contacts/*.html',
+            'templates/admin/nmadb_contacts/edit_inline/*.html',
+            'templates/admin/nmadb_contacts/human/*.html',
+            ]},
                                         # List of data files to be included 
                                         # into package.
         requires=[
@@ -1,13 +1,233 @@
+import json
+
+from django.conf.urls import patterns, url
 from django.contrib import admin
+from django.contrib.admin import helpers
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList, ALL_VAR, ORDER_VAR
+from django.core import signing
+from django.core.exceptions import PermissionDenied
+from django.core.urlresolvers import reverse
+from django.db.models import Count, Q
+from django.http import HttpResponse, HttpResponseRedirect
+from django.shortcuts import render
 from django.utils.translation import ugettext as _
 
-from django_db_utils import utils as db_utils
+from nmadb_contacts import counts
+from nmadb_contacts import export
+from nmadb_contacts import facets
 from nmadb_contacts import models
 from nmadb_contacts import forms
+from nmadb_contacts import institutions
+from nmadb_contacts import mailqueue
+from nmadb_contacts import municipalities
+from nmadb_contacts import recipients
+from nmadb_contacts import search
+from nmadb_contacts import segments
+from nmadb_contacts.normalization import normalize_phone
 from nmadb_utils import admin as utils
 from nmadb_automation import mail
 
 
+class SearchChangeList(ChangeList):
+    """ Change list, which delegates searching to model admin.
+
+    If ``list_select_related`` of model admin is a tuple, only listed
+    relations are joined and ``list_only_fields`` restricts loaded
+    columns.
+    """
+
+    def get_query_set(self, request):
+        query, self.query = self.query, u''
+        try:
+            queryset = super(SearchChangeList, self).get_query_set(request)
+        finally:
+            self.query = query
+        related = self.model_admin.list_select_related
+        if isinstance(related, (list, tuple)):
+            queryset = queryset.select_related(*related)
+        only_fields = getattr(self.model_admin, 'list_only_fields', ())
+        if only_fields:
+            queryset = queryset.only(*only_fields)
+        if query:
+            queryset = self.model_admin.search(queryset, query)
+        return queryset
+
+
+HUMAN_LABEL_FIELDS = (
+        'human__id',
+        'human__first_name',
+        'human__last_name',
+        )
+"""Fields of related human used by ``Human.__unicode__``."""
+
+
+class HumanChangeList(SearchChangeList):
+    """ Change list, which in default ordering pages humans by keyset
+    ``(last_name, first_name, id)`` instead of offset and shows
+    approximate counts of large results and facet counts of filtered
+    humans.
+    """
+
+    keyset_var = 'after'
+
+    keyset_fields = ('last_name', 'first_name', 'id')
+
+    keyset_salt = 'nmadb_contacts.admin.HumanChangeList'
+
+    def get_query_set(self, request):
+        self.params.pop(self.keyset_var, None)
+        self.keyset = (
+                ORDER_VAR not in self.params and
+                ALL_VAR not in self.params)
+        queryset = super(HumanChangeList, self).get_query_set(request)
+        if self.keyset:
+            queryset = queryset.order_by(*self.keyset_fields)
+        return queryset
+
+    def get_keyset_filter(self, cursor):
+        """ Returns filter, which selects humans after ``cursor``.
+        """
+
+        try:
+            last_name, first_name, human_id = signing.loads(
+                    cursor, salt=self.keyset_salt)
+        except (signing.BadSignature, ValueError, TypeError):
+            raise IncorrectLookupParameters
+        return (
+                Q(last_name__gt=last_name) |
+                Q(last_name=last_name, first_name__gt=first_name) |
+                Q(last_name=last_name, first_name=first_name,
+                  id__gt=human_id))
+
+    @property
+    def facets(self):
+        """ Facet counts of filtered humans. Computed only when the
+        sidebar is rendered, so actions and popups do not pay for them.
+        """
+
+        if self.is_popup:
+            return []
+        if not hasattr(self, '_facets'):
+            self._facets = facets.get_facets(self.query_set)
+        return self._facets
+
+    def get_results(self, request):
+        if not self.keyset:
+            return super(HumanChangeList, self).get_results(request)
+        self.result_count, self.result_count_exact = counts.get_count(
+                self.query_set)
+        if self.query_set.query.where:
+            self.full_result_count = counts.get_count(
+                    self.root_query_set)[0]
+        else:
+            self.full_result_count = self.result_count
+        self.after = request.GET.get(self.keyset_var)
+        queryset = self.query_set
+        if self.after:
+            queryset = queryset.filter(self.get_keyset_filter(self.after))
+        rows = list(queryset[:self.list_per_page + 1])
+        self.result_list = rows[:self.list_per_page]
+        self.first_url = self.get_query_string()
+        self.next_url = None
+        if len(rows) > self.list_per_page:
+            last = self.result_list[-1]
+            self.next_url = self.get_query_string({
+                self.keyset_var: signing.dumps(
+                    [last.last_name, last.first_name, last.id],
+                    salt=self.keyset_salt),
+                })
+        self.can_show_all = False
+        self.multi_page = bool(self.after or self.next_url)
+        self.paginator = self.model_admin.get_paginator(
+                request, self.query_set, self.list_per_page)
+
+
+def set_municipality_choices(formfield):
+    """ Takes municipality choices of ``formfield`` from process local
+    cache.
+    """
+
+    formfield.choices = [(u'', formfield.empty_label)] + [
+            (municipality.pk, unicode(municipality))
+            for municipality in sorted(
+                municipalities.cache.all(),
+                key=lambda municipality: (
+                    municipality.town,
+                    municipality.municipality_type))]
+
+
+class SearchModelAdmin(utils.ModelAdmin):
+    """ Model admin, which searches humans by normalized name tokens.
+    """
+
+    list_only_fields = ()
+
+    query_budgets = {
+            'changelist': 8,
+            'change': 6,
+            }
+
+    def get_changelist(self, request, **kwargs):
+        """ Returns change list, which uses :py:meth:`search`.
+        """
+        return SearchChangeList
+
+    def search(self, queryset, query):
+        """ Filters ``queryset`` by search ``query``.
+        """
+        return search.search(queryset, query, self.search_fields)
+
+    def export_sheet_csv(self, request, queryset):
+        """ Streams selected objects as CSV file with ``sheet_mapping``
+        columns.
+        """
+        exporter = export.SheetExporter(self.model, self.sheet_mapping)
+        return exporter.csv_response(
+                queryset,
+                u'{0}.csv'.format(self.model._meta.module_name))
+    export_sheet_csv.short_description = _(u'export to CSV')
+
+    def get_mail_target(self, queryset):
+        """ Returns mail dispatch target and query set of objects, to
+        which mail is queued, for selected ``queryset``.
+        """
+        return self.model._meta.module_name, queryset
+
+    def queue_mail(self, request, queryset):
+        """ Asks for mail template and queues mail to selected objects,
+        which is sent by ``dispatch_mail`` command.
+        """
+
+        if 'apply' in request.POST:
+            form = forms.MailDispatchForm(request.POST)
+            if form.is_valid():
+                job = mailqueue.queue(
+                        *self.get_mail_target(queryset),
+                        **form.cleaned_data)
+                self.message_user(
+                        request,
+                        _(u'Queued mail to {0} objects.').format(job.total))
+                return HttpResponseRedirect(reverse(
+                    'admin:nmadb_contacts_maildispatchjob_change',
+                    args=(job.id,)))
+        else:
+            form = forms.MailDispatchForm()
+        opts = self.model._meta
+        return render(request, 'admin/nmadb_contacts/queue_mail.html', {
+            'form': form,
+            'count': self.get_mail_target(queryset)[1].count(),
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', 0),
+            'app_label': opts.app_label,
+            'verbose_name_plural': opts.verbose_name_plural,
+            'changelist_url': reverse(
+                'admin:{0.app_label}_{0.module_name}_changelist'.format(
+                    opts)),
+            })
+    queue_mail.short_description = _(u'queue mail')
+
+
 class MunicipalityAdmin(utils.ModelAdmin):
     """ Administration for municipality.
     """
@@ -29,8 +249,13 @@ class MunicipalityAdmin(utils.ModelAdmin):
             'code',
             )
 
+    query_budgets = {
+            'changelist': 8,
+            'change': 5,
+            }
 
-class AddressAdmin(utils.ModelAdmin):
+
+class AddressAdmin(SearchModelAdmin):
     """ Administration for addresses.
     """
 
@@ -39,15 +264,23 @@ class AddressAdmin(utils.ModelAdmin):
             'human',
             'town',
             'address',
-            'municipality',
+            'get_municipality',
             )
 
+    list_select_related = ('human',)
+
+    list_only_fields = (
+            'id',
+            'human',
+            'town',
+            'address',
+            'municipality',
+            ) + HUMAN_LABEL_FIELDS
+
     search_fields = (
             'town',
             'address',
-            'human__first_name',
-            'human__last_name',
-            'human__old_last_name',
+            'human__' + search.TOKEN_FIELD,
             )
 
     sheet_mapping = (
@@ -60,8 +293,29 @@ class AddressAdmin(utils.ModelAdmin):
             (_(u'Municipality'), ('municipality', 'title',)),
             )
 
+    actions = SearchModelAdmin.actions + [
+            'export_sheet_csv',
+            ]
+
+    query_budgets = dict(
+            SearchModelAdmin.query_budgets,
+            export_sheet_csv=12,
+            )
+
+    def get_municipality(self, obj):
+        """ Returns municipality from process local cache.
+        """
 
-class ContactAdmin(utils.ModelAdmin):
+        municipality = obj.get_municipality()
+        if municipality is None:
+            return u''
+        else:
+            return unicode(municipality)
+    get_municipality.short_description = _(u'municipality')
+    get_municipality.admin_order_field = 'municipality'
+
+
+class ContactAdmin(SearchModelAdmin):
     """ Administration for contacts.
     """
 
@@ -72,10 +326,17 @@ class ContactAdmin(utils.ModelAdmin):
             'used',
             )
 
+    list_select_related = ('human',)
+
+    list_only_fields = (
+            'id',
+            'human',
+            'last_time_used',
+            'used',
+            ) + HUMAN_LABEL_FIELDS
+
     search_fields = (
-            'human__first_name',
-            'human__last_name',
-            'human__old_last_name',
+            'human__' + search.TOKEN_FIELD,
             )
 
     sheet_mapping = (
@@ -87,6 +348,15 @@ class ContactAdmin(utils.ModelAdmin):
             (_(u'Used'), ('used',)),
             )
 
+    actions = SearchModelAdmin.actions + [
+            'export_sheet_csv',
+            ]
+
+    query_budgets = dict(
+            SearchModelAdmin.query_budgets,
+            export_sheet_csv=12,
+            )
+
 
 class PhoneAdmin(ContactAdmin):
     """ Administration for phones.
@@ -96,6 +366,10 @@ class PhoneAdmin(ContactAdmin):
             'number',
             )
 
+    list_only_fields = ContactAdmin.list_only_fields + (
+            'number',
+            )
+
     search_fields = ContactAdmin.search_fields + (
             'number',
             )
@@ -104,6 +378,16 @@ class PhoneAdmin(ContactAdmin):
             (_(u'Phone number'), ('number',)),
             )
 
+    def search(self, queryset, query):
+        """ Finds phones by normalized number if ``query`` is a complete
+        phone number.
+        """
+
+        key = normalize_phone(query)
+        if key is not None:
+            return queryset.filter(number_key=key)
+        return super(PhoneAdmin, self).search(queryset, query)
+
 
 class EmailAdmin(ContactAdmin):
     """ Administration for emails.
@@ -113,6 +397,10 @@ class EmailAdmin(ContactAdmin):
             'address',
             )
 
+    list_only_fields = ContactAdmin.list_only_fields + (
+            'address',
+            )
+
     search_fields = ContactAdmin.search_fields + (
             'address',
             )
@@ -125,13 +413,20 @@ class EmailAdmin(ContactAdmin):
             'send_mail',
             'send_sync_template_mail',
             'send_async_template_mail',
+            'queue_mail',
             ]
 
+    query_budgets = dict(
+            ContactAdmin.query_budgets,
+            queue_mail=12,
+            )
+
     def send_sync_template_mail(self, request, queryset):
         """ Sends template email synchronously.
         """
-        return mail.send_template_mail_admin_action(
-                lambda obj: [(obj.get_address_and_mark(), {'obj': obj})],
+        return recipients.dispatch(
+                mail.send_template_mail_admin_action,
+                recipients.EmailRecipientResolver(queryset),
                 False, request, queryset)
     send_sync_template_mail.short_description = _(
             u'send template mail synchronously')
@@ -139,8 +434,9 @@ class EmailAdmin(ContactAdmin):
     def send_async_template_mail(self, request, queryset):
         """ Sends template email asynchronously.
         """
-        return mail.send_template_mail_admin_action(
-                lambda obj: [(obj.get_address_and_mark(), {'obj': obj})],
+        return recipients.dispatch(
+                mail.send_template_mail_admin_action,
+                recipients.EmailRecipientResolver(queryset),
                 True, request, queryset)
     send_async_template_mail.short_description = _(
             u'send template mail asynchronously')
@@ -148,14 +444,14 @@ class EmailAdmin(ContactAdmin):
     def send_mail(self, request, queryset):
         """ Allows to send email.
         """
-        return mail.send_mail_admin_action(
-                lambda obj: [(obj.get_address_and_mark(), {'obj': obj})],
-                request,
-                queryset)
+        return recipients.dispatch(
+                mail.send_mail_admin_action,
+                recipients.EmailRecipientResolver(queryset),
+                request, queryset)
     send_mail.short_description = _(u'send email')
 
 
-class InfoForContractsAdmin(utils.ModelAdmin):
+class InfoForContractsAdmin(SearchModelAdmin):
     """ Administration for info for contracts.
     """
 
@@ -170,32 +466,356 @@ class InfoForContractsAdmin(utils.ModelAdmin):
             'bank',
             )
 
+    list_select_related = ('human',)
+
+    list_only_fields = list_display + HUMAN_LABEL_FIELDS
+
     search_fields = (
-            'human__first_name',
-            'human__last_name',
-            'human__old_last_name',
+            'human__' + search.TOKEN_FIELD,
             )
 
 
-class InstitutionAdmin(utils.ModelAdmin):
+class InstitutionAdmin(SearchModelAdmin):
     """ Administration for institutions.
     """
 
+    form = forms.InstitutionForm
+
     list_display = (
             'id',
             'human',
             'title',
+            'canonical',
+            )
+
+    list_select_related = ('human', 'canonical')
+
+    list_only_fields = (
+            'id',
+            'human',
+            'title',
+            'canonical__id',
+            'canonical__title',
+            ) + HUMAN_LABEL_FIELDS
+
+    raw_id_fields = (
+            'human',
+            'canonical',
+            )
+
+    search_fields = (
+            'human__' + search.TOKEN_FIELD,
+            'title',
+            )
+
+
+class CanonicalInstitutionAdmin(SearchModelAdmin):
+    """ Administration for canonical institutions.
+    """
+
+    list_display = (
+            'id',
+            'title',
+            'key',
+            'get_institution_count',
+            )
+
+    search_fields = (
+            'title',
+            )
+
+    readonly_fields = (
+            'key',
+            )
+
+    def queryset(self, request):
+        return super(CanonicalInstitutionAdmin, self).queryset(
+                request).annotate(institution_count=Count('institutions'))
+
+    def get_institution_count(self, obj):
+        """ Returns number of linked institutions.
+        """
+        return obj.institution_count
+    get_institution_count.short_description = _(u'institutions')
+    get_institution_count.admin_order_field = 'institution_count'
+
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.module_name
+        return patterns(
+                '',
+                url(r'^autocomplete/$',
+                    self.admin_site.admin_view(self.autocomplete),
+                    name='{0}_{1}_autocomplete'.format(*info)),
+                ) + super(CanonicalInstitutionAdmin, self).get_urls()
+
+    def autocomplete(self, request):
+        """ Returns JSON list of canonical institutions similar to
+        ``term`` GET parameter to users, who can change institutions.
+        """
+
+        if not request.user.has_perm('nmadb_contacts.change_institution'):
+            raise PermissionDenied
+        suggestions = institutions.suggest(request.GET.get('term', u''))
+        return HttpResponse(
+                json.dumps([
+                    {
+                        'id': canonical.id,
+                        'title': canonical.title,
+                        'similarity': round(similarity, 2),
+                    }
+                    for canonical, similarity in suggestions]),
+                content_type='application/json')
+
+
+class DuplicateCandidateAdmin(utils.ModelAdmin):
+    """ Administration for review of possible duplicate humans.
+    """
+
+    list_display = (
+            'id',
+            'first',
+            'second',
+            'score',
+            'reasons',
+            'dismissed',
+            )
+
+    list_editable = (
+            'dismissed',
+            )
+
+    list_filter = (
+            'dismissed',
+            )
+
+    list_select_related = True
+
+    query_budgets = {
+            'changelist': 10,
+            'change': 6,
+            }
+
+
+class SegmentAdmin(SearchModelAdmin):
+    """ Administration for mailing segments.
+    """
+
+    list_display = (
+            'title',
+            'gender',
+            'municipality',
+            'municipality_type',
+            'institution',
+            'with_used_email',
+            'size',
+            'refreshed',
+            )
+
+    list_select_related = ('municipality', 'institution')
+
+    raw_id_fields = (
+            'institution',
             )
 
     search_fields = (
-            'human__first_name',
-            'human__last_name',
-            'human__old_last_name',
             'title',
             )
 
+    readonly_fields = (
+            'size',
+            'refreshed',
+            )
+
+    actions = SearchModelAdmin.actions + [
+            'refresh_segments',
+            'queue_mail',
+            ]
+
+    query_budgets = dict(
+            SearchModelAdmin.query_budgets,
+            refresh_segments=20,
+            queue_mail=12,
+            )
+
+    def formfield_for_foreignkey(self, db_field, request=None, **kwargs):
+        """ Takes municipality choices from process local cache.
+        """
+
+        formfield = super(SegmentAdmin, self).formfield_for_foreignkey(
+                db_field, request, **kwargs)
+        if db_field.name == 'municipality':
+            set_municipality_choices(formfield)
+        return formfield
+
+    def get_mail_target(self, queryset):
+        """ Queues mail to members of selected segments.
+        """
+        return u'human', segments.get_members(queryset)
+
+    def queue_mail(self, request, queryset):
+        """ Refreshes selected segments and queues mail to their
+        members.
+        """
+
+        if 'apply' in request.POST:
+            for segment in queryset:
+                segments.refresh(segment)
+        return super(SegmentAdmin, self).queue_mail(request, queryset)
+    queue_mail.short_description = _(u'queue mail to members')
+
+    def refresh_segments(self, request, queryset):
+        """ Applies contact changes to members of selected segments.
+        """
+
+        for segment in queryset:
+            segments.refresh(segment)
+        self.message_user(
+                request,
+                _(u'Refreshed {0} segments.').format(len(queryset)))
+    refresh_segments.short_description = _(u'refresh segments')
+
+
+class MailDispatchJobAdmin(utils.ModelAdmin):
+    """ Progress of queued mail.
+    """
+
+    list_display = (
+            'id',
+            'subject',
+            'target',
+            'status',
+            'get_progress',
+            'sent',
+            'failed',
+            'created',
+            'finished',
+            )
+
+    list_filter = (
+            'status',
+            'target',
+            )
+
+    readonly_fields = (
+            'target',
+            'subject',
+            'body',
+            'status',
+            'created',
+            'started',
+            'finished',
+            'leased_until',
+            'get_progress',
+            'sent',
+            'failed',
+            'error',
+            )
 
-class EmailInline(admin.TabularInline):
+    fields = readonly_fields
+
+    query_budgets = {
+            'changelist': 8,
+            'change': 5,
+            }
+
+    def has_add_permission(self, request):
+        """ Jobs are created only by ``queue_mail`` actions.
+        """
+        return False
+
+    def get_progress(self, obj):
+        """ Returns number of processed objects out of selected.
+        """
+        return u'{0.processed}/{0.total}'.format(obj)
+    get_progress.short_description = _(u'progress')
+
+
+class AuditEntryAdmin(utils.ModelAdmin):
+    """ Append only audit log.
+    """
+
+    list_display = (
+            'id',
+            'timestamp',
+            'human_id',
+            'model',
+            'object_id',
+            'action',
+            'user',
+            )
+
+    list_filter = (
+            'model',
+            'action',
+            )
+
+    readonly_fields = (
+            'timestamp',
+            'human_id',
+            'model',
+            'object_id',
+            'action',
+            'user',
+            'changes',
+            )
+
+    fields = readonly_fields
+
+    query_budgets = {
+            'changelist': 8,
+            'change': 5,
+            }
+
+    def has_add_permission(self, request):
+        """ Entries are created only by audited changes.
+        """
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        """ Entries are never deleted.
+        """
+        return False
+
+    def queryset(self, request):
+        return super(AuditEntryAdmin, self).queryset(
+                request).select_related('user')
+
+    def get_actions(self, request):
+        actions = super(AuditEntryAdmin, self).get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+
+class PaginatedInlineMixin(object):
+    """ Inline, which shows related objects page by page and validates
+    only changed rows. Page of each inline is selected with
+    ``<prefix>-page`` GET parameter.
+    """
+
+    formset = forms.PaginatedInlineFormSet
+
+    template = 'admin/nmadb_contacts/edit_inline/paginated.html'
+
+    base_template = 'admin/edit_inline/tabular.html'
+
+    per_page = 10
+
+    def get_formset(self, request, obj=None, **kwargs):
+        FormSet = super(PaginatedInlineMixin, self).get_formset(
+                request, obj, **kwargs)
+        try:
+            page = int(request.GET.get(
+                FormSet.get_default_prefix() + '-page', 1))
+        except ValueError:
+            page = 1
+        return type(FormSet.__name__, (FormSet,), {
+            'per_page': self.per_page,
+            'page': page,
+            'query': request.GET,
+            })
+
+
+class EmailInline(PaginatedInlineMixin, admin.TabularInline):
     """ Inline email administration.
     """
 
@@ -204,7 +824,7 @@ class EmailInline(admin.TabularInline):
     extra = 0
 
 
-class PhoneInline(admin.TabularInline):
+class PhoneInline(PaginatedInlineMixin, admin.TabularInline):
     """ Inline phone administration.
     """
 
@@ -213,7 +833,7 @@ class PhoneInline(admin.TabularInline):
     extra = 0
 
 
-class AddressInline(admin.TabularInline):
+class AddressInline(PaginatedInlineMixin, admin.TabularInline):
     """ Inline address administration.
     """
 
@@ -221,26 +841,45 @@ class AddressInline(admin.TabularInline):
 
     extra = 0
 
+    def formfield_for_foreignkey(self, db_field, request=None, **kwargs):
+        """ Takes municipality choices from process local cache, so that
+        they are not queried for every row.
+        """
 
-class InstitutionInline(admin.TabularInline):
+        formfield = super(AddressInline, self).formfield_for_foreignkey(
+                db_field, request, **kwargs)
+        if db_field.name == 'municipality':
+            set_municipality_choices(formfield)
+        return formfield
+
+
+class InstitutionInline(PaginatedInlineMixin, admin.TabularInline):
     """ Inline institution administration.
     """
 
     model = models.Institution
 
+    form = forms.InstitutionForm
+
+    fields = (
+            'title',
+            )
+
     extra = 0
 
 
-class InfoForContractsInline(admin.StackedInline):
+class InfoForContractsInline(PaginatedInlineMixin, admin.StackedInline):
     """ Inline information for contracts administration.
     """
 
     model = models.InfoForContracts
 
+    base_template = 'admin/edit_inline/stacked.html'
+
     extra = 0
 
 
-class HumanAdmin(utils.ModelAdmin):
+class HumanAdmin(SearchModelAdmin):
     """ Administration for human.
     """
 
@@ -251,19 +890,19 @@ class HumanAdmin(utils.ModelAdmin):
             'first_name',
             'last_name',
             'birth_date',
-            'get_address',
-            'get_phones',
-            'get_emails',
-            'has_contracts_information',
+            'main_address_text',
+            'phone_numbers',
+            'email_addresses',
+            'has_contracts_info',
             )
 
     list_filter = [
+            'has_contracts_info',
             ]
 
     search_fields = (
-            'first_name',
-            'last_name',
-            'old_last_name',
+            search.TOKEN_FIELD,
+            '=identity_code',
             )
 
     inlines = [
@@ -283,61 +922,39 @@ class HumanAdmin(utils.ModelAdmin):
             (_(u'Academic degree'), ('academic_degree',)),
             (_(u'Birth date'), ('birth_date',)),
             (_(u'Identity code'), ('identity_code',)),
-            (_(u'Main address'), ('main_address',)),
+            (_(u'Main address'), ('main_address_text',)),
             )
 
-    actions = utils.ModelAdmin.actions + [
+    actions = SearchModelAdmin.actions + [
+            'export_sheet_csv',
             'send_mail',
             'send_sync_template_mail',
             'send_async_template_mail',
+            'queue_mail',
             ]
 
     list_max_show_all = 100
     list_per_page = 10
 
-    def get_address(self, obj):
-        """ Returns main address, address column value.
-        """
-
-        if obj.main_address:
-            return obj.main_address.address
-        else:
-            return u''
-    get_address.short_description = _("Main address")
-
-    def get_phones(self, obj):
-        """ Returns concatenation of all used phone numbers.
-        """
-
-        return db_utils.join(obj.phone_set.exclude(used=False), 'number')
-    get_phones.short_description = _("Phone numbers")
-
-    def get_emails(self, obj):
-        """ Returns concatenation of all used emails.
-        """
-
-        return db_utils.join(obj.email_set.exclude(used=False), 'address')
-    get_emails.short_description = _("Email addresses")
+    query_budgets = dict(
+            SearchModelAdmin.query_budgets,
+            changelist=12,
+            change=15,
+            export_sheet_csv=12,
+            queue_mail=12,
+            )
 
-    def has_contracts_information(self, obj):
-        """ Returns if this human has contract information.
+    def get_changelist(self, request, **kwargs):
+        """ Returns change list with keyset pagination.
         """
-
-        try:
-            return obj.infoforcontracts and True
-        except models.InfoForContracts.DoesNotExist:
-            return False
-    has_contracts_information.short_description = _("Contract info")
-    has_contracts_information.boolean = True
+        return HumanChangeList
 
     def send_sync_template_mail(self, request, queryset):
         """ Sends template email synchronously.
         """
-        return mail.send_template_mail_admin_action(
-                lambda human: [
-                    (email.get_address_and_mark(), {'human': human})
-                    for email in human.email_set.all()
-                    if email.used is not False],
+        return recipients.dispatch(
+                mail.send_template_mail_admin_action,
+                recipients.HumanRecipientResolver(queryset),
                 False, request, queryset)
     send_sync_template_mail.short_description = _(
             u'send template mail synchronously')
@@ -345,11 +962,9 @@ class HumanAdmin(utils.ModelAdmin):
     def send_async_template_mail(self, request, queryset):
         """ Sends template email asynchronously.
         """
-        return mail.send_template_mail_admin_action(
-                lambda human: [
-                    (email.get_address_and_mark(), {'human': human})
-                    for email in human.email_set.all()
-                    if email.used is not False],
+        return recipients.dispatch(
+                mail.send_template_mail_admin_action,
+                recipients.HumanRecipientResolver(queryset),
                 True, request, queryset)
     send_async_template_mail.short_description = _(
             u'send template mail asynchronously')
@@ -357,13 +972,10 @@ class HumanAdmin(utils.ModelAdmin):
     def send_mail(self, request, queryset):
         """ Allows to send email.
         """
-        return mail.send_mail_admin_action(
-                lambda human: [
-                    (email.get_address_and_mark(), {'human': human})
-                    for email in human.email_set.all()
-                    if email.used is not False],
-                request,
-                queryset)
+        return recipients.dispatch(
+                mail.send_mail_admin_action,
+                recipients.HumanRecipientResolver(queryset),
+                request, queryset)
     send_mail.short_description = _(u'send email')
 
 
@@ -374,3 +986,9 @@ admin.site.register(models.Phone, PhoneAdmin)
 admin.site.register(models.Email, EmailAdmin)
 admin.site.register(models.InfoForContracts, InfoForContractsAdmin)
 admin.site.register(models.Institution, InstitutionAdmin)
+admin.site.register(
+        models.CanonicalInstitution, CanonicalInstitutionAdmin)
+admin.site.register(models.DuplicateCandidate, DuplicateCandidateAdmin)
+admin.site.register(models.Segment, SegmentAdmin)
+admin.site.register(models.MailDispatchJob, MailDispatchJobAdmin)
+admin.site.register(models.AuditEntry, AuditEntryAdmin)
@@ -0,0 +1,250 @@
+""" Audit log of changes of humans, their contacts and information for
+contracts.
+
+Stored values of audited fields are read just before an existing row
+is saved (``pre_save``) and compared with the saved values, so only
+changed fields are stored. Loaded instances, which are not saved, cost
+nothing. Entries are written in the transaction of the change: inside
+:py:func:`batch` block, which runs in a managed transaction, they are
+buffered in a thread local list and written with bulk inserts when the
+block ends, so they are committed or rolled back together with the
+changes. Under autocommit entries are written immediately.
+
+To record users, who made changes, add
+``'nmadb_contacts.audit.AuditMiddleware'`` to ``MIDDLEWARE_CLASSES``
+after authentication middleware. User is forgotten when the request
+finishes, even if another middleware skipped the response methods.
+"""
+
+from contextlib import contextmanager
+import json
+import threading
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from nmadb_contacts import bulk
+from nmadb_contacts import models
+
+
+FLUSH_SIZE = bulk.BATCH_SIZE
+"""Buffered entries are written when buffer grows to this size."""
+
+AUDITED_MODELS = {
+        models.Human: (
+            'main_address_text', 'phone_numbers', 'email_addresses',
+            'has_contracts_info'),
+        models.Phone: ('number_key',),
+        models.Email: ('address_key',),
+        models.Address: (),
+        models.Institution: (),
+        models.InfoForContracts: (),
+        }
+"""Audited models and their derived fields, which are not audited."""
+
+SNAPSHOT_ATTRIBUTE = '_audit_snapshot'
+
+_fields = {}
+
+
+class AuditState(threading.local):
+    """ Thread local buffer of audit entries.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.entries = []
+        self.user_id = None
+
+
+state = AuditState()
+
+
+def get_fields(model):
+    """ Returns ``(name, attribute name)`` pairs of audited fields of
+    ``model``.
+    """
+
+    if model not in _fields:
+        excluded = AUDITED_MODELS[model]
+        _fields[model] = [
+                (field.name, field.attname)
+                for field in model._meta.local_fields
+                if field.name not in excluded and not field.primary_key]
+    return _fields[model]
+
+
+def get_values(instance):
+    """ Returns dictionary of loaded audited field values.
+    """
+
+    values = instance.__dict__
+    return dict(
+            (attname, values[attname])
+            for _, attname in get_fields(instance._meta.concrete_model)
+            if attname in values)
+
+
+def get_stored_values(instance):
+    """ Returns dictionary of audited field values stored in database
+    or empty dictionary if ``instance`` is not stored yet.
+    """
+
+    if instance._state.adding or instance.pk is None:
+        return {}
+    model = instance._meta.concrete_model
+    fields = get_fields(model)
+    rows = model._base_manager.filter(pk=instance.pk).values_list(
+            *[name for name, _ in fields])
+    for row in rows:
+        return dict(zip([attname for _, attname in fields], row))
+    return {}
+
+
+def snapshot(instance):
+    """ Remembers stored field values of ``instance``, which is about
+    to be saved.
+    """
+    setattr(instance, SNAPSHOT_ATTRIBUTE, get_stored_values(instance))
+
+
+def get_human_id(instance):
+    """ Returns id of human, to whom ``instance`` belongs.
+    """
+
+    if isinstance(instance, models.Human):
+        return instance.pk
+    return instance.human_id
+
+
+def append(model, object_id, human_id, action, changes):
+    """ Buffers entry and writes buffer if it is full, no batch is
+    active or changes are already committed.
+    """
+
+    state.entries.append(models.AuditEntry(
+        human_id=human_id,
+        model=model._meta.module_name,
+        object_id=object_id,
+        action=action,
+        user_id=state.user_id,
+        timestamp=timezone.now(),
+        changes=json.dumps(
+            changes, cls=DjangoJSONEncoder, separators=(',', ':'),
+            sort_keys=True),
+        ))
+    if (state.depth == 0 or not transaction.is_managed() or
+            len(state.entries) >= FLUSH_SIZE):
+        flush()
+
+
+def record(instance, action):
+    """ Appends entry describing changes of saved or deleted
+    ``instance``.
+    """
+
+    old = instance.__dict__.pop(SNAPSHOT_ATTRIBUTE, {})
+    if action == u'D':
+        changes = dict(
+                (name, [value, None])
+                for name, value in get_values(instance).items())
+    else:
+        new = get_values(instance)
+        changes = dict(
+                (name, [old.get(name), value])
+                for name, value in new.items()
+                if (action == u'C' and value not in (None, u'')) or
+                (action == u'U' and name in old and old[name] != value))
+        if not changes:
+            return
+    append(
+            instance._meta.concrete_model, instance.pk,
+            get_human_id(instance), action, changes)
+
+
+def record_update(model, rows, field_name, value):
+    """ Buffers entries of bulk update, which bypasses signals.
+    ``rows`` are ``(object id, human id, old value)`` triples of rows,
+    whose field ``field_name`` was set to ``value``.
+    """
+
+    for object_id, human_id, old_value in rows:
+        append(
+                model, object_id, human_id, u'U',
+                {field_name: [old_value, value]})
+
+
+def flush():
+    """ Writes buffered entries.
+    """
+
+    entries, state.entries = state.entries, []
+    bulk.bulk_create(models.AuditEntry, entries)
+
+
+def discard():
+    """ Forgets buffered entries.
+    """
+    state.entries = []
+
+
+@contextmanager
+def batch(user_id=None):
+    """ Buffers entries until the end of the block. Block must run in
+    a managed transaction, which is not committed inside it, so entries
+    are written before changes are committed. Entries are discarded if
+    block raises exception.
+    """
+
+    old_user_id = state.user_id
+    if user_id is not None:
+        state.user_id = user_id
+    state.depth += 1
+    try:
+        yield
+    except:
+        state.depth -= 1
+        if state.depth == 0:
+            discard()
+        raise
+    else:
+        state.depth -= 1
+        if state.depth == 0:
+            flush()
+    finally:
+        state.user_id = old_user_id
+
+
+def history(human_id):
+    """ Returns list of changes of human with ``human_id`` and their
+    contacts, newest first. Each change is a dictionary with ``model``,
+    ``object_id``, ``action``, ``user_id``, ``timestamp`` and ``changes``
+    keys.
+    """
+
+    entries = models.AuditEntry.objects.filter(
+            human_id=human_id).order_by('-id').values(
+            'model', 'object_id', 'action', 'user_id', 'timestamp',
+            'changes')
+    for entry in entries:
+        entry['changes'] = json.loads(entry['changes'] or '{}')
+    return list(entries)
+
+
+class AuditMiddleware(object):
+    """ Records user of request in audit entries.
+    """
+
+    def process_request(self, request):
+        user = getattr(request, 'user', None)
+        state.user_id = (
+                user.pk if user is not None and user.is_authenticated()
+                else None)
+
+    def process_exception(self, request, exception):
+        state.user_id = None
+
+    def process_response(self, request, response):
+        state.user_id = None
+        return response
@@ -0,0 +1,153 @@
+""" Helpers for processing big tables in chunks.
+"""
+
+import itertools
+
+from django.db import connection, transaction
+
+
+BATCH_SIZE = 400
+"""Maximum number of objects inserted with one query. Keeps number
+of query parameters below SQLite limit for small models."""
+
+UPDATE_BATCH_SIZE = 300
+"""Maximum number of rows updated with one query. Every row takes three
+query parameters."""
+
+
+def chunked(iterable, size):
+    """ Splits ``iterable`` into lists of at most ``size`` elements.
+    """
+
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def bulk_create(model, objects, batch_size=BATCH_SIZE):
+    """ Inserts ``objects`` of ``model`` with as few queries as
+    possible.
+    """
+
+    for batch in chunked(objects, batch_size):
+        model.objects.bulk_create(batch)
+
+
+def update_values(model, field_name, values, batch_size=UPDATE_BATCH_SIZE):
+    """ Sets ``field_name`` of ``model`` objects to different values
+    with one ``UPDATE ... CASE`` query per batch. ``values`` maps object
+    id to its new value. Returns number of updated rows.
+    """
+
+    return update_rows(
+            model, [field_name],
+            dict((object_id, (value,))
+                 for object_id, value in values.items()),
+            batch_size)
+
+
+def update_rows(model, field_names, rows, batch_size=None):
+    """ Sets several fields of ``model`` objects to different values
+    with one ``UPDATE`` query per batch, which has a ``CASE`` for every
+    field. ``rows`` maps object id to the tuple of new values of
+    ``field_names``. By default batch size is chosen so that a query
+    has as many parameters as a batch of :py:func:`update_values`.
+    Returns number of updated rows.
+    """
+
+    if batch_size is None:
+        batch_size = max(
+                1, UPDATE_BATCH_SIZE * 3 // (2 * len(field_names) + 1))
+    fields = [model._meta.get_field(name) for name in field_names]
+    quote = connection.ops.quote_name
+    primary_key = quote(model._meta.pk.column)
+    cursor = connection.cursor()
+    count = 0
+    for batch in chunked(sorted(rows.items()), batch_size):
+        params = []
+        cases = []
+        for index, field in enumerate(fields):
+            for object_id, values in batch:
+                params.append(object_id)
+                params.append(
+                        field.get_db_prep_save(values[index], connection))
+            cases.append('{0} = CASE {1} {2} END'.format(
+                quote(field.column), primary_key,
+                ' '.join(['WHEN %s THEN %s'] * len(batch))))
+        params.extend(object_id for object_id, _ in batch)
+        cursor.execute(
+                'UPDATE {0} SET {1} WHERE {2} IN ({3})'.format(
+                    quote(model._meta.db_table), ', '.join(cases),
+                    primary_key, ', '.join(['%s'] * len(batch))),
+                params)
+        count += cursor.rowcount
+    transaction.commit_unless_managed()
+    return count
+
+
+def iter_chunks(queryset, chunk_size):
+    """ Iterates over ``queryset`` in chunks ordered by primary key.
+    Each chunk is fetched with one keyset query, so memory usage does
+    not depend on table size. ``queryset`` may be a values query set,
+    which must contain ``id`` as the first column, or a flat values
+    list query set of ids.
+    """
+
+    queryset = queryset.order_by('id')
+    last_id = None
+    while True:
+        if last_id is None:
+            chunk = list(queryset[:chunk_size])
+        else:
+            chunk = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]
+        if isinstance(last, dict):
+            last_id = last['id']
+        elif isinstance(last, (list, tuple)):
+            last_id = last[0]
+        else:
+            last_id = getattr(last, 'pk', last)
+
+
+def backfill_keys(model, field_name, key_name, normalize, chunk_size):
+    """ Sets unique ``key_name`` field of all ``model`` objects to the
+    normalized value of ``field_name``. Returns list of ``(id, value,
+    key)`` of objects, which were left without key because another
+    object already has the same key.
+
+    Keys of changed objects in a chunk are cleared first and then set
+    with one query, so objects exchanging keys do not collide.
+    """
+
+    conflicts = []
+    queryset = model.objects.values_list('id', field_name, key_name)
+    for chunk in iter_chunks(queryset, chunk_size):
+        changed = [
+                (object_id, value, normalize(value))
+                for object_id, value, old_key in chunk
+                if normalize(value) != old_key]
+        if not changed:
+            continue
+        changed_ids = [object_id for object_id, _, _ in changed]
+        taken = set(model.objects.filter(**{
+            key_name + '__in': set(key for _, _, key in changed if key),
+            }).exclude(id__in=changed_ids).values_list(
+            key_name, flat=True))
+        keys = {}
+        for object_id, value, key in changed:
+            if key in taken:
+                conflicts.append((object_id, value, key))
+            elif key is not None:
+                taken.add(key)
+                keys[object_id] = key
+        with transaction.commit_on_success():
+            model.objects.filter(id__in=changed_ids).update(**{
+                key_name: None})
+            update_values(model, key_name, keys)
+    return conflicts
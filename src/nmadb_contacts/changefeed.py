@@ -0,0 +1,242 @@
+""" Change feed of humans and their contacts for downstream systems.
+
+Every save and delete of :py:class:`nmadb_contacts.models.Human`,
+``Phone``, ``Email``, ``Address`` and ``Institution`` appends
+:py:class:`nmadb_contacts.models.ChangeFeedEntry`. Bulk operations,
+which bypass signals, record their rows with :py:func:`record`.
+
+Downstream system does the initial sync by taking :py:func:`get_cursor`
+and then exporting all rows. Later it calls :py:func:`iter_changes`
+with the last returned cursor and gets only the rows changed since.
+Work is proportional to the number of changes, because entries are
+scanned by primary key starting at the cursor.
+
+Entry ids are taken when rows are inserted, but concurrent transactions
+commit in any order, so an entry with lower id may become visible after
+an entry with higher id was read. Therefore, cursors advance only to
+settled entries, which are older than :py:data:`COMMIT_LAG`, and newer
+entries are returned again on the next call. Changes are delivered at
+least once, provided that no transaction writing entries runs longer
+than :py:data:`COMMIT_LAG`.
+"""
+
+import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Max
+from django.utils import timezone
+
+from nmadb_contacts import bulk
+from nmadb_contacts import models
+
+
+PAGE_SIZE = 500
+
+CURSOR_SALT = 'nmadb_contacts.changefeed'
+
+COMMIT_LAG = getattr(settings, 'NMADB_CONTACTS_CHANGE_FEED_LAG', 300)
+"""Number of seconds, after which entry is considered settled: all
+entries with lower ids are committed."""
+
+FEED_FIELDS = {
+        u'human': (
+            models.Human,
+            ('id', 'first_name', 'last_name', 'old_last_name', 'gender',
+             'academic_degree', 'birth_date', 'main_address')),
+        u'phone': (
+            models.Phone,
+            ('id', 'human', 'number', 'used')),
+        u'email': (
+            models.Email,
+            ('id', 'human', 'address', 'used')),
+        u'address': (
+            models.Address,
+            ('id', 'human', 'town', 'address', 'municipality')),
+        u'institution': (
+            models.Institution,
+            ('id', 'human', 'title', 'canonical')),
+        }
+"""Model and fields of rows returned for every kind."""
+
+KINDS = dict((model, kind) for kind, (model, _) in FEED_FIELDS.items())
+
+
+class CursorExpired(Exception):
+    """ Raised when entries after cursor were already pruned and full
+    sync is needed.
+    """
+
+
+class Page(object):
+    """ One page of changes.
+
+    ``changed`` maps kind to the list of current row dictionaries and
+    ``deleted`` maps kind to the list of deleted ids. ``cursor`` should
+    be passed to get the next page. ``more`` tells if there are more
+    changes.
+    """
+
+    def __init__(self, changed, deleted, cursor, more):
+        self.changed = changed
+        self.deleted = deleted
+        self.cursor = cursor
+        self.more = more
+
+    def as_dict(self):
+        """ Returns page as JSON serializable dictionary.
+        """
+        return {
+                'changed': self.changed,
+                'deleted': self.deleted,
+                'cursor': self.cursor,
+                'more': self.more,
+                }
+
+
+def dump_cursor(entry_id):
+    """ Returns cursor token pointing after entry with ``entry_id``.
+    """
+    return signing.dumps(entry_id, salt=CURSOR_SALT)
+
+
+def load_cursor(cursor):
+    """ Returns entry id of ``cursor`` token. ``None`` means the
+    beginning of the feed.
+    """
+
+    if cursor is None:
+        return 0
+    return int(signing.loads(cursor, salt=CURSOR_SALT))
+
+
+def get_pruned_position():
+    """ Returns id of the last pruned entry.
+    """
+
+    return models.ChangeFeedPrune.objects.aggregate(
+            last_id=Max('entry_id'))['last_id'] or 0
+
+
+def is_expired(position):
+    """ Returns if entries after ``position`` were pruned.
+    """
+    return position < get_pruned_position()
+
+
+def get_settled_position():
+    """ Returns id of the newest settled entry, so all entries with
+    lower or equal ids are committed.
+    """
+
+    entries = models.ChangeFeedEntry.objects.filter(
+            changed__lt=timezone.now() - datetime.timedelta(
+                seconds=COMMIT_LAG)).order_by('-changed', '-id')
+    for entry_id in entries.values_list('id', flat=True)[:1]:
+        return max(entry_id, get_pruned_position())
+    return get_pruned_position()
+
+
+def get_cursor():
+    """ Returns cursor pointing at the settled end of the feed.
+    """
+    return dump_cursor(get_settled_position())
+
+
+def record(model, rows, deleted=False):
+    """ Appends entries for ``rows`` of ``model`` with one insert per
+    batch. ``rows`` are ``(object id, human id)`` pairs.
+    """
+
+    kind = KINDS[model]
+    bulk.bulk_create(models.ChangeFeedEntry, [
+        models.ChangeFeedEntry(
+            kind=kind, object_id=object_id, human_id=human_id,
+            deleted=deleted)
+        for object_id, human_id in rows])
+
+
+def record_humans(human_ids):
+    """ Appends entries for humans with ``human_ids`` and all their
+    contacts.
+    """
+
+    human_ids = list(human_ids)
+    record(models.Human, [(human_id, human_id) for human_id in human_ids])
+    for model in (
+            models.Phone, models.Email, models.Address,
+            models.Institution):
+        record(model, model.objects.filter(
+            human__in=human_ids).values_list('id', 'human_id'))
+
+
+def get_changes(cursor=None, page_size=PAGE_SIZE):
+    """ Returns :py:class:`Page` with changes after ``cursor``. Every
+    changed object is returned once per page in its current state.
+    Returned cursor points at the last settled entry of the page.
+    """
+
+    after = load_cursor(cursor)
+    if cursor is not None and is_expired(after):
+        raise CursorExpired()
+    settled = get_settled_position()
+    entries = list(models.ChangeFeedEntry.objects.filter(
+        id__gt=after).order_by('id').values_list(
+        'id', 'kind', 'object_id', 'deleted')[:page_size + 1])
+    more = len(entries) > page_size and entries[page_size - 1][0] <= settled
+    entries = entries[:page_size]
+    last = {}
+    for entry_id, kind, object_id, is_deleted in entries:
+        last[kind, object_id] = is_deleted
+    changed = {}
+    deleted = {}
+    for kind, (model, fields) in FEED_FIELDS.items():
+        ids = [
+                object_id
+                for (entry_kind, object_id), is_deleted in last.items()
+                if entry_kind == kind and not is_deleted]
+        rows = []
+        for chunk in bulk.chunked(sorted(ids), PAGE_SIZE):
+            rows.extend(model.objects.filter(id__in=chunk).order_by(
+                'id').values(*fields))
+        found = set(row['id'] for row in rows)
+        gone = sorted(
+                object_id
+                for (entry_kind, object_id), is_deleted in last.items()
+                if entry_kind == kind and (
+                    is_deleted or object_id not in found))
+        if rows:
+            changed[kind] = rows
+        if gone:
+            deleted[kind] = gone
+    position = after
+    for entry_id, _, _, _ in entries:
+        if entry_id <= settled:
+            position = entry_id
+    return Page(changed, deleted, dump_cursor(position), more)
+
+
+def iter_changes(cursor=None, page_size=PAGE_SIZE):
+    """ Yields pages of changes after ``cursor`` until the end of the
+    feed.
+    """
+
+    while True:
+        page = get_changes(cursor, page_size)
+        yield page
+        if not page.more:
+            return
+        cursor = page.cursor
+
+
+def prune(before):
+    """ Deletes entries older than ``before`` datetime and records the
+    prune point. Consumers with older cursors get
+    :py:class:`CursorExpired`.
+    """
+
+    last_id = models.ChangeFeedEntry.objects.filter(
+            changed__lt=before).aggregate(last_id=Max('id'))['last_id']
+    if last_id is not None:
+        models.ChangeFeedPrune.objects.create(entry_id=last_id)
+        models.ChangeFeedEntry.objects.filter(id__lte=last_id).delete()
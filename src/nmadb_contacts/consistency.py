@@ -0,0 +1,167 @@
+""" Referential consistency checks of humans and their contacts.
+
+``HumanForm`` allows to choose only own address as main address, but
+imports and shell edits bypass it. Each check is a single join query,
+which is read in keyset chunks, so it stays cheap on large tables:
+
+``foreign_main_address``
+    main address of human belongs to another human. Fixed by clearing
+    main address.
+``missing_main_address``
+    human has addresses, but no main address. Fixed by choosing the
+    first added address.
+``unused_only_phone``, ``unused_only_email``
+    contact is marked as not used and human has no other used contact
+    of that kind. These are only reported, because which contact is
+    still valid cannot be decided automatically.
+"""
+
+from django.db import connection, transaction
+from django.db.models import F, Min
+
+from nmadb_contacts import audit
+from nmadb_contacts import bulk
+from nmadb_contacts import changefeed
+from nmadb_contacts import facets
+from nmadb_contacts import models
+from nmadb_contacts import summaries
+
+
+CHUNK_SIZE = 500
+
+
+def get_foreign_main_addresses():
+    """ Returns ``(human id, main address id)`` values of humans, whose
+    main address belongs to another human.
+    """
+
+    return models.Human.objects.filter(
+            main_address__isnull=False).exclude(
+            main_address__human=F('id')).values_list('id', 'main_address')
+
+
+def get_missing_main_addresses():
+    """ Returns ``(human id, None)`` values of humans with addresses,
+    but without main address.
+    """
+
+    return models.Human.objects.filter(
+            main_address__isnull=True,
+            id__in=models.Address.objects.values('human'),
+            ).values_list('id', 'main_address')
+
+
+def get_unused_only_contacts(model):
+    """ Returns ``(contact id, human id)`` values of contacts of
+    ``model``, which are marked as not used, of humans without other
+    used contacts of that kind.
+    """
+
+    return model.objects.filter(used=False).exclude(
+            human__in=model.objects.exclude(used=False).values('human'),
+            ).values_list('id', 'human')
+
+
+def get_unused_only_phones():
+    """ Returns unused phones of humans without used phones.
+    """
+    return get_unused_only_contacts(models.Phone)
+
+
+def get_unused_only_emails():
+    """ Returns unused emails of humans without used emails.
+    """
+    return get_unused_only_contacts(models.Email)
+
+
+def fix_foreign_main_addresses(rows):
+    """ Clears main addresses of ``(human id, address id)`` rows with
+    one update.
+    """
+
+    human_ids = [human_id for human_id, _ in rows]
+    with transaction.commit_on_success(), audit.batch():
+        audit.record_update(
+                models.Human,
+                [(human_id, human_id, address_id)
+                 for human_id, address_id in rows],
+                'main_address_id', None)
+        models.Human.objects.filter(id__in=human_ids).update(
+                main_address=None)
+        changefeed.record(
+                models.Human,
+                [(human_id, human_id) for human_id in human_ids])
+        summaries.rebuild(human_ids)
+
+
+def fix_missing_main_addresses(rows):
+    """ Sets main addresses of ``(human id, None)`` rows to the first
+    added address of each human. The whole chunk is fixed with one
+    ``UPDATE`` with a correlated subquery, which is portable, unlike
+    ``UPDATE ... FROM``. Chosen addresses are read with one grouped
+    query for the audit log.
+    """
+
+    first = models.Address.objects.filter(
+            human__in=[human_id for human_id, _ in rows],
+            human__main_address__isnull=True,
+            ).values('human').annotate(first_id=Min('id')).order_by()
+    addresses = dict((row['human'], row['first_id']) for row in first)
+    if not addresses:
+        return
+    quote = connection.ops.quote_name
+    human_table = quote(models.Human._meta.db_table)
+    address_table = quote(models.Address._meta.db_table)
+    main_address = quote(
+            models.Human._meta.get_field('main_address').column)
+    with transaction.commit_on_success(), audit.batch():
+        for human_id, address_id in sorted(addresses.items()):
+            audit.record_update(
+                    models.Human, [(human_id, human_id, None)],
+                    'main_address_id', address_id)
+        connection.cursor().execute(
+                'UPDATE {0} SET {1} = ('
+                'SELECT MIN({2}.{3}) FROM {2} '
+                'WHERE {2}.{4} = {0}.{5}) '
+                'WHERE {5} IN ({6}) AND {1} IS NULL'.format(
+                    human_table, main_address, address_table,
+                    quote(models.Address._meta.pk.column),
+                    quote(models.Address._meta.get_field(
+                        'human').column),
+                    quote(models.Human._meta.pk.column),
+                    ', '.join(['%s'] * len(addresses))),
+                sorted(addresses))
+        changefeed.record(
+                models.Human,
+                [(human_id, human_id) for human_id in sorted(addresses)])
+        summaries.rebuild(addresses.keys())
+
+
+CHECKS = (
+        (u'foreign_main_address', get_foreign_main_addresses,
+         fix_foreign_main_addresses),
+        (u'missing_main_address', get_missing_main_addresses,
+         fix_missing_main_addresses),
+        (u'unused_only_phone', get_unused_only_phones, None),
+        (u'unused_only_email', get_unused_only_emails, None),
+        )
+"""Name, query and fix of every check."""
+
+
+def check(fix=False, chunk_size=CHUNK_SIZE):
+    """ Yields ``(check name, object id, related id)`` of violations.
+    If ``fix`` is true, fixable violations are fixed chunk by chunk.
+    Checks run in order, so humans, whose foreign main address was
+    cleared, get their own main address.
+    """
+
+    fixed = False
+    for name, query, fixer in CHECKS:
+        for chunk in bulk.iter_chunks(query(), chunk_size):
+            for object_id, related_id in chunk:
+                yield name, object_id, related_id
+            if fix and fixer is not None:
+                fixer(chunk)
+                fixed = True
+    if fixed:
+        facets.invalidate()
@@ -0,0 +1,72 @@
+""" Approximate counts of large querysets.
+
+Exact ``COUNT(*)`` of a large table is slow. On PostgreSQL the planner
+estimate from ``EXPLAIN`` is used when it is above the threshold. Other
+databases count exactly, but large counts are cached for a while.
+"""
+
+import hashlib
+import re
+
+from django.core.cache import cache
+from django.db import connections
+
+
+THRESHOLD = 10000
+"""Counts below this value are always exact."""
+
+CACHE_TIMEOUT = 300
+
+ROWS_RE = re.compile(r'rows=(?P<rows>\d+)')
+
+
+def estimate(queryset):
+    """ Returns planner estimate of number of rows of ``queryset`` or
+    ``None`` if database cannot estimate.
+    """
+
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    cursor = connection.cursor()
+    cursor.execute('EXPLAIN ' + sql, params)
+    match = ROWS_RE.search(cursor.fetchone()[0])
+    if match is None:
+        return None
+    return int(match.group('rows'))
+
+
+def get_digest(queryset):
+    """ Returns digest of unordered ``queryset`` SQL.
+    """
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    return hashlib.md5(
+            repr((queryset.db, sql, params)).encode('utf-8')).hexdigest()
+
+
+def get_cache_key(queryset):
+    """ Returns cache key of ``queryset`` count.
+    """
+    return 'nmadb_contacts.count.' + get_digest(queryset)
+
+
+def get_count(queryset, threshold=THRESHOLD):
+    """ Returns ``(count, exact)`` pair, where ``exact`` is ``False``
+    if count is estimated or cached.
+    """
+
+    estimated = estimate(queryset)
+    if estimated is not None:
+        if estimated >= threshold:
+            return estimated, False
+        return queryset.count(), True
+    key = get_cache_key(queryset)
+    count = cache.get(key)
+    if count is not None:
+        return count, False
+    count = queryset.count()
+    if count >= threshold:
+        cache.set(key, count, CACHE_TIMEOUT)
+    return count, True
@@ -0,0 +1,220 @@
+""" Detection of duplicate humans.
+
+Every human has a set of blocking keys built from normalized names,
+birth date, phone numbers and email addresses. Only humans, which
+share at least one blocking key, are compared, so the amount of work
+depends on the number of similar humans and not on the square of table
+size. Keys of humans, which were saved after the last run, are marked
+as pending, which allows incremental runs to look only at them.
+"""
+
+from django.db import transaction
+from django.db.models import Count
+
+from nmadb_contacts import bulk
+from nmadb_contacts import identity
+from nmadb_contacts import models
+from nmadb_contacts import normalization
+
+
+KEY_WEIGHTS = {
+        'name': 0.5,
+        'birth': 0.3,
+        'phone': 0.5,
+        'email': 0.5,
+        }
+"""Score added to a pair of humans for every kind of shared key."""
+
+MIN_SCORE = 0.3
+"""Pairs with this or lower score are not stored, so humans, who only
+share a birthday, are not candidates."""
+
+MAX_BLOCK_SIZE = 50
+"""Blocks with more humans are too unspecific to be compared."""
+
+CHUNK_SIZE = 500
+
+
+def get_keys(first_name, last_name, old_last_name, birth_date,
+             identity_code, numbers, addresses):
+    """ Returns blocking keys of a human.
+    """
+
+    first = u' '.join(normalization.tokenize(first_name))
+    keys = set()
+    for last in (last_name, old_last_name):
+        last = u' '.join(normalization.tokenize(last))
+        if first and last:
+            keys.add(u'name:{0}:{1}'.format(first, last))
+    birth_date = birth_date or identity.decode_birth_date(identity_code)
+    if birth_date and first:
+        keys.add(u'birth:{0}:{1}'.format(
+            birth_date.isoformat(), first[0]))
+    for number in numbers:
+        digits = u''.join(char for char in number if char.isdigit())
+        if digits:
+            keys.add(u'phone:{0}'.format(digits[-8:]))
+    for address in addresses:
+        keys.add(u'email:{0}'.format(address.strip().lower()))
+    return keys
+
+
+def rebuild_keys(human_ids):
+    """ Rebuilds blocking keys of humans with ``human_ids`` and marks
+    them as pending.
+    """
+
+    humans = models.Human.objects.filter(id__in=human_ids).values_list(
+            'id', 'first_name', 'last_name', 'old_last_name',
+            'birth_date', 'identity_code')
+    numbers = {}
+    for human_id, number in models.Phone.objects.filter(
+            human__in=human_ids).values_list('human_id', 'number'):
+        numbers.setdefault(human_id, []).append(number)
+    addresses = {}
+    for human_id, address in models.Email.objects.filter(
+            human__in=human_ids).values_list('human_id', 'address'):
+        addresses.setdefault(human_id, []).append(address)
+    models.HumanBlockingKey.objects.filter(human__in=human_ids).delete()
+    bulk.bulk_create(models.HumanBlockingKey, (
+        models.HumanBlockingKey(human_id=row[0], key=key, pending=True)
+        for row in humans
+        for key in get_keys(
+            *row[1:],
+            numbers=numbers.get(row[0], ()),
+            addresses=addresses.get(row[0], ()))))
+
+
+def rebuild_all_keys(chunk_size=CHUNK_SIZE):
+    """ Rebuilds blocking keys of all humans.
+    """
+
+    for chunk in bulk.iter_chunks(
+            models.Human.objects.values_list('id', flat=True), chunk_size):
+        with transaction.commit_on_success():
+            rebuild_keys(chunk)
+
+
+def collect_pairs(keys, pending_ids=None):
+    """ Returns dictionary, which maps pairs of human ids, which share
+    any of ``keys``, to sets of shared key kinds. If ``pending_ids`` is
+    given, only pairs involving them are returned.
+    """
+
+    blocks = {}
+    rows = models.HumanBlockingKey.objects.filter(
+            key__in=keys).values_list('key', 'human_id')
+    for key, human_id in rows:
+        blocks.setdefault(key, []).append(human_id)
+    pairs = {}
+    for key, human_ids in blocks.items():
+        if len(human_ids) > MAX_BLOCK_SIZE:
+            continue
+        human_ids.sort()
+        kind = key.split(u':', 1)[0]
+        for i, first in enumerate(human_ids):
+            for second in human_ids[i + 1:]:
+                if (pending_ids is None or first in pending_ids or
+                        second in pending_ids):
+                    pairs.setdefault((first, second), set()).add(kind)
+    return pairs
+
+
+def score_pairs(pairs):
+    """ Returns list of ``(first, second, score, reasons)`` tuples for
+    ``pairs`` with score above :py:data:`MIN_SCORE`. Pairs of humans
+    with different identity codes are dropped.
+    """
+
+    human_ids = set()
+    for first, second in pairs:
+        human_ids.add(first)
+        human_ids.add(second)
+    codes = {}
+    for chunk in bulk.chunked(human_ids, CHUNK_SIZE):
+        codes.update(models.Human.objects.filter(
+            id__in=chunk, identity_code__isnull=False,
+            ).values_list('id', 'identity_code'))
+    scored = []
+    for (first, second), kinds in pairs.items():
+        if first in codes and second in codes:
+            continue
+        score = min(1.0, sum(KEY_WEIGHTS[kind] for kind in kinds))
+        if score > MIN_SCORE:
+            scored.append(
+                    (first, second, score, u', '.join(sorted(kinds))))
+    return scored
+
+
+def store_candidates(scored):
+    """ Stores scored pairs, except ones, which were dismissed by a
+    reviewer.
+    """
+
+    dismissed = set()
+    for chunk in bulk.chunked(scored, CHUNK_SIZE):
+        dismissed.update(models.DuplicateCandidate.objects.filter(
+            first__in=[row[0] for row in chunk],
+            dismissed=True,
+            ).values_list('first_id', 'second_id'))
+    bulk.bulk_create(models.DuplicateCandidate, (
+        models.DuplicateCandidate(
+            first_id=first, second_id=second, score=score,
+            reasons=reasons)
+        for first, second, score, reasons in scored
+        if (first, second) not in dismissed))
+
+
+def merge_pairs(pairs, new_pairs):
+    """ Adds ``new_pairs`` to ``pairs`` and returns ``pairs``.
+    """
+
+    for pair, kinds in new_pairs.items():
+        pairs.setdefault(pair, set()).update(kinds)
+    return pairs
+
+
+def find_all(chunk_size=CHUNK_SIZE):
+    """ Rebuilds all blocking keys and duplicate candidates.
+    """
+
+    rebuild_all_keys(chunk_size)
+    keys = [
+            row['key']
+            for row in models.HumanBlockingKey.objects.values(
+                'key').annotate(size=Count('id')).filter(
+                size__gt=1, size__lte=MAX_BLOCK_SIZE)]
+    pairs = {}
+    for chunk in bulk.chunked(keys, chunk_size):
+        merge_pairs(pairs, collect_pairs(chunk))
+    with transaction.commit_on_success():
+        models.DuplicateCandidate.objects.filter(dismissed=False).delete()
+        store_candidates(score_pairs(pairs))
+        models.HumanBlockingKey.objects.filter(pending=True).update(
+                pending=False)
+
+
+def find_pending(chunk_size=CHUNK_SIZE):
+    """ Updates duplicate candidates of humans, which were changed
+    since the last run.
+    """
+
+    while True:
+        pending_ids = list(models.HumanBlockingKey.objects.filter(
+            pending=True).values_list('human_id', flat=True).distinct(
+            ).order_by('human_id')[:chunk_size])
+        if not pending_ids:
+            return
+        with transaction.commit_on_success():
+            keys = set(models.HumanBlockingKey.objects.filter(
+                human__in=pending_ids).values_list('key', flat=True))
+            pairs = {}
+            for chunk in bulk.chunked(keys, chunk_size):
+                merge_pairs(pairs, collect_pairs(chunk, set(pending_ids)))
+            models.DuplicateCandidate.objects.filter(
+                    first__in=pending_ids, dismissed=False).delete()
+            models.DuplicateCandidate.objects.filter(
+                    second__in=pending_ids, dismissed=False).delete()
+            store_candidates(score_pairs(pairs))
+            models.HumanBlockingKey.objects.filter(
+                    human__in=pending_ids).update(pending=False)
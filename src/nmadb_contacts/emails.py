@@ -0,0 +1,119 @@
+""" Bulk resolution of email addresses and processing of bounces.
+
+``Email.address_key`` keeps the address in lower case and has its own
+unique index, so addresses reported by mail servers in any case are
+resolved with one indexed ``IN`` query per chunk.
+
+Bounce logs are CSV files with address and delivery status columns.
+Status is either a word (``hard``, ``bounced``, ...) or SMTP status
+code. Permanent failures (``5.x.x`` and ``5xx`` codes) mark the email
+as not used, so it is excluded from mail recipients.
+"""
+
+import csv
+import re
+
+from django.db import transaction
+from django.utils.encoding import force_unicode
+
+from nmadb_contacts import audit
+from nmadb_contacts import bulk
+from nmadb_contacts import changefeed
+from nmadb_contacts import facets
+from nmadb_contacts import models
+from nmadb_contacts import summaries
+from nmadb_contacts.normalization import normalize_email
+
+
+CHUNK_SIZE = 500
+
+HARD_BOUNCE_STATUSES = frozenset((
+        u'hard',
+        u'bounce',
+        u'bounced',
+        u'failed',
+        u'permanent',
+        ))
+
+HARD_BOUNCE_CODE_RE = re.compile(r'^5(\.\d{1,3}\.\d{1,3}|\d\d)$')
+
+
+def resolve_emails(addresses, chunk_size=CHUNK_SIZE):
+    """ Returns dictionary, which maps every given address to its
+    :py:class:`nmadb_contacts.models.Email` (with human loaded) or to
+    ``None``. Addresses are compared case insensitively and resolved
+    with one query per ``chunk_size`` distinct addresses.
+    """
+
+    keys = dict(
+            (address, normalize_email(address)) for address in addresses)
+    emails = {}
+    for chunk in bulk.chunked(
+            set(keys.values()) - set([None]), chunk_size):
+        for email in models.Email.objects.filter(
+                address_key__in=chunk).select_related('human'):
+            emails[email.address_key] = email
+    return dict(
+            (address, emails.get(key)) for address, key in keys.items())
+
+
+def backfill(chunk_size=CHUNK_SIZE):
+    """ Sets normalized address of all emails. Returns list of
+    ``(email id, address, key)`` of emails, which were left without key
+    because another email differs only in case.
+    """
+    return bulk.backfill_keys(
+            models.Email, 'address', 'address_key', normalize_email,
+            chunk_size)
+
+
+def is_hard_bounce(status):
+    """ Returns if delivery ``status`` is a permanent failure.
+    """
+
+    status = status.strip().lower()
+    return (
+            status in HARD_BOUNCE_STATUSES or
+            HARD_BOUNCE_CODE_RE.match(status) is not None)
+
+
+def read_log(stream):
+    """ Yields ``(address, status)`` pairs of CSV bounce log.
+    """
+
+    for row in csv.reader(stream):
+        if len(row) >= 2:
+            yield force_unicode(row[0]), force_unicode(row[1])
+
+
+def process_bounces(stream, chunk_size=CHUNK_SIZE):
+    """ Marks emails, which hard bounced according to log ``stream``,
+    as not used. Returns ``(marked, unknown)``: number of emails marked
+    and number of hard bounced addresses not found in database.
+    """
+
+    marked = unknown = 0
+    for chunk in bulk.chunked(read_log(stream), chunk_size):
+        keys = set(
+                normalize_email(address)
+                for address, status in chunk
+                if is_hard_bounce(status)) - set([None])
+        if not keys:
+            continue
+        with transaction.commit_on_success():
+            emails = models.Email.objects.filter(address_key__in=keys)
+            found = set(emails.values_list('address_key', flat=True))
+            unknown += len(keys - found)
+            bounced = emails.exclude(used=False)
+            rows = list(bounced.values_list('id', 'human_id', 'used'))
+            with audit.batch():
+                audit.record_update(models.Email, rows, 'used', False)
+                changefeed.record(
+                        models.Email,
+                        [(email_id, human_id)
+                         for email_id, human_id, _ in rows])
+                marked += bounced.update(used=False)
+            human_ids = set(human_id for _, human_id, _ in rows)
+            summaries.rebuild(human_ids)
+            facets.invalidate()
+    return marked, unknown
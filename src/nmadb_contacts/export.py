@@ -0,0 +1,196 @@
+""" Streaming export of query sets described by ``sheet_mapping``.
+
+``sheet_mapping`` is a sequence of ``(caption, path)`` pairs, where
+``path`` is a tuple of attribute names, for example
+``('human', 'first_name')``. Mapping is compiled once: columns, which
+end with a concrete field, are fetched with a single ``values_list``
+query with all needed joins, and rows are fetched in primary key
+ordered chunks with one query per chunk. Only method columns (like
+``get_gender_display``) need model instances, which are fetched with
+``select_related`` by one additional query per chunk. Relations to
+municipalities are resolved from the process local cache.
+"""
+
+import csv
+
+from django.db.models import FieldDoesNotExist, Model
+from django.http import HttpResponse
+from django.utils.encoding import force_unicode, smart_str
+
+from nmadb_contacts import bulk
+from nmadb_contacts import models
+from nmadb_contacts import municipalities
+
+
+CHUNK_SIZE = 500
+
+
+CACHED_MODELS = {
+        models.Municipality: municipalities.get,
+        }
+"""Related models, which are taken from process local caches instead
+of joins. Maps model to a function returning instance by id."""
+
+
+def get_path_value(obj, path):
+    """ Follows attribute ``path`` starting at ``obj``. Methods are
+    called.
+    """
+
+    for name in path:
+        if obj is None:
+            return None
+        obj = getattr(obj, name)
+        if callable(obj) and not isinstance(obj, Model):
+            obj = obj()
+    return obj
+
+
+class Column(object):
+    """ Compiled sheet column.
+    """
+
+    def __init__(self, caption, path, lookup=None, cached=None):
+        self.caption = caption
+        self.path = path
+        self.lookup = lookup
+        self.cached = cached
+
+    def get_value(self, value):
+        """ Returns value of this column from value of its lookup.
+        """
+
+        if self.cached is None:
+            return value
+        get_cached, path = self.cached
+        return get_path_value(get_cached(value), path)
+
+    def get_instance_value(self, obj):
+        """ Returns value of this column for model instance ``obj``.
+        """
+        return get_path_value(obj, self.path)
+
+
+def compile_path(model, path):
+    """ Returns values lookup for ``path``, ``select_related`` path of
+    its relations and cached accessor. Lookup is ``None`` if ``path``
+    does not end with a concrete non relation field or a relation to
+    a cached model. Cached accessor is ``None`` or a pair of function,
+    which returns cached instance by lookup value, and the remaining
+    path.
+    """
+
+    opts = model._meta
+    relations = []
+    for i, name in enumerate(path):
+        try:
+            field = opts.get_field(name)
+        except FieldDoesNotExist:
+            return None, u'__'.join(relations), None
+        if field.rel is None:
+            if i + 1 == len(path):
+                return u'__'.join(path), u'__'.join(relations), None
+            return None, u'__'.join(relations), None
+        if field.rel.to in CACHED_MODELS and i + 1 < len(path):
+            return (
+                    u'__'.join(path[:i + 1]), u'',
+                    (CACHED_MODELS[field.rel.to], path[i + 1:]))
+        relations.append(name)
+        opts = field.rel.to._meta
+    return None, u'__'.join(relations), None
+
+
+class SheetExporter(object):
+    """ Exports query sets of ``model`` according to ``sheet_mapping``.
+    """
+
+    def __init__(self, model, sheet_mapping, chunk_size=CHUNK_SIZE):
+        self.model = model
+        self.chunk_size = chunk_size
+        self.columns = []
+        self.related = set()
+        for caption, path in sheet_mapping:
+            lookup, related, cached = compile_path(model, path)
+            self.columns.append(Column(caption, path, lookup, cached))
+            if lookup is None and related:
+                self.related.add(related)
+        self.lookups = [
+                column.lookup for column in self.columns
+                if column.lookup is not None]
+        self.has_method_columns = len(self.lookups) < len(self.columns)
+
+    def get_captions(self):
+        """ Returns list of column captions.
+        """
+        return [force_unicode(column.caption) for column in self.columns]
+
+    def get_objects(self, ids):
+        """ Returns model instances, which are needed for method columns.
+        """
+
+        if not self.has_method_columns:
+            return {}
+        return self.model._default_manager.select_related(
+                *self.related).in_bulk(ids)
+
+    def iter_rows(self, queryset):
+        """ Yields lists of column values of objects in ``queryset``.
+        """
+
+        queryset = queryset.prefetch_related(None).values_list(
+                'id', *self.lookups)
+        for chunk in bulk.iter_chunks(queryset, self.chunk_size):
+            objects = self.get_objects([row[0] for row in chunk])
+            for row in chunk:
+                values = dict(zip(self.lookups, row[1:]))
+                obj = objects.get(row[0])
+                yield [
+                        column.get_value(values[column.lookup])
+                        if column.lookup is not None
+                        else column.get_instance_value(obj)
+                        for column in self.columns]
+
+    def iter_csv(self, queryset):
+        """ Yields CSV encoded lines of captions and rows.
+        """
+
+        buffer = LineBuffer()
+        writer = csv.writer(buffer)
+        writer.writerow([
+            smart_str(caption) for caption in self.get_captions()])
+        yield buffer.pop()
+        for row in self.iter_rows(queryset):
+            writer.writerow([
+                smart_str(u'' if value is None else force_unicode(value))
+                for value in row])
+            yield buffer.pop()
+
+    def csv_response(self, queryset, filename):
+        """ Returns HTTP response, which streams CSV export.
+        """
+
+        response = HttpResponse(
+                self.iter_csv(queryset),
+                content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = (
+                'attachment; filename={0}'.format(filename))
+        return response
+
+
+class LineBuffer(object):
+    """ File like object, which keeps lines written by CSV writer until
+    they are popped.
+    """
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def pop(self):
+        """ Returns and forgets written data.
+        """
+        data = ''.join(self.lines)
+        self.lines = []
+        return data
@@ -0,0 +1,158 @@
+""" Faceted counts of humans for admin sidebar.
+
+All facets of a human query set are computed with four queries: one
+grouped by gender, contract information and municipality of the main
+address (municipality types are summed from it), one grouped by
+canonical institution and two counts of humans with used phones and
+emails, which use contact summaries instead of joins.
+
+Results are cached by query set SQL and a generation token. Any change
+of humans, their contacts or municipalities replaces the token. Stale
+counts are not shown only if the cache is shared by all processes
+(memcached or database cache backend), which is configured with
+``NMADB_CONTACTS_FACETS_CACHE`` setting. With a process local cache,
+such as the default ``LocMemCache``, other processes show stale counts
+for up to :py:data:`CACHE_TIMEOUT` seconds.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.core.cache import get_cache
+from django.db.models import Count
+from django.utils.translation import ugettext as _
+
+from nmadb_contacts import counts
+from nmadb_contacts import models
+from nmadb_contacts import municipalities
+
+
+CACHE_TIMEOUT = 600
+
+cache = get_cache(
+        getattr(settings, 'NMADB_CONTACTS_FACETS_CACHE', 'default'))
+
+GENERATION_KEY = 'nmadb_contacts.facets.generation'
+
+INSTITUTION_LIMIT = 20
+"""Maximum number of institutions shown."""
+
+
+def get_generation():
+    """ Returns current generation token.
+    """
+
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        generation = invalidate()
+    return generation
+
+
+def invalidate():
+    """ Makes all cached facet counts stale. Returns new generation
+    token.
+    """
+
+    generation = uuid.uuid4().hex
+    cache.set(GENERATION_KEY, generation, CACHE_TIMEOUT)
+    return generation
+
+
+def compute(humans):
+    """ Returns dictionary of facet counts of ``humans`` query set.
+    """
+
+    humans = humans.order_by()
+    result = {
+            'total': 0,
+            'gender': {},
+            'municipality': {},
+            'municipality_type': {},
+            'contracts_info': 0,
+            }
+    groups = humans.values(
+            'gender', 'has_contracts_info',
+            'main_address__municipality').annotate(
+            count=Count('id', distinct=True))
+    for group in groups:
+        count = group['count']
+        result['total'] += count
+        for name, value in (
+                ('gender', group['gender']),
+                ('municipality', group['main_address__municipality'])):
+            result[name][value] = result[name].get(value, 0) + count
+        if group['has_contracts_info']:
+            result['contracts_info'] += count
+    for municipality_id, count in result['municipality'].items():
+        municipality = municipalities.get(municipality_id)
+        kind = municipality.municipality_type if municipality else None
+        result['municipality_type'][kind] = (
+                result['municipality_type'].get(kind, 0) + count)
+    result['institution'] = [
+            (row['canonical__title'], row['count'])
+            for row in models.Institution.objects.filter(
+                human__in=humans.values('id'),
+                canonical__isnull=False,
+                ).values('canonical', 'canonical__title').annotate(
+                count=Count('human', distinct=True)).order_by(
+                '-count', 'canonical__title')[:INSTITUTION_LIMIT]]
+    result['used_phone'] = humans.exclude(phone_numbers=u'').count()
+    result['used_email'] = humans.exclude(email_addresses=u'').count()
+    return result
+
+
+def get_counts(humans):
+    """ Returns cached facet counts of ``humans`` query set.
+    """
+
+    key = 'nmadb_contacts.facets.{0}.{1}'.format(
+            get_generation(), counts.get_digest(humans))
+    result = cache.get(key)
+    if result is None:
+        result = compute(humans)
+        cache.set(key, result, CACHE_TIMEOUT)
+    return result
+
+
+def get_choice_counts(values, choices):
+    """ Returns ``(label, count)`` pairs of counted choice ``values``.
+    """
+
+    labels = dict(choices)
+    return [
+            (labels.get(value) or _(u'unknown'), count)
+            for value, count in sorted(
+                values.items(), key=lambda item: -item[1])]
+
+
+def get_facets(humans):
+    """ Returns list of ``(title, [(label, count), ...])`` facets of
+    ``humans`` query set.
+    """
+
+    result = get_counts(humans)
+    total = result['total']
+    municipality_counts = [
+            (unicode(municipalities.get(municipality_id) or _(u'unknown')),
+             count)
+            for municipality_id, count in sorted(
+                result['municipality'].items(),
+                key=lambda item: -item[1])]
+    return [
+            (_(u'gender'), get_choice_counts(
+                result['gender'], models.Human.GENDER_CHOICES)),
+            (_(u'municipality type'), get_choice_counts(
+                result['municipality_type'],
+                models.Municipality.MUNICIPALITY_TYPES)),
+            (_(u'municipality'), municipality_counts),
+            (_(u'institution'), result['institution']),
+            (_(u'has used email'), [
+                (_(u'yes'), result['used_email']),
+                (_(u'no'), total - result['used_email'])]),
+            (_(u'has used phone'), [
+                (_(u'yes'), result['used_phone']),
+                (_(u'no'), total - result['used_phone'])]),
+            (_(u'has contract info'), [
+                (_(u'yes'), result['contracts_info']),
+                (_(u'no'), total - result['contracts_info'])]),
+            ]
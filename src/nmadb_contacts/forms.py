@@ -1,4 +1,10 @@
 from django import forms
+from django.core.urlresolvers import reverse
+from django.forms.models import BaseInlineFormSet
+from django.forms.util import ErrorDict
+from django.http import QueryDict
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from nmadb_contacts import models
 
 
@@ -9,11 +15,132 @@ class HumanForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super(HumanForm, self).__init__(*args, **kwargs)
         instance = kwargs.get('instance', None)
-        if instance is not None:
-            main_address_field = self.fields['main_address']
+        main_address_field = self.fields['main_address']
+        if instance is not None and instance.pk is not None:
             main_address_field.queryset = (
-                    main_address_field.queryset.filter(human=instance))
+                    main_address_field.queryset.filter(
+                        human=instance).only('id', 'address'))
+        else:
+            main_address_field.queryset = (
+                    main_address_field.queryset.none())
 
     class Meta(object):
         model = models.Human
         exclude = ()
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """ Inline formset, which shows only one page of related objects
+    and validates only changed rows.
+
+    ``page`` and ``query`` (request GET parameters used for page links)
+    are set on formset class by admin inline.
+    """
+
+    per_page = 10
+    page = 1
+    query = None
+
+    def get_page_param(self):
+        """ Returns name of GET parameter with page number.
+        """
+        return u'{0}-page'.format(self.prefix)
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            queryset = super(PaginatedInlineFormSet, self).get_queryset()
+            ordering = list(
+                    queryset.query.order_by or
+                    queryset.model._meta.ordering)
+            queryset = queryset.order_by(*(ordering + ['pk']))
+            self.total = queryset.count()
+            self.page_count = max(
+                    1, (self.total + self.per_page - 1) // self.per_page)
+            self.page = min(max(self.page, 1), self.page_count)
+            start = (self.page - 1) * self.per_page
+            self._queryset = queryset[start:start + self.per_page]
+        return self._queryset
+
+    def _construct_form(self, i, **kwargs):
+        form = super(PaginatedInlineFormSet, self)._construct_form(
+                i, **kwargs)
+        # Rows are printed with their human, which otherwise would be
+        # fetched again for every row.
+        setattr(form.instance, self.fk.name, self.instance)
+        return form
+
+    def get_pages(self):
+        """ Returns list of page descriptions for page links.
+        """
+
+        self.get_queryset()
+        pages = []
+        for number in range(1, self.page_count + 1):
+            query = (self.query or QueryDict('')).copy()
+            query[self.get_page_param()] = unicode(number)
+            pages.append({
+                'number': number,
+                'query': query.urlencode(),
+                'current': number == self.page,
+                })
+        return pages
+
+    def full_clean(self):
+        """ Skips validation of existing objects, which were not
+        changed.
+        """
+
+        if self.is_bound:
+            for form in self.initial_forms:
+                if not form.has_changed():
+                    form.cleaned_data = {}
+                    form._errors = ErrorDict()
+        super(PaginatedInlineFormSet, self).full_clean()
+
+
+class MailDispatchForm(forms.ModelForm):
+    """ Form for mail, which is queued from admin action.
+    """
+
+    class Meta(object):
+        model = models.MailDispatchJob
+        fields = ('subject', 'body',)
+
+
+class InstitutionTitleInput(forms.TextInput):
+    """ Text input, which suggests canonical institution titles while
+    typing.
+    """
+
+    def render(self, name, value, attrs=None):
+        url = reverse(
+                'admin:nmadb_contacts_canonicalinstitution_autocomplete')
+        attrs = dict(
+                attrs or {},
+                list='nmadb-institution-suggestions',
+                autocomplete='off')
+        attrs['data-autocomplete-url'] = url
+        return mark_safe(
+                super(InstitutionTitleInput, self).render(
+                    name, value, attrs) +
+                render_to_string(
+                    'admin/nmadb_contacts/institution_autocomplete.html'))
+
+
+class InstitutionForm(forms.ModelForm):
+    """ Form for Institution model.
+    """
+
+    class Meta(object):
+        model = models.Institution
+        widgets = {
+                'title': InstitutionTitleInput,
+                }
+
+    def clean(self):
+        cleaned_data = super(InstitutionForm, self).clean()
+        if ('title' in self.changed_data and
+                not cleaned_data.get('canonical')):
+            # Changed title is linked again on save.
+            self.instance.canonical = None
+        return cleaned_data
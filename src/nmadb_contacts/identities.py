@@ -0,0 +1,126 @@
+""" Bulk verification of humans against their identity codes.
+
+Birth date and gender are encoded in identity code, but are entered
+separately and may disagree with it. :py:func:`check` decodes codes of
+all humans chunk by chunk, fills missing birth dates and genders with
+one ``UPDATE ... CASE`` query per field in a chunk and reports
+mismatches. Humans saved one by one are filled on save and imported
+humans are filled by the importer. Other rows inserted in bulk bypass
+both and need the full pass.
+"""
+
+from django.db import transaction
+
+from nmadb_contacts import audit
+from nmadb_contacts import bulk
+from nmadb_contacts import changefeed
+from nmadb_contacts import facets
+from nmadb_contacts import identity
+from nmadb_contacts import models
+
+
+CHUNK_SIZE = 500
+
+EMPTY = {
+        'birth_date': {'birth_date__isnull': True},
+        'gender': {'gender': u''},
+        }
+"""Lookups of humans, whose field is not filled."""
+
+
+class Mismatch(object):
+    """ Human, whose ``field`` value ``stored`` differs from ``decoded``
+    from identity code. Invalid codes are reported with ``field``
+    ``identity_code``.
+    """
+
+    def __init__(self, human_id, identity_code, field, stored, decoded):
+        self.human_id = human_id
+        self.identity_code = identity_code
+        self.field = field
+        self.stored = stored
+        self.decoded = decoded
+
+    def __unicode__(self):
+        return (
+                u'{0.human_id}\t{0.identity_code}\t{0.field}\t'
+                u'{0.stored}\t{0.decoded}').format(self)
+
+
+def check_chunk(rows):
+    """ Returns ``(updates, mismatches)`` of ``(id, identity code,
+    birth date, gender)`` rows of humans. ``updates`` maps ``(field,
+    value)`` to the list of ids of humans, whose field is empty.
+    """
+
+    updates = {}
+    mismatches = []
+    for human_id, code, birth_date, gender in rows:
+        decoded = identity.decode(code)
+        if decoded is None:
+            mismatches.append(Mismatch(
+                human_id, code, u'identity_code', code, None))
+            continue
+        for field, stored, value in (
+                (u'birth_date', birth_date, decoded[0]),
+                (u'gender', gender, decoded[1])):
+            if not stored:
+                updates.setdefault((field, value), []).append(human_id)
+            elif stored != value:
+                mismatches.append(Mismatch(
+                    human_id, code, field, stored, value))
+    return updates, mismatches
+
+
+def fill(updates):
+    """ Applies ``updates`` returned by :py:func:`check_chunk`. Every
+    field is filled with one query. Returns number of updated fields.
+    """
+
+    values = {}
+    for (field, value), ids in updates.items():
+        for human_id in ids:
+            values.setdefault(field, {})[human_id] = value
+    count = 0
+    human_ids = set()
+    with transaction.commit_on_success(), audit.batch():
+        for field, field_values in sorted(values.items()):
+            ids = sorted(models.Human.objects.filter(
+                id__in=field_values.keys(), **EMPTY[field]).values_list(
+                'id', flat=True))
+            for human_id in ids:
+                audit.record_update(
+                        models.Human, [(human_id, human_id, None)],
+                        field, field_values[human_id])
+            count += bulk.update_values(
+                    models.Human, field,
+                    dict((human_id, field_values[human_id])
+                         for human_id in ids))
+            human_ids.update(ids)
+        changefeed.record(
+                models.Human,
+                [(human_id, human_id) for human_id in sorted(human_ids)])
+    return count
+
+
+def check(fix=True, chunk_size=CHUNK_SIZE):
+    """ Checks all humans with identity codes. If ``fix`` is true,
+    missing birth dates and genders are filled. Returns ``(filled,
+    mismatches)``, where ``mismatches`` is a list of
+    :py:class:`Mismatch`.
+    """
+
+    filled = 0
+    mismatches = []
+    humans = models.Human.objects.exclude(
+            identity_code__isnull=True).exclude(
+            identity_code=u'').values_list(
+            'id', 'identity_code', 'birth_date', 'gender')
+    for chunk in bulk.iter_chunks(humans, chunk_size):
+        updates, chunk_mismatches = check_chunk(chunk)
+        mismatches.extend(chunk_mismatches)
+        if fix and updates:
+            filled += fill(updates)
+    if filled:
+        facets.invalidate()
+    return filled, mismatches
@@ -0,0 +1,73 @@
+""" Lithuanian identity codes (asmens kodas).
+
+Identity code ``GYYMMDDNNNK`` consists of gender and century digit
+``G``, birth date ``YYMMDD``, serial number ``NNN`` and checksum ``K``.
+"""
+
+import datetime
+
+
+FIRST_WEIGHTS = (1, 2, 3, 4, 5, 6, 7, 8, 9, 1)
+SECOND_WEIGHTS = (3, 4, 5, 6, 7, 8, 9, 1, 2, 3)
+
+
+def get_checksum(code):
+    """ Returns checksum digit for the first ten digits of ``code``.
+    """
+
+    digits = [int(char) for char in code[:10]]
+    for weights in (FIRST_WEIGHTS, SECOND_WEIGHTS):
+        remainder = sum(
+                digit * weight
+                for digit, weight in zip(digits, weights)) % 11
+        if remainder != 10:
+            return remainder
+    return 0
+
+
+def decode_birth_date(identity_code):
+    """ Returns birth date encoded in ``identity_code`` or ``None`` if
+    it cannot be decoded.
+    """
+
+    code = unicode(identity_code or u'')
+    if len(code) != 11 or not code.isdigit() or code[0] in u'0789':
+        return None
+    century = 1800 + 100 * ((int(code[0]) - 1) // 2)
+    try:
+        return datetime.date(
+                century + int(code[1:3]), int(code[3:5]), int(code[5:7]))
+    except ValueError:
+        return None
+
+
+def is_valid(identity_code):
+    """ Returns if ``identity_code`` has valid format, birth date and
+    checksum.
+    """
+
+    code = unicode(identity_code or u'')
+    return (
+            decode_birth_date(code) is not None and
+            get_checksum(code) == int(code[10]))
+
+
+def decode_gender(identity_code):
+    """ Returns gender (``M`` or ``F``) encoded in ``identity_code`` or
+    ``None`` if it cannot be decoded. Odd first digit means male.
+    """
+
+    code = unicode(identity_code or u'')
+    if not code[:1].isdigit() or code[0] in u'0789':
+        return None
+    return u'M' if int(code[0]) % 2 else u'F'
+
+
+def decode(identity_code):
+    """ Returns ``(birth date, gender)`` encoded in valid
+    ``identity_code`` or ``None`` if code is not valid.
+    """
+
+    if not is_valid(identity_code):
+        return None
+    return decode_birth_date(identity_code), decode_gender(identity_code)
@@ -0,0 +1,435 @@
+""" Bulk import of contacts from CSV files.
+
+Each row describes one human and optionally one email, phone, address
+and institution. Rows are validated with model field validators and
+imported in chunks, each chunk in its own transaction. Rows, which
+share identity code, email address or phone number with an existing
+human, are attached to that human instead of creating a new one, unless
+their identity codes differ. Human columns other than identity code
+are validated only for rows, which create a new human, so a row may
+attach a contact without repeating the whole human. Rows of a chunk,
+which fails with integrity error, are reported as errors.
+
+Inserts bypass save signals, so the importer does their work itself:
+missing birth dates and genders are decoded from identity codes,
+institutions are linked to canonical institutions with the same key
+and audit entries of created objects are written in the transaction of
+the chunk.
+
+New objects get primary keys allocated by the importer, which allows
+to insert them with ``bulk_create`` and still know them. Primary key
+sequences are moved after imported rows at the end of every chunk. On
+PostgreSQL imported tables are locked against concurrent inserts from
+allocation until the chunk is committed, so concurrent imports and
+saves wait for each other. Other backends have no such lock, and there
+import must not run concurrently with other code creating humans or
+their contacts.
+"""
+
+import csv
+
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max
+from django.utils.encoding import force_unicode
+
+from nmadb_contacts import audit
+from nmadb_contacts import bulk
+from nmadb_contacts import changefeed
+from nmadb_contacts import dedupe
+from nmadb_contacts import facets
+from nmadb_contacts import identity
+from nmadb_contacts import models
+from nmadb_contacts import municipalities
+from nmadb_contacts import search
+from nmadb_contacts import summaries
+from nmadb_contacts.normalization import normalize_email
+from nmadb_contacts.normalization import normalize_phone
+from nmadb_contacts.normalization import normalize_title
+
+
+CHUNK_SIZE = 500
+
+HUMAN_COLUMNS = (
+        'first_name',
+        'last_name',
+        'old_last_name',
+        'gender',
+        'academic_degree',
+        'birth_date',
+        'identity_code',
+        )
+
+CONTACT_COLUMNS = (
+        ('email', models.Email, 'address'),
+        ('phone', models.Phone, 'number'),
+        ('town', models.Address, 'town'),
+        ('address', models.Address, 'address'),
+        ('institution', models.Institution, 'title'),
+        )
+
+IMPORTED_MODELS = (
+        models.Human,
+        models.Email,
+        models.Phone,
+        models.Address,
+        models.Institution,
+        )
+"""Models, whose primary keys are allocated by the importer."""
+
+LOCK_SQL = {
+        'postgresql': 'LOCK TABLE {0} IN SHARE ROW EXCLUSIVE MODE',
+        }
+"""Statements, which lock table against concurrent inserts, by
+database vendor."""
+
+
+class Row(object):
+    """ Validated import row. ``errors`` of human columns matter only
+    if the row creates a new human.
+    """
+
+    def __init__(self, line, human, contacts, errors):
+        self.line = line
+        self.human = human
+        self.contacts = contacts
+        self.errors = errors
+        self.human_id = None
+
+
+def get_next_id(model):
+    """ Returns primary key following the largest one of ``model``.
+    """
+    return (model.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+
+
+def clean_row(line, data):
+    """ Returns :py:class:`Row` or raises ``ValidationError`` with
+    messages of invalid identity code and contact columns. Messages of
+    other invalid human columns are stored in the row. Missing birth
+    date and gender are taken from valid identity code.
+    """
+
+    errors = []
+    human_errors = []
+    values = {}
+    decoded = identity.decode(
+            force_unicode(data.get('identity_code') or u'').strip())
+    defaults = dict(zip(('birth_date', 'gender'), decoded or ()))
+
+    def clean(column, model, field_name, errors=errors):
+        raw = force_unicode(data.get(column) or u'').strip()
+        field = model._meta.get_field(field_name)
+        if not raw and column in defaults:
+            return defaults[column]
+        if not raw and field.null:
+            return None
+        try:
+            return field.clean(raw, None)
+        except ValidationError as e:
+            errors.extend(
+                    u'{0}: {1}'.format(column, message)
+                    for message in e.messages)
+
+    for column in HUMAN_COLUMNS:
+        if column == 'identity_code':
+            values[column] = clean(column, models.Human, column)
+        else:
+            values[column] = clean(
+                    column, models.Human, column, human_errors)
+    contacts = {}
+    for column, model, field_name in CONTACT_COLUMNS:
+        if data.get(column):
+            contacts[column] = clean(column, model, field_name)
+    if bool(contacts.get('town')) != bool(contacts.get('address')):
+        errors.append(u'town and address must be given together')
+    if errors:
+        raise ValidationError(errors)
+    return Row(line, values, contacts, human_errors)
+
+
+class Importer(object):
+    """ Imports contacts from rows and collects errors.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.errors = []
+        self.created = 0
+        self.attached = 0
+
+    def import_csv(self, stream):
+        """ Imports rows from CSV file with header row.
+        """
+
+        reader = csv.DictReader(stream)
+        rows = (
+                (line, dict(
+                    (key, force_unicode(value or u''))
+                    for key, value in data.items()))
+                for line, data in enumerate(reader, 2))
+        try:
+            for chunk in bulk.chunked(rows, self.chunk_size):
+                self.import_chunk_safely(chunk)
+        finally:
+            self.reset_sequences()
+
+    def import_chunk_safely(self, chunk):
+        """ Imports ``chunk`` in its own transaction. If the chunk
+        violates database constraints, it is rolled back and all its
+        lines without other errors are reported as failed.
+        """
+
+        errors = len(self.errors)
+        counts = self.created, self.attached
+        try:
+            with transaction.commit_on_success(), audit.batch():
+                self.import_chunk(chunk)
+        except IntegrityError as e:
+            self.created, self.attached = counts
+            failed = set(line for line, _ in self.errors[errors:])
+            self.errors.extend(
+                    (line, u'chunk rolled back: {0}'.format(
+                        force_unicode(e)))
+                    for line, _ in chunk if line not in failed)
+
+    def import_chunk(self, chunk):
+        """ Validates and imports ``(line, data)`` pairs. Must run in
+        a managed transaction inside ``audit.batch`` block.
+        """
+
+        self.lock_tables()
+        rows = []
+        for line, data in chunk:
+            try:
+                rows.append(clean_row(line, data))
+            except ValidationError as e:
+                self.errors.append((line, u'; '.join(e.messages)))
+        self.match_humans(rows)
+        new_humans = self.create_humans(rows)
+        self.create_contacts(rows)
+        search.rebuild_chunk([
+            (human.id, human.first_name, human.last_name,
+             human.old_last_name)
+            for human in new_humans])
+        human_ids = set(row.human_id for row in rows)
+        dedupe.rebuild_keys(human_ids)
+        summaries.rebuild(human_ids)
+        changefeed.record_humans(human_ids)
+        facets.invalidate()
+        self.reset_sequences()
+
+    def reject(self, row, message):
+        """ Reports ``row`` as failed and excludes it from import.
+        """
+
+        self.errors.append((row.line, message))
+        row.human_id = False
+
+    def match_humans(self, rows):
+        """ Sets ``human_id`` of rows, which match existing humans by
+        identity code, email address or phone number. Rows, which
+        match several humans or a human with other identity code, are
+        rejected.
+        """
+
+        lookups = (
+                (models.Human, 'identity_code', 'id', lambda row:
+                    row.human['identity_code']),
+                (models.Email, 'address_key', 'human_id', lambda row:
+                    normalize_email(row.contacts.get('email'))),
+                (models.Phone, 'number_key', 'human_id', lambda row:
+                    normalize_phone(row.contacts.get('phone'))),
+                )
+        for model, field_name, human_field, get_value in lookups:
+            values = set(get_value(row) for row in rows) - set([None])
+            found = dict(model.objects.filter(**{
+                field_name + '__in': values,
+                }).values_list(field_name, human_field))
+            for row in rows:
+                human_id = found.get(get_value(row))
+                if human_id is None or row.human_id is False:
+                    continue
+                if row.human_id is None:
+                    row.human_id = human_id
+                elif row.human_id != human_id:
+                    self.reject(row, (
+                        u'{0} {1} belongs to another human ({2})'
+                        ).format(field_name, get_value(row), human_id))
+        codes = dict(models.Human.objects.filter(
+            id__in=set(row.human_id for row in rows) - set([None, False]),
+            ).values_list('id', 'identity_code'))
+        for row in rows:
+            if row.human_id is None or row.human_id is False:
+                continue
+            code = codes[row.human_id]
+            if code and row.human['identity_code'] not in (None, code):
+                self.reject(row, (
+                    u'identity code {0} differs from {1} of human {2}'
+                    ).format(row.human['identity_code'], code,
+                             row.human_id))
+            else:
+                self.attached += 1
+        rows[:] = [row for row in rows if row.human_id is not False]
+
+    def create_humans(self, rows):
+        """ Inserts humans of unmatched rows with one query and returns
+        them. Rows in the same chunk with the same identity code, email
+        address or phone number create one human, unless their identity
+        codes differ or they match different humans.
+        """
+
+        next_id = get_next_id(models.Human)
+        humans = {}
+        known = {}
+        for row in rows:
+            if row.human_id is not None:
+                continue
+            keys = [
+                    (name, value) for name, value in (
+                        ('identity_code', row.human['identity_code']),
+                        ('email', normalize_email(
+                            row.contacts.get('email'))),
+                        ('phone', normalize_phone(
+                            row.contacts.get('phone'))))
+                    if value]
+            matched = set(known[key] for key in keys if key in known)
+            code = row.human['identity_code']
+            if len(matched) > 1:
+                self.reject(row, u'row matches several imported humans')
+                continue
+            elif matched:
+                human = humans[matched.pop()]
+                if code and human.identity_code not in (None, code):
+                    self.reject(row, (
+                        u'identity code {0} differs from {1} of '
+                        u'human imported from the same chunk'
+                        ).format(code, human.identity_code))
+                    continue
+                if code and human.identity_code is None:
+                    human.identity_code = code
+                    if human.birth_date is None:
+                        human.birth_date = row.human['birth_date']
+                row.human_id = human.id
+            elif row.errors:
+                self.reject(row, u'; '.join(row.errors))
+                continue
+            else:
+                row.human_id = next_id
+                humans[next_id] = models.Human(id=next_id, **row.human)
+                next_id += 1
+            for key in keys:
+                known.setdefault(key, row.human_id)
+        rows[:] = [row for row in rows if row.human_id is not False]
+        humans = [human for _, human in sorted(humans.items())]
+        bulk.bulk_create(models.Human, humans)
+        for human in humans:
+            audit.record(human, u'C')
+        self.created += len(humans)
+        return humans
+
+    def create_contacts(self, rows):
+        """ Inserts contacts, which are not yet known, with one query
+        per model. Institutions are linked to canonical institutions
+        with the same normalized title.
+        """
+
+        human_ids = set(row.human_id for row in rows)
+        emails = set()
+        for address, address_key in models.Email.objects.filter(
+                human__in=human_ids).values_list('address', 'address_key'):
+            emails.update((address, address_key))
+        numbers = set()
+        for number, number_key in models.Phone.objects.filter(
+                human__in=human_ids).values_list('number', 'number_key'):
+            numbers.update((number, number_key))
+        addresses = set(models.Address.objects.filter(
+            human__in=human_ids).values_list('human_id', 'town', 'address'))
+        institutions = set(models.Institution.objects.filter(
+            human__in=human_ids).values_list('human_id', 'title'))
+        new = dict((model, []) for model in (
+            models.Email, models.Phone, models.Address,
+            models.Institution))
+        for row in rows:
+            contacts = row.contacts
+            email = contacts.get('email')
+            email_key = normalize_email(email)
+            if email and not emails.intersection(
+                    (email, email_key or email)):
+                emails.update((email, email_key))
+                new[models.Email].append(models.Email(
+                    human_id=row.human_id, address=email,
+                    address_key=email_key))
+            number = contacts.get('phone')
+            number_key = normalize_phone(number)
+            if number and not numbers.intersection(
+                    (number, number_key or number)):
+                numbers.update((number, number_key))
+                new[models.Phone].append(models.Phone(
+                    human_id=row.human_id, number=number,
+                    number_key=number_key))
+            address = (
+                    row.human_id, contacts.get('town'),
+                    contacts.get('address'))
+            if address[1] and address not in addresses:
+                addresses.add(address)
+                new[models.Address].append(models.Address(
+                    human_id=row.human_id, town=address[1],
+                    address=address[2],
+                    municipality=municipalities.resolve_town(address[1])))
+            institution = (row.human_id, contacts.get('institution'))
+            if institution[1] and institution not in institutions:
+                institutions.add(institution)
+                new[models.Institution].append(models.Institution(
+                    human_id=row.human_id, title=institution[1]))
+        self.link_institutions(new[models.Institution])
+        for model in IMPORTED_MODELS[1:]:
+            objects = new[model]
+            next_id = get_next_id(model)
+            for offset, obj in enumerate(objects):
+                obj.id = next_id + offset
+            bulk.bulk_create(model, objects)
+            for obj in objects:
+                audit.record(obj, u'C')
+
+    def link_institutions(self, institutions):
+        """ Sets canonical institutions of new ``institutions`` like it
+        is done on save.
+        """
+
+        keys = dict(
+                (institution, normalize_title(institution.title))
+                for institution in institutions)
+        canonicals = {}
+        for chunk in bulk.chunked(
+                sorted(set(keys.values()) - set([None])), bulk.BATCH_SIZE):
+            canonicals.update(
+                    models.CanonicalInstitution.objects.filter(
+                        key__in=chunk).values_list('key', 'id'))
+        for institution, key in keys.items():
+            institution.canonical_id = canonicals.get(key)
+
+    def lock_tables(self):
+        """ Locks imported tables against concurrent inserts until the
+        end of the current transaction, if the database supports it.
+        """
+
+        sql = LOCK_SQL.get(connection.vendor)
+        if sql is None:
+            return
+        cursor = connection.cursor()
+        for model in IMPORTED_MODELS:
+            cursor.execute(sql.format(
+                connection.ops.quote_name(model._meta.db_table)))
+
+    def reset_sequences(self):
+        """ Moves primary key sequences of imported models after
+        imported rows.
+        """
+
+        cursor = connection.cursor()
+        for sql in connection.ops.sequence_reset_sql(
+                no_style(), IMPORTED_MODELS):
+            cursor.execute(sql)
+        transaction.commit_unless_managed()
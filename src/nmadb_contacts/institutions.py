@@ -0,0 +1,249 @@
+""" Catalogue of canonical institutions.
+
+Free text ``Institution.title`` values are linked to
+:py:class:`nmadb_contacts.models.CanonicalInstitution`, so humans are
+grouped and filtered by institution with integer joins. Titles are
+compared by normalized key (folded words) and, when keys differ, by
+similarity of character trigrams. Trigrams of canonical titles are
+stored in :py:class:`nmadb_contacts.models.InstitutionTrigram`, so
+candidates are found with one indexed query instead of comparing with
+the whole catalogue. Batch matcher looks up candidates of a whole chunk
+of titles at once and links them with set based updates.
+"""
+
+from django.db import transaction
+from django.db.models import Count
+
+from nmadb_contacts import audit
+from nmadb_contacts import bulk
+from nmadb_contacts import changefeed
+from nmadb_contacts import facets
+from nmadb_contacts import models
+from nmadb_contacts import normalization
+
+
+CHUNK_SIZE = 500
+
+CANDIDATE_LIMIT = 20
+"""Number of canonical institutions with most shared trigrams, which
+are compared with title."""
+
+MATCH_SIMILARITY = 0.7
+"""Titles this similar are linked by batch matcher automatically."""
+
+SUGGEST_SIMILARITY = 0.3
+"""Minimum similarity of suggestions."""
+
+
+def index(canonical):
+    """ Replaces stored trigrams of ``canonical`` institution.
+    """
+
+    models.InstitutionTrigram.objects.filter(canonical=canonical).delete()
+    bulk.bulk_create(models.InstitutionTrigram, [
+        models.InstitutionTrigram(canonical=canonical, trigram=trigram)
+        for trigram in sorted(normalization.get_trigrams(canonical.key))])
+
+
+def get_by_key(key):
+    """ Returns canonical institution with normalized ``key`` or
+    ``None``.
+    """
+
+    if key is None:
+        return None
+    try:
+        return models.CanonicalInstitution.objects.get(key=key)
+    except models.CanonicalInstitution.DoesNotExist:
+        return None
+
+
+def suggest(title, limit=10, min_similarity=SUGGEST_SIMILARITY):
+    """ Returns list of ``(canonical institution, similarity)`` pairs
+    of institutions similar to ``title``, most similar first.
+    """
+
+    key = normalization.normalize_title(title)
+    if key is None:
+        return []
+    trigrams = normalization.get_trigrams(key)
+    candidates = models.InstitutionTrigram.objects.filter(
+            trigram__in=trigrams).values('canonical').annotate(
+            shared=Count('id')).order_by('-shared')[:CANDIDATE_LIMIT]
+    scored = []
+    for canonical in models.CanonicalInstitution.objects.filter(
+            id__in=[row['canonical'] for row in candidates]):
+        if canonical.key == key:
+            similarity = 1.0
+        else:
+            similarity = normalization.get_similarity(
+                    trigrams, normalization.get_trigrams(canonical.key))
+        if similarity >= min_similarity:
+            scored.append((canonical, similarity))
+    scored.sort(key=lambda pair: (-pair[1], pair[0].title))
+    return scored[:limit]
+
+
+def get_candidates(keys):
+    """ Returns dictionary, which maps normalized ``keys`` to lists of
+    ids of canonical institutions sharing most trigrams with them.
+    Trigrams of all keys are looked up together.
+    """
+
+    trigrams = dict(
+            (key, normalization.get_trigrams(key)) for key in keys)
+    owners = {}
+    for chunk in bulk.chunked(
+            sorted(set().union(*trigrams.values())), bulk.BATCH_SIZE):
+        rows = models.InstitutionTrigram.objects.filter(
+                trigram__in=chunk).values_list('trigram', 'canonical')
+        for trigram, canonical_id in rows:
+            owners.setdefault(trigram, []).append(canonical_id)
+    candidates = {}
+    for key, key_trigrams in trigrams.items():
+        shared = {}
+        for trigram in key_trigrams:
+            for canonical_id in owners.get(trigram, ()):
+                shared[canonical_id] = shared.get(canonical_id, 0) + 1
+        candidates[key] = sorted(
+                shared, key=lambda canonical_id: (
+                    -shared[canonical_id], canonical_id),
+                )[:CANDIDATE_LIMIT]
+    return candidates
+
+
+def get_best(key, canonicals, min_similarity):
+    """ Returns the most similar to ``key`` of ``(canonical
+    institution, trigrams)`` pairs or ``None`` if none is similar
+    enough.
+    """
+
+    trigrams = normalization.get_trigrams(key)
+    best = None
+    for canonical, canonical_trigrams in canonicals:
+        similarity = normalization.get_similarity(
+                trigrams, canonical_trigrams)
+        if similarity >= min_similarity and (
+                best is None or (-similarity, canonical.title) <
+                (-best[0], best[1].title)):
+            best = similarity, canonical
+    return None if best is None else best[1]
+
+
+def match_keys(keys, min_similarity=MATCH_SIMILARITY):
+    """ Returns dictionary, which maps normalized ``keys`` to their
+    canonical institutions. Keys without match are left out. Number of
+    queries does not depend on the number of keys, except for splitting
+    long parameter lists.
+    """
+
+    keys = set(keys) - set([None])
+    matched = {}
+    for chunk in bulk.chunked(sorted(keys), bulk.BATCH_SIZE):
+        matched.update(
+                (canonical.key, canonical)
+                for canonical in models.CanonicalInstitution.objects.filter(
+                    key__in=chunk))
+    rest = keys - set(matched)
+    if not rest:
+        return matched
+    candidates = get_candidates(rest)
+    canonicals = {}
+    for chunk in bulk.chunked(
+            sorted(set().union(*candidates.values())), bulk.BATCH_SIZE):
+        for canonical in models.CanonicalInstitution.objects.filter(
+                id__in=chunk):
+            canonicals[canonical.id] = (
+                    canonical, normalization.get_trigrams(canonical.key))
+    for key in rest:
+        canonical = get_best(
+                key,
+                [canonicals[canonical_id]
+                 for canonical_id in candidates[key]
+                 if canonical_id in canonicals],
+                min_similarity)
+        if canonical is not None:
+            matched[key] = canonical
+    return matched
+
+
+def match(title, min_similarity=MATCH_SIMILARITY):
+    """ Returns canonical institution of ``title`` or ``None``.
+    """
+
+    key = normalization.normalize_title(title)
+    return match_keys([key], min_similarity).get(key)
+
+
+def link(canonical_ids):
+    """ Links institutions, which are not linked yet, to canonical
+    institutions. ``canonical_ids`` maps institution title to canonical
+    institution id. Returns number of linked rows.
+    """
+
+    linked = 0
+    for chunk in bulk.chunked(sorted(canonical_ids), bulk.BATCH_SIZE):
+        rows = list(models.Institution.objects.filter(
+            canonical__isnull=True, title__in=chunk).values_list(
+            'id', 'human_id', 'title'))
+        for institution_id, human_id, title in rows:
+            audit.record_update(
+                    models.Institution, [(institution_id, human_id, None)],
+                    'canonical_id', canonical_ids[title])
+        changefeed.record(
+                models.Institution,
+                [(institution_id, human_id)
+                 for institution_id, human_id, _ in rows])
+        linked += bulk.update_values(
+                models.Institution, 'canonical',
+                dict(
+                    (institution_id, canonical_ids[title])
+                    for institution_id, _, title in rows))
+    return linked
+
+
+def match_all(create=False, chunk_size=CHUNK_SIZE):
+    """ Links all not linked institutions to canonical institutions.
+    Titles are matched by key or trigram similarity. If ``create`` is
+    true, canonical institutions are created for titles without match,
+    otherwise such titles are returned. Returns ``(linked, created,
+    unmatched)``.
+    """
+
+    titles = models.Institution.objects.filter(
+            canonical__isnull=True).values('title').annotate(
+            count=Count('id')).order_by('title')
+    groups = {}
+    for row in titles:
+        key = normalization.normalize_title(row['title'])
+        if key is not None:
+            groups.setdefault(key, []).append(
+                    (row['count'], row['title']))
+    linked = created = 0
+    unmatched = []
+    for chunk in bulk.chunked(sorted(groups), chunk_size):
+        with transaction.commit_on_success(), audit.batch():
+            matched = match_keys(chunk)
+            # Institutions created for earlier keys of the chunk are
+            # not in the looked up candidates.
+            new = []
+            for key in chunk:
+                if key in matched:
+                    continue
+                canonical = get_best(key, new, MATCH_SIMILARITY)
+                if canonical is None and create:
+                    canonical = models.CanonicalInstitution.objects.create(
+                            title=max(groups[key])[1].strip())
+                    new.append((
+                        canonical, normalization.get_trigrams(key)))
+                    created += 1
+                if canonical is None:
+                    unmatched.extend(title for _, title in groups[key])
+                else:
+                    matched[key] = canonical
+            linked += link(dict(
+                (title, matched[key].id)
+                for key in chunk if key in matched
+                for _, title in groups[key]))
+    facets.invalidate()
+    return linked, created, unmatched
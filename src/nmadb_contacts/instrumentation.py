@@ -0,0 +1,138 @@
+""" Query budgets and request level SQL instrumentation.
+
+Model admins declare maximum numbers of queries of their views in
+``query_budgets`` dictionary, which maps ``'changelist'``, ``'change'``
+or an action name to the budget. Budgets are enforced by tests and
+checked by :py:class:`SQLInstrumentationMiddleware`, which logs query
+count, total SQL time and the slowest statements of every request.
+
+To enable the middleware add
+``'nmadb_contacts.instrumentation.SQLInstrumentationMiddleware'`` to
+``MIDDLEWARE_CLASSES``. Records are written to ``nmadb_contacts.sql``
+logger, so they can be sent to any logging handler.
+"""
+
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.urlresolvers import resolve, Resolver404
+from django.db import connection, reset_queries
+
+
+logger = logging.getLogger('nmadb_contacts.sql')
+
+SLOWEST_COUNT = getattr(settings, 'NMADB_CONTACTS_SQL_SLOWEST', 3)
+"""Number of the slowest statements included into request record."""
+
+
+class Measurement(object):
+    """ Context manager, which measures wall time, number of queries
+    and total SQL time.
+    """
+
+    def __enter__(self):
+        self.use_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        reset_queries()
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def stop(self):
+        """ Stops measuring.
+        """
+
+        self.seconds = time.time() - self.start
+        self.statements = list(connection.queries)
+        self.queries = len(self.statements)
+        self.sql_seconds = sum(
+                float(statement['time']) for statement in self.statements)
+        connection.use_debug_cursor = self.use_debug_cursor
+
+    def get_slowest(self, count=SLOWEST_COUNT):
+        """ Returns the slowest statements.
+        """
+        return sorted(
+                self.statements,
+                key=lambda statement: float(statement['time']),
+                reverse=True)[:count]
+
+    def as_dict(self):
+        """ Returns measurement results.
+        """
+        return {'seconds': self.seconds, 'queries': self.queries}
+
+
+def get_admin_view(path, action=None):
+    """ Returns ``(model_admin, view)`` of admin ``path`` or
+    ``(None, None)`` if path is not a model admin view. If ``action``
+    is given for change list, view is the action name.
+    """
+
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return None, None
+    url_name = match.url_name or u''
+    for model, model_admin in admin.site._registry.items():
+        prefix = u'{0.app_label}_{0.module_name}_'.format(model._meta)
+        if not url_name.startswith(prefix):
+            continue
+        view = url_name[len(prefix):]
+        if view == 'changelist' and action:
+            view = action
+        return model_admin, view
+    return None, None
+
+
+def get_budget(model_admin, view):
+    """ Returns query budget of ``view`` or ``None``.
+    """
+    return getattr(model_admin, 'query_budgets', {}).get(view)
+
+
+class SQLInstrumentationMiddleware(object):
+    """ Logs SQL statistics of every request.
+
+    Queries executed while streaming response content (for example,
+    CSV exports) are not included.
+    """
+
+    def process_request(self, request):
+        request._sql_measurement = Measurement().__enter__()
+
+    def process_response(self, request, response):
+        measurement = getattr(request, '_sql_measurement', None)
+        if measurement is None:
+            return response
+        measurement.stop()
+        model_admin, view = get_admin_view(
+                request.path_info, request.POST.get('action')
+                if request.method == 'POST' else None)
+        record = {
+                'path': request.path_info,
+                'method': request.method,
+                'status': response.status_code,
+                'queries': measurement.queries,
+                'sql_seconds': measurement.sql_seconds,
+                'seconds': measurement.seconds,
+                'slowest': [
+                    {'sql': statement['sql'], 'time': statement['time']}
+                    for statement in measurement.get_slowest()],
+                }
+        level = logging.INFO
+        if model_admin is not None:
+            record['admin'] = type(model_admin).__name__
+            record['view'] = view
+            budget = get_budget(model_admin, view)
+            if budget is not None:
+                record['budget'] = budget
+                if measurement.queries > budget:
+                    level = logging.WARNING
+        logger.log(level, json.dumps(record, sort_keys=True))
+        return response
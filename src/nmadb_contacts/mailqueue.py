@@ -0,0 +1,296 @@
+""" Mail dispatch jobs, which are sent in chunks outside HTTP requests.
+
+Admin actions only store selected object ids in
+:py:class:`nmadb_contacts.models.MailDispatchJob`. Jobs are sent by
+``dispatch_mail`` management command, which runs a pool of worker
+threads. Every worker claims a pending job, resolves recipients and
+renders templates of one chunk of objects at a time, sends the chunk
+over one SMTP connection and stores progress after each chunk. Claimed
+job is leased for :py:data:`LEASE_TIMEOUT` seconds and the lease is
+renewed after each chunk, so jobs of crashed workers are claimed again
+and continue from the last stored chunk. Emails are marked as used only
+after their message was sent.
+
+Mail is sent with the configured ``EMAIL_BACKEND``, so for testing
+it is enough to point ``EMAIL_HOST`` and ``EMAIL_PORT`` to a local
+SMTP stand-in, for example ``python -m smtpd -n -c DebuggingServer
+localhost:1025``.
+"""
+
+import datetime
+import logging
+import smtplib
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core import mail
+from django.db import connection
+from django.db.models import Q
+from django.template import Context, Template
+from django.utils import timezone
+
+from nmadb_contacts import models
+from nmadb_contacts import recipients
+
+
+logger = logging.getLogger('nmadb_contacts.mailqueue')
+
+CHUNK_SIZE = 100
+RATE_LIMIT = getattr(settings, 'NMADB_CONTACTS_MAIL_RATE_LIMIT', 10)
+"""Maximum number of messages sent per second by all workers."""
+RETRIES = 3
+RETRY_DELAY = 5
+"""Seconds to wait before the first retry. Delay grows linearly."""
+LEASE_TIMEOUT = getattr(settings, 'NMADB_CONTACTS_MAIL_LEASE', 600)
+"""Seconds, after which job of a worker, which did not report progress,
+is claimed by another worker. Must be longer than sending one chunk."""
+
+TARGETS = {
+        u'email': (models.Email, recipients.EmailRecipientResolver),
+        u'human': (models.Human, recipients.HumanRecipientResolver),
+        }
+
+TEMPORARY_ERRORS = (smtplib.SMTPException, socket.error)
+
+
+class LeaseLost(Exception):
+    """ Raised when job was claimed by another worker, because its lease
+    expired.
+    """
+
+
+class RateLimiter(object):
+    """ Limits number of events per second. Shared between threads.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_time = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """ Blocks until the next event is allowed.
+        """
+
+        with self.lock:
+            now = time.time()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+def queue(target, queryset, subject, body):
+    """ Creates job, which sends mail to objects of ``queryset``.
+    """
+
+    job = models.MailDispatchJob(target=target, subject=subject, body=body)
+    job.set_object_ids(queryset.order_by('id').values_list('id', flat=True))
+    job.save()
+    return job
+
+
+def get_lease():
+    """ Returns expiry time of a new lease.
+    """
+
+    return timezone.now().replace(microsecond=0) + datetime.timedelta(
+            seconds=LEASE_TIMEOUT)
+
+
+def claim():
+    """ Marks the oldest pending job or running job with expired lease
+    as running and returns it or returns ``None`` if there are no such
+    jobs.
+    """
+
+    claimable = models.MailDispatchJob.objects.filter(
+            Q(status=models.MailDispatchJob.STATUS_PENDING) |
+            Q(status=models.MailDispatchJob.STATUS_RUNNING,
+              leased_until__lt=timezone.now()))
+    for job_id in claimable.order_by('created').values_list(
+            'id', flat=True):
+        if claimable.filter(id=job_id).update(
+                status=models.MailDispatchJob.STATUS_RUNNING,
+                started=timezone.now(),
+                leased_until=get_lease()):
+            return models.MailDispatchJob.objects.get(id=job_id)
+    return None
+
+
+def reopen(connection):
+    """ Replaces broken SMTP ``connection`` with a new one.
+    """
+
+    try:
+        connection.close()
+    except TEMPORARY_ERRORS:
+        pass
+    connection.open()
+
+
+def send(message, retries, retry_delay):
+    """ Sends ``message`` retrying on temporary errors. Connection of
+    message is reopened before retry. Returns ``None`` on success and
+    the last error otherwise.
+    """
+
+    for attempt in range(retries + 1):
+        try:
+            if attempt:
+                reopen(message.connection)
+            message.send()
+            return None
+        except TEMPORARY_ERRORS as e:
+            error = e
+            logger.warning(u'Sending to %s failed: %s', message.to, e)
+            if attempt < retries:
+                time.sleep(retry_delay * (attempt + 1))
+    return error
+
+
+class JobRunner(object):
+    """ Sends one mail dispatch job.
+    """
+
+    def __init__(
+            self, job, rate_limiter, chunk_size=CHUNK_SIZE,
+            retries=RETRIES, retry_delay=RETRY_DELAY):
+        self.job = job
+        self.rate_limiter = rate_limiter
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.subject = Template(job.subject)
+        self.body = Template(job.body)
+        self.model, self.resolver_class = TARGETS[job.target]
+
+    def update(self, **kwargs):
+        """ Stores job fields without overwriting concurrent changes
+        of other fields and renews the lease. Raises
+        :py:class:`LeaseLost` if job was claimed by another worker.
+        """
+
+        kwargs['leased_until'] = get_lease()
+        if not models.MailDispatchJob.objects.filter(
+                id=self.job.id,
+                leased_until=self.job.leased_until).update(**kwargs):
+            raise LeaseLost()
+        for name, value in kwargs.items():
+            setattr(self.job, name, value)
+
+    def run(self):
+        """ Sends all not yet processed chunks of the job.
+        """
+
+        object_ids = self.job.get_object_ids()
+        try:
+            try:
+                for start in range(
+                        self.job.processed, len(object_ids),
+                        self.chunk_size):
+                    self.send_chunk(
+                            object_ids[start:start + self.chunk_size])
+            except LeaseLost:
+                raise
+            except Exception as e:
+                logger.exception(
+                        u'Mail dispatch job %s failed.', self.job.id)
+                self.update(
+                        status=models.MailDispatchJob.STATUS_FAILED,
+                        error=unicode(e),
+                        finished=timezone.now())
+                return
+            self.update(
+                    status=models.MailDispatchJob.STATUS_DONE,
+                    finished=timezone.now())
+        except LeaseLost:
+            logger.warning(
+                    u'Mail dispatch job %s was claimed by another worker.',
+                    self.job.id)
+
+    def render(self, address, context, connection):
+        """ Returns message for ``address``, which is sent over SMTP
+        ``connection``.
+        """
+
+        context = Context(context, autoescape=False)
+        subject = u' '.join(self.subject.render(context).split())
+        return mail.EmailMessage(
+                subject, self.body.render(context),
+                settings.DEFAULT_FROM_EMAIL, [address],
+                connection=connection)
+
+    def send_chunk(self, ids):
+        """ Sends mail to objects with ``ids``.
+        """
+
+        queryset = self.model.objects.filter(id__in=ids).order_by('id')
+        resolver = self.resolver_class(queryset)
+        sent = failed = 0
+        error = self.job.error
+        mail_connection = mail.get_connection()
+        try:
+            mail_connection.open()
+            for obj in queryset:
+                for email_id, address, context in resolver.resolve(obj):
+                    self.rate_limiter.wait()
+                    result = send(
+                            self.render(address, context, mail_connection),
+                            self.retries, self.retry_delay)
+                    if result is None:
+                        sent += 1
+                        resolver.used_ids.append(email_id)
+                    else:
+                        failed += 1
+                        error = u'{0}: {1}'.format(address, result)
+        finally:
+            resolver.mark()
+            try:
+                mail_connection.close()
+            except TEMPORARY_ERRORS:
+                pass
+        self.update(
+                processed=self.job.processed + len(ids),
+                sent=self.job.sent + sent,
+                failed=self.job.failed + failed,
+                error=error)
+
+
+def work(rate_limiter, **kwargs):
+    """ Runs pending jobs until there are none left.
+    """
+
+    while True:
+        job = claim()
+        if job is None:
+            break
+        JobRunner(job, rate_limiter, **kwargs).run()
+
+
+def work_in_thread(*args, **kwargs):
+    """ Runs :py:func:`work` and closes thread database connection.
+    """
+
+    try:
+        work(*args, **kwargs)
+    finally:
+        connection.close()
+
+
+def run_workers(workers, rate_limit=RATE_LIMIT, **kwargs):
+    """ Runs ``workers`` threads, which send pending jobs, and waits
+    until they finish.
+    """
+
+    rate_limiter = RateLimiter(rate_limit)
+    threads = [
+            threading.Thread(
+                target=work_in_thread, args=(rate_limiter,), kwargs=kwargs)
+            for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
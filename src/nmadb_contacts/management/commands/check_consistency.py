@@ -0,0 +1,39 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from nmadb_contacts import consistency
+
+
+class Command(NoArgsCommand):
+    """ Reports and optionally fixes inconsistent main addresses and
+    contacts.
+    """
+
+    help = (
+            u'Writes tab separated report of humans with main address of '
+            u'another human or without main address and of the only '
+            u'contacts marked as not used. With --fix main addresses are '
+            u'fixed.')
+
+    option_list = NoArgsCommand.option_list + (
+            make_option(
+                '--fix',
+                action='store_true',
+                default=False,
+                help=u'Fix main addresses.'),
+            make_option(
+                '--chunk-size',
+                type='int',
+                default=consistency.CHUNK_SIZE,
+                help=u'Number of violations processed in one transaction.'),
+            )
+
+    def handle_noargs(self, **options):
+        count = 0
+        for name, object_id, related_id in consistency.check(
+                options['fix'], options['chunk_size']):
+            self.stdout.write(u'{0}\t{1}\t{2}\n'.format(
+                name, object_id, related_id if related_id else u''))
+            count += 1
+        self.stderr.write(u'{0} violations.\n'.format(count))
@@ -0,0 +1,40 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from nmadb_contacts import identities
+
+
+class Command(NoArgsCommand):
+    """ Verifies birth dates and genders of humans against their
+    identity codes.
+    """
+
+    help = (
+            u'Fills missing birth dates and genders of humans from their '
+            u'identity codes and writes tab separated report of humans, '
+            u'whose identity codes are invalid or disagree with stored '
+            u'values.')
+
+    option_list = NoArgsCommand.option_list + (
+            make_option(
+                '--dry-run',
+                action='store_true',
+                default=False,
+                help=u'Only report, do not fill missing values.'),
+            make_option(
+                '--chunk-size',
+                type='int',
+                default=identities.CHUNK_SIZE,
+                help=u'Number of humans processed in one transaction.'),
+            )
+
+    def handle_noargs(self, **options):
+        filled, mismatches = identities.check(
+                not options['dry_run'], options['chunk_size'])
+        self.stdout.write(
+                u'human\tidentity code\tfield\tstored\tdecoded\n')
+        for mismatch in mismatches:
+            self.stdout.write(unicode(mismatch) + u'\n')
+        self.stderr.write(u'Filled {0} fields, {1} mismatches.\n'.format(
+            filled, len(mismatches)))
@@ -0,0 +1,55 @@
+from optparse import make_option
+import time
+
+from django.core.management.base import NoArgsCommand
+
+from nmadb_contacts import mailqueue
+
+
+class Command(NoArgsCommand):
+    """ Sends mail queued by admin actions.
+    """
+
+    help = (
+            u'Sends mail queued by admin actions with a pool of worker '
+            u'threads. Exits when there are no pending jobs unless '
+            u'--poll is given.')
+
+    option_list = NoArgsCommand.option_list + (
+            make_option(
+                '--workers',
+                type='int',
+                default=4,
+                help=u'Number of worker threads.'),
+            make_option(
+                '--rate-limit',
+                type='float',
+                default=mailqueue.RATE_LIMIT,
+                help=u'Maximum number of messages sent per second.'),
+            make_option(
+                '--chunk-size',
+                type='int',
+                default=mailqueue.CHUNK_SIZE,
+                help=u'Number of objects handled at once.'),
+            make_option(
+                '--retries',
+                type='int',
+                default=mailqueue.RETRIES,
+                help=u'Number of retries of failed message.'),
+            make_option(
+                '--poll',
+                type='int',
+                default=0,
+                help=u'Check for new jobs every given number of seconds.'),
+            )
+
+    def handle_noargs(self, **options):
+        while True:
+            mailqueue.run_workers(
+                    options['workers'],
+                    rate_limit=options['rate_limit'],
+                    chunk_size=options['chunk_size'],
+                    retries=options['retries'])
+            if not options['poll']:
+                break
+            time.sleep(options['poll'])
@@ -0,0 +1,42 @@
+from optparse import make_option
+import json
+
+from django.core.management.base import NoArgsCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from nmadb_contacts import changefeed
+
+
+class Command(NoArgsCommand):
+    """ Writes changes of contacts since cursor as JSON lines.
+    """
+
+    help = (
+            u'Writes pages of changed and deleted contacts since the '
+            u'given cursor as JSON lines. Each page contains cursor of '
+            u'the next sync. Without --cursor only the current cursor '
+            u'is written, which should be taken before a full export.')
+
+    option_list = NoArgsCommand.option_list + (
+            make_option(
+                '--cursor',
+                help=u'Cursor returned by the previous sync.'),
+            make_option(
+                '--page-size',
+                type='int',
+                default=changefeed.PAGE_SIZE,
+                help=u'Maximum number of changes in one page.'),
+            )
+
+    def handle_noargs(self, **options):
+        if options['cursor'] is None:
+            self.stdout.write(json.dumps(
+                {'cursor': changefeed.get_cursor()}) + '\n')
+            return
+        try:
+            for page in changefeed.iter_changes(
+                    options['cursor'], options['page_size']):
+                self.stdout.write(json.dumps(
+                    page.as_dict(), cls=DjangoJSONEncoder) + '\n')
+        except changefeed.CursorExpired:
+            raise CommandError(u'Cursor expired, full export is needed.')
@@ -0,0 +1,37 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from nmadb_contacts import dedupe
+from nmadb_contacts import models
+
+
+class Command(NoArgsCommand):
+    """ Finds humans, which may be duplicates.
+    """
+
+    help = (
+            u'Finds humans, which may be duplicates. By default only '
+            u'humans changed since the last run are checked.')
+
+    option_list = NoArgsCommand.option_list + (
+            make_option(
+                '--full',
+                action='store_true',
+                default=False,
+                help=u'Rebuild keys and candidates of all humans.'),
+            make_option(
+                '--chunk-size',
+                type='int',
+                default=dedupe.CHUNK_SIZE,
+                help=u'Number of humans or keys processed at once.'),
+            )
+
+    def handle_noargs(self, **options):
+        if options['full']:
+            dedupe.find_all(options['chunk_size'])
+        else:
+            dedupe.find_pending(options['chunk_size'])
+        self.stdout.write(u'{0} duplicate candidates to review.\n'.format(
+            models.DuplicateCandidate.objects.filter(
+                dismissed=False).count()))
@@ -0,0 +1,40 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from nmadb_contacts import importer
+
+
+class Command(BaseCommand):
+    """ Imports humans and their contacts from CSV file.
+    """
+
+    args = u'<file.csv>'
+
+    help = (
+            u'Imports humans and their contacts from CSV file with '
+            u'header row. Known columns: {0}.'
+            ).format(u', '.join(
+                importer.HUMAN_COLUMNS +
+                tuple(column for column, _, _ in importer.CONTACT_COLUMNS)))
+
+    option_list = BaseCommand.option_list + (
+            make_option(
+                '--chunk-size',
+                type='int',
+                default=importer.CHUNK_SIZE,
+                help=u'Number of rows imported in one transaction.'),
+            )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError(u'Expected exactly one file name.')
+        contacts_importer = importer.Importer(options['chunk_size'])
+        with open(args[0], 'rb') as stream:
+            contacts_importer.import_csv(stream)
+        for line, message in contacts_importer.errors:
+            self.stderr.write(u'Line {0}: {1}\n'.format(line, message))
+        self.stdout.write((
+            u'Created {0.created} humans, attached {0.attached} rows to '
+            u'existing humans, {1} rows failed.\n'
+            ).format(contacts_importer, len(contacts_importer.errors)))
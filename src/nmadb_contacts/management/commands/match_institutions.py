@@ -0,0 +1,38 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from nmadb_contacts import institutions
+
+
+class Command(NoArgsCommand):
+    """ Links institutions to canonical institutions.
+    """
+
+    help = (
+            u'Links institutions to canonical institutions by normalized '
+            u'title and trigram similarity.')
+
+    option_list = NoArgsCommand.option_list + (
+            make_option(
+                '--create',
+                action='store_true',
+                default=False,
+                help=(
+                    u'Create canonical institutions for unmatched '
+                    u'titles.')),
+            make_option(
+                '--chunk-size',
+                type='int',
+                default=institutions.CHUNK_SIZE,
+                help=u'Number of titles linked in one transaction.'),
+            )
+
+    def handle_noargs(self, **options):
+        linked, created, unmatched = institutions.match_all(
+                options['create'], options['chunk_size'])
+        for title in sorted(unmatched):
+            self.stderr.write(u'Unmatched title: {0}\n'.format(title))
+        self.stdout.write(
+                u'Linked {0} institutions, created {1} canonical '
+                u'institutions.\n'.format(linked, created))
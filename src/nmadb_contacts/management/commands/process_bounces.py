@@ -0,0 +1,34 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from nmadb_contacts import emails
+
+
+class Command(BaseCommand):
+    """ Marks hard bounced emails as not used.
+    """
+
+    args = u'<log.csv>'
+
+    help = (
+            u'Reads CSV bounce or delivery log with address and status '
+            u'columns and marks hard bounced emails as not used.')
+
+    option_list = BaseCommand.option_list + (
+            make_option(
+                '--chunk-size',
+                type='int',
+                default=emails.CHUNK_SIZE,
+                help=u'Number of log lines processed in one transaction.'),
+            )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError(u'Expected exactly one file name.')
+        with open(args[0], 'rb') as stream:
+            marked, unknown = emails.process_bounces(
+                    stream, options['chunk_size'])
+        self.stdout.write((
+            u'Marked {0} emails as not used, {1} bounced addresses are '
+            u'unknown.\n').format(marked, unknown))
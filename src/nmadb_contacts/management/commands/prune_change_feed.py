@@ -0,0 +1,28 @@
+from optparse import make_option
+import datetime
+
+from django.core.management.base import NoArgsCommand
+from django.utils import timezone
+
+from nmadb_contacts import changefeed
+
+
+class Command(NoArgsCommand):
+    """ Deletes old change feed entries.
+    """
+
+    help = (
+            u'Deletes change feed entries older than given number of '
+            u'days. Consumers with older cursors need a full export.')
+
+    option_list = NoArgsCommand.option_list + (
+            make_option(
+                '--days',
+                type='int',
+                default=90,
+                help=u'Number of days entries are kept.'),
+            )
+
+    def handle_noargs(self, **options):
+        changefeed.prune(
+                timezone.now() - datetime.timedelta(days=options['days']))
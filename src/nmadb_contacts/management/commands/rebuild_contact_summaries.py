@@ -0,0 +1,23 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from nmadb_contacts import summaries
+
+
+class Command(NoArgsCommand):
+    """ Recomputes contact summaries of all humans.
+    """
+
+    help = u'Recomputes contact summaries of all humans.'
+
+    option_list = NoArgsCommand.option_list + (
+            make_option(
+                '--chunk-size',
+                type='int',
+                default=summaries.CHUNK_SIZE,
+                help=u'Number of humans processed in one transaction.'),
+            )
+
+    def handle_noargs(self, **options):
+        summaries.rebuild_all(options['chunk_size'])
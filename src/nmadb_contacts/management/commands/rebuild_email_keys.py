@@ -0,0 +1,30 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from nmadb_contacts import emails
+
+
+class Command(NoArgsCommand):
+    """ Sets normalized addresses of all emails.
+    """
+
+    help = (
+            u'Sets normalized (lower case) addresses of all emails and '
+            u'reports emails, which differ from another only in case.')
+
+    option_list = NoArgsCommand.option_list + (
+            make_option(
+                '--chunk-size',
+                type='int',
+                default=emails.CHUNK_SIZE,
+                help=u'Number of emails processed in one transaction.'),
+            )
+
+    def handle_noargs(self, **options):
+        conflicts = emails.backfill(options['chunk_size'])
+        for email_id, address, key in conflicts:
+            self.stderr.write((
+                u'Email {0} ({1}) duplicates another email {2}.\n'
+                ).format(email_id, address, key))
+        self.stdout.write(u'{0} duplicate emails.\n'.format(len(conflicts)))
@@ -0,0 +1,30 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from nmadb_contacts import phones
+
+
+class Command(NoArgsCommand):
+    """ Sets normalized numbers of all phones.
+    """
+
+    help = (
+            u'Sets normalized (E.164) numbers of all phones and reports '
+            u'phones, which duplicate another phone.')
+
+    option_list = NoArgsCommand.option_list + (
+            make_option(
+                '--chunk-size',
+                type='int',
+                default=phones.CHUNK_SIZE,
+                help=u'Number of phones processed in one transaction.'),
+            )
+
+    def handle_noargs(self, **options):
+        conflicts = phones.backfill(options['chunk_size'])
+        for phone_id, number, key in conflicts:
+            self.stderr.write((
+                u'Phone {0} ({1}) duplicates another phone {2}.\n'
+                ).format(phone_id, number, key))
+        self.stdout.write(u'{0} duplicate phones.\n'.format(len(conflicts)))
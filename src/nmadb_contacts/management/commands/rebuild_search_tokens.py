@@ -0,0 +1,25 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from nmadb_contacts import search
+
+
+class Command(NoArgsCommand):
+    """ Rebuilds name search tokens of all humans.
+    """
+
+    help = u'Rebuilds name search tokens of all humans.'
+
+    option_list = NoArgsCommand.option_list + (
+            make_option(
+                '--chunk-size',
+                type='int',
+                default=500,
+                help=u'Number of humans processed in one transaction.'),
+            )
+
+    def handle_noargs(self, **options):
+        count = search.rebuild_tokens(chunk_size=options['chunk_size'])
+        self.stdout.write(u'Rebuilt search tokens of {0} humans.\n'.format(
+            count))
@@ -0,0 +1,35 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from nmadb_contacts import models
+from nmadb_contacts import segments
+
+
+class Command(NoArgsCommand):
+    """ Applies contact changes to members of mailing segments.
+    """
+
+    help = u'Applies contact changes to members of mailing segments.'
+
+    option_list = NoArgsCommand.option_list + (
+            make_option(
+                '--rebuild',
+                action='store_true',
+                default=False,
+                help=u'Recompute all members from scratch.'),
+            make_option(
+                '--chunk-size',
+                type='int',
+                default=segments.CHUNK_SIZE,
+                help=u'Number of humans checked with one query.'),
+            )
+
+    def handle_noargs(self, **options):
+        for segment in models.Segment.objects.all():
+            if options['rebuild']:
+                segments.rebuild(segment, options['chunk_size'])
+            else:
+                segments.refresh(segment, options['chunk_size'])
+            self.stdout.write(u'{0}: {1} members.\n'.format(
+                segment.title, segment.size))
@@ -0,0 +1,34 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from nmadb_contacts import municipalities
+
+
+class Command(NoArgsCommand):
+    """ Assigns municipalities to addresses by their town.
+    """
+
+    help = u'Assigns municipalities to addresses without them by town.'
+
+    option_list = NoArgsCommand.option_list + (
+            make_option(
+                '--chunk-size',
+                type='int',
+                default=municipalities.CHUNK_SIZE,
+                help=u'Number of town spellings updated at once.'),
+            )
+
+    def handle_noargs(self, **options):
+        count, unresolved = municipalities.resolve_addresses(
+                options['chunk_size'])
+        for town in sorted(unresolved):
+            candidates = municipalities.cache.find_by_town(town)
+            if candidates:
+                self.stderr.write(u'Ambiguous town {0}: {1}\n'.format(
+                    town, u', '.join(
+                        unicode(municipality)
+                        for municipality in candidates)))
+            else:
+                self.stderr.write(u'Unknown town: {0}\n'.format(town))
+        self.stdout.write(u'Updated {0} addresses.\n'.format(count))
@@ -1,8 +1,15 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.signals import request_finished
 from django.db import models
+from django.db.models import signals
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 from django.utils import timezone
 
 from django_db_utils import models as db_models
+from nmadb_contacts import identity
+from nmadb_contacts import normalization
 
 # South introspection.
 #from south.modelsinspector import add_introspection_rules
@@ -64,6 +71,36 @@ class Human(models.Model):
             verbose_name=_(u'main address'),
             )
 
+    # Contact summaries, which are kept up to date by signals and allow
+    # to list humans without joining their contacts.
+
+    main_address_text = models.CharField(
+            max_length=90,
+            blank=True,
+            editable=False,
+            verbose_name=_(u'Main address'),
+            )
+
+    phone_numbers = models.CharField(
+            max_length=255,
+            blank=True,
+            editable=False,
+            verbose_name=_(u'Phone numbers'),
+            )
+
+    email_addresses = models.CharField(
+            max_length=255,
+            blank=True,
+            editable=False,
+            verbose_name=_(u'Email addresses'),
+            )
+
+    has_contracts_info = models.BooleanField(
+            default=False,
+            editable=False,
+            verbose_name=_(u'Contract info'),
+            )
+
     class Meta(object):
         ordering = [u'last_name', u'first_name',]
         verbose_name = _(u'Human')
@@ -72,6 +109,52 @@ class Human(models.Model):
     def __unicode__(self):
         return u'{0.id} {0.first_name} {0.last_name}'.format(self)
 
+    def get_search_tokens(self):
+        """ Returns normalized name tokens of this human.
+        """
+        return normalization.tokenize(
+                self.first_name, self.last_name, self.old_last_name)
+
+    def update_search_tokens(self):
+        """ Updates name tokens, which are used for searching.
+        """
+        tokens = set(self.get_search_tokens())
+        old_tokens = set(
+                self.search_tokens.values_list('token', flat=True))
+        if old_tokens - tokens:
+            self.search_tokens.filter(
+                    token__in=old_tokens - tokens).delete()
+        if tokens - old_tokens:
+            HumanSearchToken.objects.bulk_create([
+                HumanSearchToken(human=self, token=token)
+                for token in tokens - old_tokens])
+
+
+class HumanSearchToken(models.Model):
+    """ Normalized token of human name, which allows to search humans
+    by name prefix ignoring case and diacritics.
+    """
+
+    human = models.ForeignKey(
+            Human,
+            related_name='search_tokens',
+            verbose_name=_(u'human'),
+            )
+
+    token = models.CharField(
+            max_length=64,
+            db_index=True,
+            verbose_name=_(u'token'),
+            )
+
+    class Meta(object):
+        unique_together = ((u'human', u'token'),)
+        verbose_name = _(u'search token')
+        verbose_name_plural = _(u'search tokens')
+
+    def __unicode__(self):
+        return u'{0.human_id} {0.token}'.format(self)
+
 
 class Municipality(models.Model):
     """ Information about municipality.
@@ -152,6 +235,12 @@ class Address(models.Model):
     def __unicode__(self):
         return u'{0.address}'.format(self)
 
+    def get_municipality(self):
+        """ Returns municipality from process local cache.
+        """
+        from nmadb_contacts import municipalities
+        return municipalities.get(self.municipality_id)
+
 
 class Contact(models.Model):
     """ Base contact information.
@@ -188,6 +277,16 @@ class Phone(Contact):
             unique=True,
             )
 
+    number_key = models.CharField(
+            max_length=16,
+            blank=True,
+            null=True,
+            unique=True,
+            editable=False,
+            help_text=_(u'Number in E.164 format.'),
+            verbose_name=_(u'normalized number'),
+            )
+
     class Meta(object):
         verbose_name = _(u'Phone')
         verbose_name_plural = _(u'Phones')
@@ -195,6 +294,15 @@ class Phone(Contact):
     def __unicode__(self):
         return u'{0.human} {0.number}'.format(self)
 
+    def clean(self):
+        """ Checks that the same number is not written differently.
+        """
+        key = normalization.normalize_phone(self.number)
+        if key and Phone.objects.filter(number_key=key).exclude(
+                pk=self.pk).exists():
+            raise ValidationError(
+                    _(u'Phone number {0} already exists.').format(key))
+
 
 class Email(Contact):
     """ Phone number.
@@ -206,6 +314,16 @@ class Email(Contact):
             verbose_name=_(u'address'),
             )
 
+    address_key = models.CharField(
+            max_length=128,
+            blank=True,
+            null=True,
+            unique=True,
+            editable=False,
+            help_text=_(u'Address in lower case.'),
+            verbose_name=_(u'normalized address'),
+            )
+
     class Meta(object):
         verbose_name = _(u'Email')
         verbose_name_plural = _(u'Emails')
@@ -213,6 +331,15 @@ class Email(Contact):
     def __unicode__(self):
         return u'{0.human} {0.address}'.format(self)
 
+    def clean(self):
+        """ Checks that the same address is not written in other case.
+        """
+        key = normalization.normalize_email(self.address)
+        if key and Email.objects.filter(address_key=key).exclude(
+                pk=self.pk).exists():
+            raise ValidationError(
+                    _(u'Email address {0} already exists.').format(key))
+
     def get_address_and_mark(self):
         """ Returns email address and marks that email last time
         was used now. (Also performs save.)
@@ -281,6 +408,71 @@ class InfoForContracts(models.Model):
         return u'{0.human}'.format(self)
 
 
+class CanonicalInstitution(models.Model):
+    """ Institution catalogue entry, to which free text institution
+    titles of humans are linked.
+    """
+
+    title = models.CharField(
+            max_length=128,
+            verbose_name=_(u'title'),
+            )
+
+    key = models.CharField(
+            max_length=128,
+            unique=True,
+            editable=False,
+            help_text=_(
+                u'Title in lower case without diacritics and '
+                u'punctuation.'),
+            verbose_name=_(u'normalized title'),
+            )
+
+    class Meta(object):
+        ordering = [u'title',]
+        verbose_name = _(u'canonical institution')
+        verbose_name_plural = _(u'canonical institutions')
+
+    def __unicode__(self):
+        return self.title
+
+    def clean(self):
+        """ Checks that the same institution is not added twice.
+        """
+        key = normalization.normalize_title(self.title)
+        if key and CanonicalInstitution.objects.filter(key=key).exclude(
+                pk=self.pk).exists():
+            raise ValidationError(
+                    _(u'Institution {0} already exists.').format(
+                        self.title))
+
+
+class InstitutionTrigram(models.Model):
+    """ Character trigram of canonical institution title, used for
+    finding similar titles.
+    """
+
+    canonical = models.ForeignKey(
+            CanonicalInstitution,
+            related_name='trigrams',
+            verbose_name=_(u'canonical institution'),
+            )
+
+    trigram = models.CharField(
+            max_length=3,
+            db_index=True,
+            verbose_name=_(u'trigram'),
+            )
+
+    class Meta(object):
+        unique_together = ((u'trigram', u'canonical'),)
+        verbose_name = _(u'institution trigram')
+        verbose_name_plural = _(u'institution trigrams')
+
+    def __unicode__(self):
+        return u'{0.canonical_id} {0.trigram}'.format(self)
+
+
 class Institution(models.Model):
     """ Institution, to which a human belongs.
     """
@@ -295,6 +487,15 @@ class Institution(models.Model):
             verbose_name = _('title'),
             )
 
+    canonical = models.ForeignKey(
+            CanonicalInstitution,
+            blank=True,
+            null=True,
+            related_name='institutions',
+            on_delete=models.SET_NULL,
+            verbose_name=_(u'canonical institution'),
+            )
+
     class Meta(object):
         ordering = [u'title',]
         verbose_name = _(u'Institution')
@@ -302,3 +503,693 @@ class Institution(models.Model):
 
     def __unicode__(self):
         return u'{0.human} {0.title}'.format(self)
+
+
+
+class HumanBlockingKey(models.Model):
+    """ Key, which groups humans that may be duplicates.
+    """
+
+    human = models.ForeignKey(
+            Human,
+            related_name='blocking_keys',
+            verbose_name=_(u'human'),
+            )
+
+    key = models.CharField(
+            max_length=160,
+            db_index=True,
+            verbose_name=_(u'key'),
+            )
+
+    pending = models.BooleanField(
+            default=True,
+            db_index=True,
+            help_text=_(u'If human was changed since last check.'),
+            verbose_name=_(u'pending'),
+            )
+
+    class Meta(object):
+        verbose_name = _(u'blocking key')
+        verbose_name_plural = _(u'blocking keys')
+
+    def __unicode__(self):
+        return u'{0.human_id} {0.key}'.format(self)
+
+
+class DuplicateCandidate(models.Model):
+    """ Pair of humans, which may be the same human.
+    """
+
+    first = models.ForeignKey(
+            Human,
+            related_name='+',
+            verbose_name=_(u'first human'),
+            )
+
+    second = models.ForeignKey(
+            Human,
+            related_name='+',
+            verbose_name=_(u'second human'),
+            )
+
+    score = models.FloatField(
+            db_index=True,
+            verbose_name=_(u'score'),
+            )
+
+    reasons = models.CharField(
+            max_length=90,
+            verbose_name=_(u'reasons'),
+            )
+
+    dismissed = models.BooleanField(
+            default=False,
+            help_text=_(u'If reviewer decided that humans are different.'),
+            verbose_name=_(u'dismissed'),
+            )
+
+    class Meta(object):
+        ordering = [u'-score', u'first', u'second',]
+        unique_together = ((u'first', u'second'),)
+        verbose_name = _(u'duplicate candidate')
+        verbose_name_plural = _(u'duplicate candidates')
+
+    def __unicode__(self):
+        return u'{0.first} {0.second} {0.score}'.format(self)
+
+
+class ChangeFeedEntry(models.Model):
+    """ Record that a contact row was changed or deleted. Entries are
+    ordered by id, which is used as change feed cursor.
+    """
+
+    KIND_CHOICES = (
+            (u'human', _(u'Human')),
+            (u'phone', _(u'Phone')),
+            (u'email', _(u'Email')),
+            (u'address', _(u'address')),
+            (u'institution', _(u'Institution')),
+            )
+
+    kind = models.CharField(
+            max_length=12,
+            choices=KIND_CHOICES,
+            verbose_name=_(u'kind'),
+            )
+
+    object_id = models.PositiveIntegerField(
+            verbose_name=_(u'object id'),
+            )
+
+    human_id = models.PositiveIntegerField(
+            blank=True,
+            null=True,
+            verbose_name=_(u'human id'),
+            )
+
+    deleted = models.BooleanField(
+            default=False,
+            verbose_name=_(u'deleted'),
+            )
+
+    changed = models.DateTimeField(
+            auto_now_add=True,
+            db_index=True,
+            verbose_name=_(u'changed'),
+            )
+
+    class Meta(object):
+        ordering = [u'id',]
+        verbose_name = _(u'change feed entry')
+        verbose_name_plural = _(u'change feed entries')
+
+    def __unicode__(self):
+        return u'{0.id} {0.kind} {0.object_id}'.format(self)
+
+
+class ChangeFeedPrune(models.Model):
+    """ Record that change feed entries up to ``entry_id`` were deleted.
+    Cursors before the latest prune point are expired.
+    """
+
+    entry_id = models.PositiveIntegerField(
+            verbose_name=_(u'last deleted entry id'),
+            )
+
+    pruned = models.DateTimeField(
+            auto_now_add=True,
+            verbose_name=_(u'pruned'),
+            )
+
+    class Meta(object):
+        ordering = [u'id',]
+        verbose_name = _(u'change feed prune')
+        verbose_name_plural = _(u'change feed prunes')
+
+    def __unicode__(self):
+        return u'{0.pruned} {0.entry_id}'.format(self)
+
+
+class AuditEntry(models.Model):
+    """ Append only record of field changes of a human or contact.
+    """
+
+    ACTION_CHOICES = (
+            (u'C', _(u'Created')),
+            (u'U', _(u'Updated')),
+            (u'D', _(u'Deleted')),
+            )
+
+    human_id = models.PositiveIntegerField(
+            verbose_name=_(u'human id'),
+            )
+
+    model = models.CharField(
+            max_length=20,
+            verbose_name=_(u'model'),
+            )
+
+    object_id = models.PositiveIntegerField(
+            verbose_name=_(u'object id'),
+            )
+
+    action = models.CharField(
+            max_length=1,
+            choices=ACTION_CHOICES,
+            verbose_name=_(u'action'),
+            )
+
+    user = models.ForeignKey(
+            User,
+            blank=True,
+            null=True,
+            related_name='+',
+            on_delete=models.SET_NULL,
+            verbose_name=_(u'user'),
+            )
+
+    timestamp = models.DateTimeField(
+            verbose_name=_(u'timestamp'),
+            )
+
+    changes = models.TextField(
+            blank=True,
+            help_text=_(
+                u'JSON object, which maps field name to the pair of old '
+                u'and new values.'),
+            verbose_name=_(u'changes'),
+            )
+
+    class Meta(object):
+        ordering = [u'-id',]
+        verbose_name = _(u'audit entry')
+        verbose_name_plural = _(u'audit entries')
+
+    def __unicode__(self):
+        return u'{0.timestamp} {0.model} {0.object_id} {0.action}'.format(
+                self)
+
+
+class Segment(models.Model):
+    """ Named definition of humans, to whom mail is sent repeatedly.
+    Matching humans are materialized in :py:class:`SegmentMember`.
+    Empty criteria match all humans.
+    """
+
+    title = models.CharField(
+            max_length=90,
+            unique=True,
+            verbose_name=_(u'title'),
+            )
+
+    gender = models.CharField(
+            max_length=2,
+            choices=Human.GENDER_CHOICES,
+            blank=True,
+            verbose_name=_(u'gender'),
+            )
+
+    municipality = models.ForeignKey(
+            Municipality,
+            blank=True,
+            null=True,
+            help_text=_(u'Municipality of the main address.'),
+            verbose_name=_(u'municipality'),
+            )
+
+    municipality_type = models.CharField(
+            max_length=2,
+            choices=Municipality.MUNICIPALITY_TYPES,
+            blank=True,
+            help_text=_(u'Municipality type of the main address.'),
+            verbose_name=_(u'municipality type'),
+            )
+
+    institution = models.ForeignKey(
+            CanonicalInstitution,
+            blank=True,
+            null=True,
+            on_delete=models.PROTECT,
+            verbose_name=_(u'institution'),
+            )
+
+    with_used_email = models.BooleanField(
+            default=False,
+            help_text=_(
+                u'Only humans, who have email not marked as unused.'),
+            verbose_name=_(u'with used email'),
+            )
+
+    feed_position = models.PositiveIntegerField(
+            default=0,
+            editable=False,
+            help_text=_(
+                u'Id of the last change feed entry applied to members.'),
+            verbose_name=_(u'feed position'),
+            )
+
+    size = models.PositiveIntegerField(
+            default=0,
+            editable=False,
+            verbose_name=_(u'size'),
+            )
+
+    refreshed = models.DateTimeField(
+            blank=True,
+            null=True,
+            editable=False,
+            verbose_name=_(u'refreshed'),
+            )
+
+    class Meta(object):
+        ordering = [u'title',]
+        verbose_name = _(u'segment')
+        verbose_name_plural = _(u'segments')
+
+    def __unicode__(self):
+        return self.title
+
+
+class SegmentMember(models.Model):
+    """ Human, who matches segment definition.
+    """
+
+    segment = models.ForeignKey(
+            Segment,
+            related_name='members',
+            verbose_name=_(u'segment'),
+            )
+
+    human = models.ForeignKey(
+            Human,
+            related_name='segment_memberships',
+            verbose_name=_(u'human'),
+            )
+
+    class Meta(object):
+        unique_together = ((u'segment', u'human'),)
+        verbose_name = _(u'segment member')
+        verbose_name_plural = _(u'segment members')
+
+    def __unicode__(self):
+        return u'{0.segment_id} {0.human_id}'.format(self)
+
+
+class MailDispatchJob(models.Model):
+    """ Mail, which was queued from admin and is sent by
+    ``dispatch_mail`` worker in chunks.
+    """
+
+    TARGET_CHOICES = (
+            (u'email', _(u'Emails')),
+            (u'human', _(u'Humans')),
+            )
+
+    STATUS_PENDING = u'P'
+    STATUS_RUNNING = u'R'
+    STATUS_DONE = u'D'
+    STATUS_FAILED = u'F'
+
+    STATUS_CHOICES = (
+            (STATUS_PENDING, _(u'Pending')),
+            (STATUS_RUNNING, _(u'Running')),
+            (STATUS_DONE, _(u'Done')),
+            (STATUS_FAILED, _(u'Failed')),
+            )
+
+    target = models.CharField(
+            max_length=8,
+            choices=TARGET_CHOICES,
+            verbose_name=_(u'target'),
+            )
+
+    object_ids = models.TextField(
+            editable=False,
+            help_text=_(u'Comma separated ids of selected objects.'),
+            verbose_name=_(u'object ids'),
+            )
+
+    subject = models.CharField(
+            max_length=255,
+            help_text=_(u'Django template.'),
+            verbose_name=_(u'subject'),
+            )
+
+    body = models.TextField(
+            help_text=_(u'Django template.'),
+            verbose_name=_(u'body'),
+            )
+
+    status = models.CharField(
+            max_length=2,
+            choices=STATUS_CHOICES,
+            default=STATUS_PENDING,
+            db_index=True,
+            verbose_name=_(u'status'),
+            )
+
+    created = models.DateTimeField(
+            auto_now_add=True,
+            verbose_name=_(u'created'),
+            )
+
+    started = models.DateTimeField(
+            blank=True,
+            null=True,
+            verbose_name=_(u'started'),
+            )
+
+    finished = models.DateTimeField(
+            blank=True,
+            null=True,
+            verbose_name=_(u'finished'),
+            )
+
+    leased_until = models.DateTimeField(
+            blank=True,
+            null=True,
+            help_text=_(
+                u'Running job is reclaimed by another worker after this '
+                u'time.'),
+            verbose_name=_(u'leased until'),
+            )
+
+    total = models.PositiveIntegerField(
+            default=0,
+            verbose_name=_(u'total'),
+            help_text=_(u'Number of selected objects.'),
+            )
+
+    processed = models.PositiveIntegerField(
+            default=0,
+            verbose_name=_(u'processed'),
+            help_text=_(u'Number of objects, which were already handled.'),
+            )
+
+    sent = models.PositiveIntegerField(
+            default=0,
+            verbose_name=_(u'sent'),
+            )
+
+    failed = models.PositiveIntegerField(
+            default=0,
+            verbose_name=_(u'failed'),
+            )
+
+    error = models.TextField(
+            blank=True,
+            verbose_name=_(u'last error'),
+            )
+
+    class Meta(object):
+        ordering = [u'-created',]
+        verbose_name = _(u'mail dispatch job')
+        verbose_name_plural = _(u'mail dispatch jobs')
+
+    def __unicode__(self):
+        return u'{0.subject} ({0.processed}/{0.total})'.format(self)
+
+    def get_object_ids(self):
+        """ Returns list of selected object ids.
+        """
+        return [int(pk) for pk in self.object_ids.split(u',') if pk]
+
+    def set_object_ids(self, ids):
+        """ Stores selected object ids.
+        """
+        ids = list(ids)
+        self.object_ids = u','.join(unicode(pk) for pk in ids)
+        self.total = len(ids)
+
+
+@receiver(signals.post_save, sender=Human)
+def update_human_search_tokens(sender, instance, raw, **kwargs):
+    """ Keeps search tokens up to date.
+    """
+    if not raw:
+        instance.update_search_tokens()
+
+
+@receiver(signals.post_save, sender=Human)
+@receiver(signals.post_delete, sender=Phone)
+@receiver(signals.post_save, sender=Phone)
+@receiver(signals.post_delete, sender=Email)
+@receiver(signals.post_save, sender=Email)
+def update_human_blocking_keys(sender, instance, raw=False, **kwargs):
+    """ Rebuilds duplicate detection keys of changed human.
+    """
+    from nmadb_contacts import dedupe
+    if not raw:
+        if sender is Human:
+            dedupe.rebuild_keys([instance.pk])
+        else:
+            dedupe.rebuild_keys([instance.human_id])
+
+
+@receiver(signals.post_save, sender=Municipality)
+@receiver(signals.post_delete, sender=Municipality)
+def invalidate_municipality_cache(sender, **kwargs):
+    """ Forgets cached municipalities.
+    """
+    from nmadb_contacts import municipalities
+    municipalities.cache.invalidate()
+
+
+@receiver(signals.pre_save, sender=Address)
+def resolve_address_municipality(sender, instance, raw, **kwargs):
+    """ Assigns municipality by town to addresses without it.
+    """
+    from nmadb_contacts import municipalities
+    if not raw and instance.municipality_id is None and instance.town:
+        municipality = municipalities.resolve_town(instance.town)
+        if municipality is not None:
+            instance.municipality = municipality
+
+
+@receiver(signals.pre_save, sender=CanonicalInstitution)
+def update_canonical_institution_key(sender, instance, raw, **kwargs):
+    """ Keeps normalized institution title up to date.
+    """
+    if not raw:
+        instance.key = normalization.normalize_title(instance.title)
+
+
+@receiver(signals.post_save, sender=CanonicalInstitution)
+def index_canonical_institution(sender, instance, raw, **kwargs):
+    """ Stores trigrams of canonical institution title.
+    """
+    from nmadb_contacts import institutions
+    if not raw:
+        institutions.index(instance)
+
+
+@receiver(signals.pre_save, sender=Institution)
+def link_canonical_institution(sender, instance, raw, **kwargs):
+    """ Links institutions without canonical institution to the one
+    with the same normalized title.
+    """
+    from nmadb_contacts import institutions
+    if not raw and instance.canonical_id is None and instance.title:
+        canonical = institutions.get_by_key(
+                normalization.normalize_title(instance.title))
+        if canonical is not None:
+            instance.canonical = canonical
+
+
+@receiver(signals.pre_save, sender=Phone)
+def update_phone_number_key(sender, instance, raw, **kwargs):
+    """ Keeps normalized phone number up to date.
+    """
+    if not raw:
+        instance.number_key = normalization.normalize_phone(
+                instance.number)
+
+
+@receiver(signals.pre_save, sender=Email)
+def update_email_address_key(sender, instance, raw, **kwargs):
+    """ Keeps normalized email address up to date.
+    """
+    if not raw:
+        instance.address_key = normalization.normalize_email(
+                instance.address)
+
+
+@receiver(signals.post_save, sender=Human)
+@receiver(signals.post_delete, sender=Human)
+@receiver(signals.post_save, sender=Phone)
+@receiver(signals.post_delete, sender=Phone)
+@receiver(signals.post_save, sender=Email)
+@receiver(signals.post_delete, sender=Email)
+@receiver(signals.post_save, sender=Address)
+@receiver(signals.post_delete, sender=Address)
+@receiver(signals.post_save, sender=Institution)
+@receiver(signals.post_delete, sender=Institution)
+def record_change_feed_entry(sender, instance, raw=False, **kwargs):
+    """ Appends changed or deleted row to the change feed.
+    """
+    from nmadb_contacts import changefeed
+    if not raw:
+        if sender is Human:
+            human_id = instance.pk
+        else:
+            human_id = instance.human_id
+        changefeed.record(
+                sender, [(instance.pk, human_id)],
+                deleted='created' not in kwargs)
+
+
+@receiver(signals.pre_save, sender=Human)
+def fill_human_from_identity_code(sender, instance, raw, **kwargs):
+    """ Fills missing birth date and gender from valid identity code.
+    """
+    if not raw:
+        decoded = identity.decode(instance.identity_code)
+        if decoded is not None:
+            if instance.birth_date is None:
+                instance.birth_date = decoded[0]
+            if not instance.gender:
+                instance.gender = decoded[1]
+
+
+@receiver(signals.pre_save, sender=Human)
+def update_human_main_address_text(sender, instance, raw, **kwargs):
+    """ Keeps main address summary up to date.
+    """
+    if not raw:
+        if instance.main_address_id is None:
+            instance.main_address_text = u''
+        else:
+            instance.main_address_text = instance.main_address.address
+
+
+@receiver(signals.post_save, sender=Phone)
+@receiver(signals.post_delete, sender=Phone)
+@receiver(signals.post_save, sender=Email)
+@receiver(signals.post_delete, sender=Email)
+@receiver(signals.post_save, sender=InfoForContracts)
+@receiver(signals.post_delete, sender=InfoForContracts)
+def update_human_contact_summaries(sender, instance, raw=False, **kwargs):
+    """ Keeps contact summaries of human up to date.
+    """
+    from nmadb_contacts import summaries
+    if not raw:
+        summaries.rebuild([instance.human_id])
+
+
+@receiver(signals.post_save, sender=Address)
+def update_human_main_address_summary(sender, instance, raw, **kwargs):
+    """ Keeps main address summaries up to date.
+    """
+    if not raw:
+        Human.objects.filter(main_address=instance).update(
+                main_address_text=instance.address)
+
+
+@receiver(signals.pre_save, sender=Human)
+@receiver(signals.pre_save, sender=Phone)
+@receiver(signals.pre_save, sender=Email)
+@receiver(signals.pre_save, sender=Address)
+@receiver(signals.pre_save, sender=Institution)
+@receiver(signals.pre_save, sender=InfoForContracts)
+def remember_audited_values(sender, instance, raw, **kwargs):
+    """ Remembers stored values, so changes can be audited after save.
+
+    This costs one extra ``SELECT`` of audited fields by primary key
+    for every save of an existing row of an audited model. Django 1.4
+    has no partial saves, so all fields are read. Bulk code, which
+    must avoid it, uses ``update`` and :py:func:`audit.record_update`.
+    """
+    from nmadb_contacts import audit
+    if not raw:
+        audit.snapshot(instance)
+
+
+@receiver(signals.post_save, sender=Human)
+@receiver(signals.post_delete, sender=Human)
+@receiver(signals.post_save, sender=Phone)
+@receiver(signals.post_delete, sender=Phone)
+@receiver(signals.post_save, sender=Email)
+@receiver(signals.post_delete, sender=Email)
+@receiver(signals.post_save, sender=Address)
+@receiver(signals.post_delete, sender=Address)
+@receiver(signals.post_save, sender=Institution)
+@receiver(signals.post_delete, sender=Institution)
+@receiver(signals.post_save, sender=InfoForContracts)
+@receiver(signals.post_delete, sender=InfoForContracts)
+def record_audit_entry(sender, instance, raw=False, **kwargs):
+    """ Appends changed fields of saved or deleted object to the audit
+    log.
+    """
+    from nmadb_contacts import audit
+    if not raw:
+        if 'created' not in kwargs:
+            action = u'D'
+        elif kwargs['created']:
+            action = u'C'
+        else:
+            action = u'U'
+        audit.record(instance, action)
+
+
+@receiver(request_finished)
+def forget_audit_user(sender, **kwargs):
+    """ Forgets user of finished request, even if audit middleware did
+    not see the response, so the next code on this thread is not
+    attributed to them.
+    """
+    from nmadb_contacts import audit
+    audit.state.user_id = None
+
+
+@receiver(signals.post_save, sender=Segment)
+def rebuild_segment_members(sender, instance, raw, **kwargs):
+    """ Materializes members of saved segment definition.
+    """
+    from nmadb_contacts import segments
+    if not raw:
+        segments.rebuild(instance)
+
+
+@receiver(signals.post_save, sender=Human)
+@receiver(signals.post_delete, sender=Human)
+@receiver(signals.post_save, sender=Municipality)
+@receiver(signals.post_delete, sender=Municipality)
+@receiver(signals.post_save, sender=Address)
+@receiver(signals.post_delete, sender=Address)
+@receiver(signals.post_save, sender=Phone)
+@receiver(signals.post_delete, sender=Phone)
+@receiver(signals.post_save, sender=Email)
+@receiver(signals.post_delete, sender=Email)
+@receiver(signals.post_save, sender=Institution)
+@receiver(signals.post_delete, sender=Institution)
+@receiver(signals.post_save, sender=CanonicalInstitution)
+@receiver(signals.post_delete, sender=CanonicalInstitution)
+@receiver(signals.post_save, sender=InfoForContracts)
+@receiver(signals.post_delete, sender=InfoForContracts)
+def invalidate_facet_counts(sender, raw=False, **kwargs):
+    """ Makes cached facet counts stale.
+    """
+    from nmadb_contacts import facets
+    if not raw:
+        facets.invalidate()
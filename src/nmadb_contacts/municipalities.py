@@ -0,0 +1,167 @@
+""" Process local cache of municipalities and resolving of address
+municipalities by town.
+
+Municipalities change rarely, so all of them are loaded with one query
+on first use and kept until any municipality is saved or deleted.
+Rolled back changes send no signals, so code, which rolls back saved
+municipalities, for example tests, must call :py:func:`reset`.
+"""
+
+import threading
+
+from django.db import transaction
+
+from nmadb_contacts import audit
+from nmadb_contacts import bulk
+from nmadb_contacts import changefeed
+from nmadb_contacts import models
+from nmadb_contacts import normalization
+
+
+CHUNK_SIZE = 500
+
+
+def get_town_key(town):
+    """ Returns normalized town name used for matching.
+    """
+    return u' '.join(normalization.tokenize(town))
+
+
+class MunicipalityCache(object):
+    """ Cache of all municipalities keyed by id and by code.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _load(self):
+        """ Returns cached ``(by id, by code, by town)`` dictionaries,
+        loads them if needed. Dictionaries are replaced with a single
+        assignment, so readers without lock see either all or none.
+        """
+
+        data = self._data
+        if data is None:
+            with self._lock:
+                data = self._data
+                if data is None:
+                    by_id = dict(
+                            (municipality.id, municipality)
+                            for municipality in
+                            models.Municipality.objects.all())
+                    by_code = dict(
+                            (municipality.code, municipality)
+                            for municipality in by_id.values())
+                    by_town = {}
+                    for municipality in by_id.values():
+                        by_town.setdefault(
+                                get_town_key(municipality.town),
+                                []).append(municipality)
+                    data = self._data = (by_id, by_code, by_town)
+        return data
+
+    def invalidate(self):
+        """ Forgets cached municipalities.
+        """
+
+        with self._lock:
+            self._data = None
+
+    def all(self):
+        """ Returns list of all municipalities.
+        """
+        return self._load()[0].values()
+
+    def get(self, municipality_id):
+        """ Returns municipality with ``municipality_id`` or ``None``.
+        """
+        return self._load()[0].get(municipality_id)
+
+    def get_by_code(self, code):
+        """ Returns municipality with ``code`` or ``None``.
+        """
+        return self._load()[1].get(code)
+
+    def find_by_town(self, town):
+        """ Returns list of municipalities with town matching ``town``.
+        """
+        return self._load()[2].get(get_town_key(town), [])
+
+
+cache = MunicipalityCache()
+
+
+def reset():
+    """ Forgets municipalities cached by this process.
+    """
+    cache.invalidate()
+
+
+def get(municipality_id):
+    """ Returns cached municipality with ``municipality_id`` or
+    ``None``.
+    """
+    return cache.get(municipality_id)
+
+
+def get_by_code(code):
+    """ Returns cached municipality with ``code`` or ``None``.
+    """
+    return cache.get_by_code(code)
+
+
+def resolve_town(town):
+    """ Returns municipality of ``town`` or ``None`` if it is unknown
+    or ambiguous. If both town and district municipalities match, town
+    municipality is chosen.
+    """
+
+    candidates = cache.find_by_town(town)
+    if len(candidates) > 1:
+        candidates = [
+                municipality for municipality in candidates
+                if municipality.municipality_type == u'T']
+    if len(candidates) == 1:
+        return candidates[0]
+    else:
+        return None
+
+
+def resolve_addresses(chunk_size=CHUNK_SIZE):
+    """ Assigns municipalities to addresses without them by their town.
+    Addresses are updated with one query per municipality and chunk of
+    town spellings. Returns number of updated addresses and list of
+    towns, which could not be resolved.
+    """
+
+    from nmadb_contacts import facets
+    towns = models.Address.objects.filter(
+            municipality__isnull=True).values_list(
+            'town', flat=True).distinct()
+    resolved = {}
+    unresolved = []
+    for town in towns:
+        municipality = resolve_town(town)
+        if municipality is None:
+            unresolved.append(town)
+        else:
+            resolved.setdefault(municipality.id, []).append(town)
+    count = 0
+    for municipality_id, towns in resolved.items():
+        for chunk in bulk.chunked(towns, chunk_size):
+            with transaction.commit_on_success(), audit.batch():
+                addresses = models.Address.objects.filter(
+                        municipality__isnull=True,
+                        town__in=chunk,
+                        )
+                rows = list(addresses.values_list('id', 'human_id'))
+                audit.record_update(
+                        models.Address,
+                        [(address_id, human_id, None)
+                         for address_id, human_id in rows],
+                        'municipality_id', municipality_id)
+                changefeed.record(models.Address, rows)
+                count += addresses.update(municipality=municipality_id)
+    facets.invalidate()
+    return count, unresolved
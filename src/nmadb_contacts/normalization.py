@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+""" Text normalization used for building search and matching keys.
+"""
+
+import re
+import unicodedata
+
+from django.utils.encoding import force_unicode
+
+
+TOKEN_SPLIT_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def fold(text):
+    """ Returns lower case ``text`` with diacritics removed.
+
+    >>> fold(u'Šarūnas')
+    u'sarunas'
+    """
+
+    text = unicodedata.normalize(u'NFKD', force_unicode(text or u''))
+    return u''.join(
+            char for char in text
+            if not unicodedata.combining(char)).lower()
+
+
+def tokenize(*values):
+    """ Returns sorted list of unique folded word tokens of ``values``.
+    """
+
+    tokens = set()
+    for value in values:
+        tokens.update(
+                token for token in TOKEN_SPLIT_RE.split(fold(value))
+                if token)
+    return sorted(tokens)
+
+
+COUNTRY_CODE = u'370'
+"""Country calling code of numbers written without it."""
+TRUNK_PREFIX = u'8'
+NATIONAL_LENGTH = 8
+E164_MAX_LENGTH = 15
+
+
+def normalize_phone(number, country_code=COUNTRY_CODE):
+    """ Returns phone ``number`` in E.164 format or ``None`` if it is
+    not a complete phone number.
+
+    >>> normalize_phone(u'8 (612) 34567')
+    u'+37061234567'
+    >>> normalize_phone(u'00370 612 34567')
+    u'+37061234567'
+    """
+
+    number = force_unicode(number or u'').strip()
+    if any(char.isalpha() for char in number):
+        return None
+    digits = u''.join(char for char in number if char.isdigit())
+    if number.startswith(u'+'):
+        pass
+    elif digits.startswith(u'00'):
+        digits = digits[2:]
+    elif (len(digits) == len(TRUNK_PREFIX) + NATIONAL_LENGTH and
+            digits.startswith(TRUNK_PREFIX)):
+        digits = country_code + digits[len(TRUNK_PREFIX):]
+    elif len(digits) == NATIONAL_LENGTH:
+        digits = country_code + digits
+    elif not (
+            digits.startswith(country_code) and
+            len(digits) == len(country_code) + NATIONAL_LENGTH):
+        return None
+    if (not NATIONAL_LENGTH <= len(digits) <= E164_MAX_LENGTH or
+            digits.startswith(u'0')):
+        return None
+    return u'+' + digits
+
+
+def normalize_email(address):
+    """ Returns case folded email ``address`` or ``None`` if it is not
+    an email address.
+
+    >>> normalize_email(u' Jonas@Example.COM ')
+    u'jonas@example.com'
+    """
+
+    address = force_unicode(address or u'').strip().lower()
+    if u'@' not in address:
+        return None
+    return address
+
+
+TRIGRAM_PADDING = u'  '
+
+
+def normalize_title(title):
+    """ Returns folded words of ``title`` joined with single spaces or
+    ``None`` if title has no words.
+
+    >>> normalize_title(u' Vilniaus  Licėjus. ')
+    u'vilniaus licejus'
+    """
+
+    words = [word for word in TOKEN_SPLIT_RE.split(fold(title)) if word]
+    return u' '.join(words) or None
+
+
+def get_trigrams(key):
+    """ Returns set of character trigrams of normalized ``key``. Words
+    are padded, so that short words and word starts have trigrams too.
+
+    >>> sorted(get_trigrams(u'ab'))
+    [u'  a', u' ab', u'ab ']
+    """
+
+    trigrams = set()
+    for word in key.split():
+        padded = TRIGRAM_PADDING + word + TRIGRAM_PADDING[:1]
+        trigrams.update(
+                padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def get_similarity(first, second):
+    """ Returns trigram similarity of two trigram sets between 0 and 1.
+    """
+
+    if not first or not second:
+        return 0.0
+    return float(len(first & second)) / len(first | second)
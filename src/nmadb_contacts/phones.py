@@ -0,0 +1,41 @@
+""" Lookup of phones by normalized (E.164) number.
+
+``Phone.number_key`` keeps the number in E.164 format and has its own
+unique index, so differently written numbers are found with one
+indexed ``IN`` query.
+"""
+
+from nmadb_contacts import bulk
+from nmadb_contacts import models
+from nmadb_contacts.normalization import normalize_phone
+
+
+CHUNK_SIZE = 500
+
+
+def lookup_phones(numbers, chunk_size=CHUNK_SIZE):
+    """ Returns dictionary, which maps every given number to the
+    :py:class:`nmadb_contacts.models.Human` owning it or to ``None``.
+    Numbers are resolved with one query per ``chunk_size`` distinct
+    numbers.
+    """
+
+    keys = dict((number, normalize_phone(number)) for number in numbers)
+    humans = {}
+    for chunk in bulk.chunked(
+            set(keys.values()) - set([None]), chunk_size):
+        for phone in models.Phone.objects.filter(
+                number_key__in=chunk).select_related('human'):
+            humans[phone.number_key] = phone.human
+    return dict(
+            (number, humans.get(key)) for number, key in keys.items())
+
+
+def backfill(chunk_size=CHUNK_SIZE):
+    """ Sets normalized number of all phones. Returns list of
+    ``(phone id, number, key)`` of phones, which were left without key
+    because another phone already has the same normalized number.
+    """
+    return bulk.backfill_keys(
+            models.Phone, 'number', 'number_key', normalize_phone,
+            chunk_size)
@@ -0,0 +1,108 @@
+""" Bulk resolution of email recipients for mail admin actions.
+"""
+
+import abc
+
+from django.utils import timezone
+
+from nmadb_contacts import models
+
+
+MARK_CHUNK_SIZE = 500
+
+
+class RecipientResolver(object):
+    """ Abstract base class of recipient resolvers. Subclasses must
+    override :py:meth:`resolve`. The base class itself cannot be
+    instantiated.
+
+    Resolver is passed to ``nmadb_automation.mail`` admin actions
+    instead of a function, which returns ``(address, context)`` pairs
+    for one object. Returned emails are remembered and after dispatch
+    are marked as used with :py:meth:`mark`. Callers, which know which
+    messages were sent, use :py:meth:`resolve` and add ids of emails
+    to ``used_ids`` themselves.
+    """
+
+    __metaclass__ = abc.ABCMeta
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self.used_ids = []
+
+    def __call__(self, obj):
+        recipients = []
+        for email_id, address, context in self.resolve(obj):
+            self.used_ids.append(email_id)
+            recipients.append((address, context))
+        return recipients
+
+    @abc.abstractmethod
+    def resolve(self, obj):
+        """ Returns list of ``(email id, address, context)`` of
+        recipients of ``obj`` without remembering them.
+        """
+
+    def mark(self):
+        """ Marks all returned emails as used now.
+        """
+
+        now = timezone.now()
+        for start in range(0, len(self.used_ids), MARK_CHUNK_SIZE):
+            models.Email.objects.filter(
+                    pk__in=self.used_ids[start:start + MARK_CHUNK_SIZE],
+                    ).update(last_time_used=now)
+        self.used_ids = []
+
+
+class EmailRecipientResolver(RecipientResolver):
+    """ Resolves recipients for selected emails.
+    """
+
+    def resolve(self, email):
+        return [(email.pk, email.address, {'obj': email})]
+
+
+class HumanRecipientResolver(RecipientResolver):
+    """ Resolves recipients for selected humans. All used emails of
+    selected humans are fetched with one query.
+    """
+
+    def __init__(self, queryset):
+        super(HumanRecipientResolver, self).__init__(queryset)
+        self._emails = None
+
+    def get_emails(self):
+        """ Returns dictionary, which maps human id to the list of
+        ``(email id, address)`` pairs.
+        """
+
+        if self._emails is None:
+            self._emails = {}
+            emails = models.Email.objects.filter(
+                    human__in=self.queryset.order_by(),
+                    ).exclude(
+                    used=False,
+                    ).order_by(
+                    'id',
+                    ).values_list('id', 'human_id', 'address')
+            for email_id, human_id, address in emails:
+                self._emails.setdefault(human_id, []).append(
+                        (email_id, address))
+        return self._emails
+
+    def resolve(self, human):
+        return [
+                (email_id, address, {'human': human})
+                for email_id, address in self.get_emails().get(
+                    human.pk, ())]
+
+
+def dispatch(action, resolver, *args):
+    """ Calls mail admin ``action`` with ``resolver`` and marks
+    resolved emails as used if the action succeeds.
+    """
+
+    response = action(resolver, *args)
+    resolver.mark()
+    return response
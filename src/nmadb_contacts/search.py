@@ -0,0 +1,93 @@
+""" Searching humans by normalized name tokens.
+"""
+
+import operator
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Q
+
+from nmadb_contacts import bulk
+from nmadb_contacts import models
+from nmadb_contacts import normalization
+
+
+TOKEN_FIELD = 'search_tokens__token'
+
+PREFIX_END = u'\uffff'
+"""Prefixes are matched as ranges ``[prefix, prefix + PREFIX_END)``,
+because unlike ``LIKE`` ranges can use token index on every backend."""
+
+
+def construct_search(field_name):
+    """ Converts search field declaration to lookup in the same way as
+    Django admin does.
+    """
+
+    if field_name.startswith('^'):
+        return '{0}__istartswith'.format(field_name[1:])
+    elif field_name.startswith('='):
+        return '{0}__iexact'.format(field_name[1:])
+    elif field_name.startswith('@'):
+        return '{0}__search'.format(field_name[1:])
+    else:
+        return '{0}__icontains'.format(field_name)
+
+
+def search(queryset, query, search_fields):
+    """ Filters ``queryset`` by ``query`` the same way as Django admin
+    does, except that fields ending with :py:data:`TOKEN_FIELD` are
+    matched as name token prefixes ignoring case and diacritics.
+    """
+
+    token_fields = [
+            field for field in search_fields
+            if field.endswith(TOKEN_FIELD)]
+    lookups = [
+            construct_search(field) for field in search_fields
+            if not field.endswith(TOKEN_FIELD)]
+    for bit in query.split():
+        conditions = [Q(**{lookup: bit}) for lookup in lookups]
+        tokens = normalization.tokenize(bit)
+        if tokens:
+            token = max(tokens, key=len)
+            conditions.extend(
+                    Q(**{
+                        '{0}__gte'.format(field): token,
+                        '{0}__lt'.format(field): token + PREFIX_END,
+                        })
+                    for field in token_fields)
+        if conditions:
+            queryset = queryset.filter(reduce(operator.or_, conditions))
+    return queryset.distinct()
+
+
+def rebuild_chunk(rows):
+    """ Rebuilds search tokens from ``(id, first_name, last_name,
+    old_last_name)`` rows of humans.
+    """
+
+    models.HumanSearchToken.objects.filter(
+            human__in=[row[0] for row in rows]).delete()
+    bulk.bulk_create(models.HumanSearchToken, (
+        models.HumanSearchToken(human_id=row[0], token=token)
+        for row in rows
+        for token in normalization.tokenize(*row[1:])))
+
+
+def rebuild_tokens(queryset=None, chunk_size=500):
+    """ Rebuilds search tokens of humans in ``queryset`` (all humans
+    by default) chunk by chunk. Returns number of processed humans.
+    """
+
+    if queryset is None:
+        queryset = models.Human.objects.all()
+    count = 0
+    for chunk in bulk.iter_chunks(
+            queryset.values_list(
+                'id', 'first_name', 'last_name', 'old_last_name'),
+            chunk_size):
+        with transaction.commit_on_success():
+            rebuild_chunk(chunk)
+        count += len(chunk)
+    return count
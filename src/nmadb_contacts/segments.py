@@ -0,0 +1,120 @@
+""" Materialized mailing segments.
+
+Humans matching :py:class:`nmadb_contacts.models.Segment` definition
+are stored in :py:class:`nmadb_contacts.models.SegmentMember`, so mail
+to segment is resolved with one indexed join. Segment remembers the
+last settled change feed entry and :py:func:`refresh` rechecks only
+humans changed since then, including the unsettled ones, which are
+rechecked again next time. Segment is rebuilt from scratch when it is
+saved or when change feed entries it needs were already pruned.
+
+Changes of municipalities themselves are not in the change feed, so
+segments filtered by municipality type should be rebuilt after editing
+municipality types.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from nmadb_contacts import bulk
+from nmadb_contacts import changefeed
+from nmadb_contacts import models
+
+
+CHUNK_SIZE = 500
+
+
+def get_humans(segment):
+    """ Returns query set of humans, who match ``segment`` definition.
+    Conditions on contacts are subqueries, so every human is returned
+    once without ``DISTINCT``.
+    """
+
+    humans = models.Human.objects.all()
+    if segment.gender:
+        humans = humans.filter(gender=segment.gender)
+    if segment.municipality_id is not None:
+        humans = humans.filter(
+                main_address__municipality=segment.municipality_id)
+    if segment.municipality_type:
+        humans = humans.filter(
+                main_address__municipality__municipality_type=(
+                    segment.municipality_type))
+    if segment.institution_id is not None:
+        humans = humans.filter(id__in=models.Institution.objects.filter(
+            canonical=segment.institution_id).values('human'))
+    if segment.with_used_email:
+        humans = humans.filter(id__in=models.Email.objects.exclude(
+            used=False).values('human'))
+    return humans
+
+
+def get_members(segments):
+    """ Returns query set of humans, who are members of ``segments``.
+    """
+
+    return models.Human.objects.filter(
+            id__in=models.SegmentMember.objects.filter(
+                segment__in=segments).values('human'))
+
+
+def save_state(segment, feed_position):
+    """ Stores ``feed_position`` and the new size of ``segment``.
+    """
+
+    segment.feed_position = feed_position
+    segment.size = models.SegmentMember.objects.filter(
+            segment=segment).count()
+    segment.refreshed = timezone.now()
+    models.Segment.objects.filter(id=segment.id).update(
+            feed_position=segment.feed_position,
+            size=segment.size,
+            refreshed=segment.refreshed)
+
+
+def rebuild(segment, chunk_size=CHUNK_SIZE):
+    """ Replaces all members of ``segment``.
+    """
+
+    with transaction.commit_on_success():
+        feed_position = changefeed.get_settled_position()
+        models.SegmentMember.objects.filter(segment=segment).delete()
+        for chunk in bulk.iter_chunks(
+                get_humans(segment).values_list('id'), chunk_size):
+            bulk.bulk_create(models.SegmentMember, [
+                models.SegmentMember(segment=segment, human_id=human_id)
+                for human_id, in chunk])
+        save_state(segment, feed_position)
+
+
+def refresh(segment, chunk_size=CHUNK_SIZE):
+    """ Applies change feed entries after segment position to its
+    members. Returns number of rechecked humans or ``None`` if
+    segment was rebuilt.
+    """
+
+    if (segment.refreshed is None or
+            changefeed.is_expired(segment.feed_position)):
+        rebuild(segment, chunk_size)
+        return None
+    feed_position = max(
+            segment.feed_position, changefeed.get_settled_position())
+    entries = models.ChangeFeedEntry.objects.filter(
+            id__gt=segment.feed_position,
+            human_id__isnull=False)
+    human_ids = sorted(set(entries.values_list('human_id', flat=True)))
+    with transaction.commit_on_success():
+        for chunk in bulk.chunked(human_ids, chunk_size):
+            matching = set(get_humans(segment).filter(
+                id__in=chunk).values_list('id', flat=True))
+            members = models.SegmentMember.objects.filter(
+                    segment=segment, human__in=chunk)
+            current = set(members.values_list('human_id', flat=True))
+            if current - matching:
+                members.filter(human__in=current - matching).delete()
+            bulk.bulk_create(models.SegmentMember, [
+                models.SegmentMember(segment=segment, human_id=human_id)
+                for human_id in sorted(matching - current)])
+        save_state(segment, feed_position)
+    return len(human_ids)
+
@@ -0,0 +1,4 @@
+-- Addresses, which still need municipality resolved by town.
+CREATE INDEX nmadb_contacts_address_unresolved_town_idx
+    ON nmadb_contacts_address (town)
+    WHERE municipality_id IS NULL;
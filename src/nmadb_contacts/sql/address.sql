@@ -0,0 +1,3 @@
+-- Addresses ordered by municipality.
+CREATE INDEX nmadb_contacts_address_municipality_id_idx
+    ON nmadb_contacts_address (municipality_id, id);
@@ -0,0 +1,3 @@
+-- History of one human, newest entries first.
+CREATE INDEX nmadb_contacts_auditentry_history_idx
+    ON nmadb_contacts_auditentry (human_id, id);
@@ -0,0 +1,3 @@
+-- Review list of duplicate candidates.
+CREATE INDEX nmadb_contacts_duplicatecandidate_review_idx
+    ON nmadb_contacts_duplicatecandidate (dismissed, score);
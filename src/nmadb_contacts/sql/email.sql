@@ -0,0 +1,6 @@
+-- Listing used contacts of humans.
+CREATE INDEX nmadb_contacts_email_human_used_idx
+    ON nmadb_contacts_email (human_id, used);
+-- Finding stale contacts.
+CREATE INDEX nmadb_contacts_email_used_last_time_used_idx
+    ON nmadb_contacts_email (used, last_time_used);
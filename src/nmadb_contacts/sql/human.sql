@@ -0,0 +1,4 @@
+-- Default ordering of humans with primary key as tie breaker, used by
+-- change list pages.
+CREATE INDEX nmadb_contacts_human_name_idx
+    ON nmadb_contacts_human (last_name, first_name, id);
@@ -0,0 +1,3 @@
+-- Humans changed since the last duplicate detection run.
+CREATE INDEX nmadb_contacts_humanblockingkey_pending_idx
+    ON nmadb_contacts_humanblockingkey (pending, human_id);
@@ -0,0 +1,3 @@
+-- Default ordering and grouping of institutions by title.
+CREATE INDEX nmadb_contacts_institution_title_idx
+    ON nmadb_contacts_institution (title, human_id);
@@ -0,0 +1,4 @@
+-- Contacts, which are still used, ordered by staleness.
+CREATE INDEX nmadb_contacts_phone_still_used_idx
+    ON nmadb_contacts_phone (last_time_used)
+    WHERE used IS NOT FALSE;
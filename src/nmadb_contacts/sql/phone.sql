@@ -0,0 +1,6 @@
+-- Listing used contacts of humans.
+CREATE INDEX nmadb_contacts_phone_human_used_idx
+    ON nmadb_contacts_phone (human_id, used);
+-- Finding stale contacts.
+CREATE INDEX nmadb_contacts_phone_used_last_time_used_idx
+    ON nmadb_contacts_phone (used, last_time_used);
@@ -0,0 +1,80 @@
+""" Contact summaries stored on humans.
+"""
+
+from django.db import transaction
+
+from nmadb_contacts import bulk
+from nmadb_contacts import facets
+from nmadb_contacts import models
+
+
+CHUNK_SIZE = 500
+
+SEPARATOR = u', '
+
+ELLIPSIS = u'\u2026'
+"""Marks summaries, which were cut to fit into their field."""
+
+SUMMARY_FIELDS = (
+        'main_address_text',
+        'phone_numbers',
+        'email_addresses',
+        'has_contracts_info',
+        )
+
+
+def join(values, field_name):
+    """ Joins ``values`` so that they fit into ``field_name`` of human.
+    Summary, which is too long, is cut and ends with an ellipsis.
+    """
+
+    max_length = models.Human._meta.get_field(field_name).max_length
+    summary = SEPARATOR.join(values)
+    if len(summary) > max_length:
+        summary = summary[:max_length - len(ELLIPSIS)] + ELLIPSIS
+    return summary
+
+
+def rebuild(human_ids):
+    """ Recomputes contact summaries of humans with ``human_ids`` and
+    updates rows, which have changed, with one query per batch.
+    """
+
+    numbers = {}
+    for human_id, number in models.Phone.objects.filter(
+            human__in=human_ids).exclude(used=False).order_by(
+            'id').values_list('human_id', 'number'):
+        numbers.setdefault(human_id, []).append(number)
+    addresses = {}
+    for human_id, address in models.Email.objects.filter(
+            human__in=human_ids).exclude(used=False).order_by(
+            'id').values_list('human_id', 'address'):
+        addresses.setdefault(human_id, []).append(address)
+    with_info = set(models.InfoForContracts.objects.filter(
+        human__in=human_ids).values_list('human_id', flat=True))
+    humans = models.Human.objects.filter(id__in=human_ids).values_list(
+            'id', 'main_address__address', *SUMMARY_FIELDS)
+    changed = {}
+    for row in humans:
+        human_id = row[0]
+        summary = (
+                row[1] or u'',
+                join(numbers.get(human_id, ()), 'phone_numbers'),
+                join(addresses.get(human_id, ()), 'email_addresses'),
+                human_id in with_info,
+                )
+        if summary != tuple(row[2:]):
+            changed[human_id] = summary
+    if changed:
+        bulk.update_rows(models.Human, SUMMARY_FIELDS, changed)
+
+
+def rebuild_all(chunk_size=CHUNK_SIZE):
+    """ Recomputes contact summaries of all humans.
+    """
+
+    for chunk in bulk.iter_chunks(
+            models.Human.objects.values_list('id', flat=True), chunk_size):
+        with transaction.commit_on_success():
+            rebuild(chunk)
+    facets.invalidate()
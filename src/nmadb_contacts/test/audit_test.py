@@ -0,0 +1,101 @@
+#!/usr/bin/python
+
+
+from StringIO import StringIO
+
+from django.contrib.auth.models import User
+from django.core.signals import request_finished
+from django.test import TestCase
+
+from nmadb_contacts import audit
+from nmadb_contacts import emails
+from nmadb_contacts import models
+
+
+class AuditTest(TestCase):
+    """ Checks that only changed fields are audited and that entries
+    are buffered inside batch.
+    """
+
+    def setUp(self):
+        self.human = models.Human.objects.create(
+                first_name=u'Jonas', last_name=u'Jonaitis', gender=u'M')
+        self.email = models.Email.objects.create(
+                human=self.human, address=u'jonas@example.com', used=True)
+
+    def test_create(self):
+        entries = audit.history(self.human.id)
+        self.assertEqual(
+                [(entry['model'], entry['action']) for entry in entries],
+                [(u'email', u'C'), (u'human', u'C')])
+        self.assertEqual(
+                entries[0]['changes']['address'],
+                [None, u'jonas@example.com'])
+        self.assertFalse('address_key' in entries[0]['changes'])
+
+    def test_update_stores_only_changed_fields(self):
+        human = models.Human.objects.get(id=self.human.id)
+        human.last_name = u'Petraitis'
+        human.save()
+        human.save()
+        entries = audit.history(self.human.id)
+        self.assertEqual(len(entries), 3)
+        self.assertEqual(entries[0]['action'], u'U')
+        self.assertEqual(
+                entries[0]['changes'],
+                {u'last_name': [u'Jonaitis', u'Petraitis']})
+
+    def test_load_does_not_snapshot(self):
+        human = models.Human.objects.get(id=self.human.id)
+        self.assertFalse(hasattr(human, audit.SNAPSHOT_ATTRIBUTE))
+        human.first_name = u'Petras'
+        human.save()
+        self.assertFalse(hasattr(human, audit.SNAPSHOT_ATTRIBUTE))
+        self.assertEqual(
+                audit.history(self.human.id)[0]['changes'],
+                {u'first_name': [u'Jonas', u'Petras']})
+
+    def test_delete(self):
+        self.email.delete()
+        entry = audit.history(self.human.id)[0]
+        self.assertEqual(entry['action'], u'D')
+        self.assertEqual(
+                entry['changes']['address'],
+                [u'jonas@example.com', None])
+
+    def test_batch(self):
+        user = User.objects.create_user(u'admin', u'admin@example.com')
+        with self.assertNumQueries(0):
+            with audit.batch(user.id):
+                pass
+        with audit.batch(user.id):
+            for i in range(3):
+                models.Phone.objects.create(
+                        human=self.human,
+                        number=u'+3706123456{0}'.format(i))
+            self.assertEqual(len(audit.state.entries), 3)
+        self.assertEqual(audit.state.entries, [])
+        self.assertEqual(
+                models.AuditEntry.objects.filter(
+                    model=u'phone', user=user).count(), 3)
+
+    def test_failed_batch_is_discarded(self):
+        def change():
+            with audit.batch():
+                self.email.used = False
+                self.email.save()
+                raise ValueError()
+        self.assertRaises(ValueError, change)
+        self.assertEqual(audit.state.entries, [])
+        self.assertEqual(
+                models.AuditEntry.objects.filter(action=u'U').count(), 0)
+
+    def test_bulk_update(self):
+        emails.process_bounces(StringIO('jonas@example.com,5.1.1\n'))
+        entry = audit.history(self.human.id)[0]
+        self.assertEqual(entry['changes'], {u'used': [True, False]})
+
+    def test_user_is_forgotten_when_request_finishes(self):
+        audit.state.user_id = 1
+        request_finished.send(sender=None)
+        self.assertEqual(audit.state.user_id, None)
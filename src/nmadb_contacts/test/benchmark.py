@@ -0,0 +1,204 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Benchmarks of contacts application at scale.
+
+Run with configured ``DJANGO_SETTINGS_MODULE``, which mounts admin
+site::
+
+    python -m nmadb_contacts.test.benchmark --humans 10000 \\
+        --output baseline.json
+
+    python -m nmadb_contacts.test.benchmark --humans 10000 \\
+        --baseline baseline.json
+
+Benchmarks run in a freshly created test database, which is filled by
+:py:mod:`nmadb_contacts.test.generator`. Every benchmark records wall
+time and number of queries. When baseline is given, benchmarks, which
+execute more queries or are slower by more than the tolerance, are
+reported as regressions.
+"""
+
+import json
+import optparse
+import sys
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.client import Client
+from django.test.utils import setup_test_environment
+
+import nmadb_contacts.admin                 # Registers model admins.
+from nmadb_contacts import export
+from nmadb_contacts import models
+from nmadb_contacts.instrumentation import Measurement
+from nmadb_contacts import recipients
+from nmadb_contacts.test import generator
+
+
+ADMIN_MODELS = (
+        models.Human,
+        models.Address,
+        models.Phone,
+        models.Email,
+        models.InfoForContracts,
+        models.Institution,
+        )
+
+RECIPIENT_HUMANS = 1000
+
+
+def get_changelist_url(model):
+    """ Returns URL of admin change list of ``model``.
+    """
+    return reverse('admin:{0.app_label}_{0.module_name}_changelist'.format(
+        model._meta))
+
+
+def benchmark_changelists(client, results):
+    """ Measures admin change list pages.
+    """
+
+    for model in ADMIN_MODELS:
+        with Measurement() as measurement:
+            response = client.get(get_changelist_url(model))
+        assert response.status_code == 200
+        results['changelist.' + model._meta.module_name] = (
+                measurement.as_dict())
+
+
+def benchmark_search(client, results):
+    """ Measures admin searches by name.
+    """
+
+    for model, query in (
+            (models.Human, u'Jon'),
+            (models.Human, u'Šarūnas Kazlauskas'),
+            (models.Address, u'sarunas'),
+            (models.Email, u'Ona'),
+            ):
+        with Measurement() as measurement:
+            response = client.get(get_changelist_url(model), {'q': query})
+        assert response.status_code == 200
+        results[u'search.{0}.{1}'.format(
+            model._meta.module_name, query)] = measurement.as_dict()
+
+
+def benchmark_exports(results):
+    """ Measures sheet exports of all objects.
+    """
+
+    for model in ADMIN_MODELS:
+        model_admin = admin.site._registry[model]
+        sheet_mapping = getattr(model_admin, 'sheet_mapping', None)
+        if not sheet_mapping:
+            continue
+        exporter = export.SheetExporter(model, sheet_mapping)
+        with Measurement() as measurement:
+            for row in exporter.iter_rows(model.objects.all()):
+                pass
+        results['export.' + model._meta.module_name] = (
+                measurement.as_dict())
+
+
+def benchmark_recipients(results):
+    """ Measures recipient resolution of mail actions.
+    """
+
+    first_id = models.Human.objects.order_by('id')[0].id
+    queryset = models.Human.objects.filter(
+            id__lt=first_id + RECIPIENT_HUMANS)
+    with Measurement() as measurement:
+        resolver = recipients.HumanRecipientResolver(queryset)
+        for human in queryset:
+            resolver(human)
+        resolver.mark()
+    results['recipients.human'] = measurement.as_dict()
+
+
+def run(humans, seed=0):
+    """ Fills database with ``humans`` generated humans and returns
+    benchmark results.
+    """
+
+    with Measurement() as measurement:
+        generator.generate(humans, seed)
+    results = {'generate': measurement.as_dict()}
+    User.objects.create_superuser(
+            u'benchmark', u'benchmark@example.com', u'benchmark')
+    client = Client()
+    client.login(username=u'benchmark', password=u'benchmark')
+    benchmark_changelists(client, results)
+    benchmark_search(client, results)
+    benchmark_exports(results)
+    benchmark_recipients(results)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """ Returns list of regression descriptions.
+    """
+
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        if result['queries'] > expected['queries']:
+            regressions.append(u'{0}: {1} queries instead of {2}'.format(
+                name, result['queries'], expected['queries']))
+        if result['seconds'] > expected['seconds'] * (1 + tolerance):
+            regressions.append(u'{0}: {1:.3f}s instead of {2:.3f}s'.format(
+                name, result['seconds'], expected['seconds']))
+    return regressions
+
+
+def main(argv):
+    """ Runs benchmarks from the command line.
+    """
+
+    parser = optparse.OptionParser()
+    parser.add_option('--humans', type='int', default=10000)
+    parser.add_option('--seed', type='int', default=0)
+    parser.add_option(
+            '--output', help=u'File to which results are written.')
+    parser.add_option(
+            '--baseline', help=u'File with results to compare to.')
+    parser.add_option(
+            '--tolerance', type='float', default=0.5,
+            help=u'Allowed relative slow down.')
+    options, args = parser.parse_args(argv)
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        results = run(options.humans, options.seed)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+    results = {
+            'humans': options.humans,
+            'seed': options.seed,
+            'results': results,
+            }
+
+    if options.output:
+        with open(options.output, 'w') as fp:
+            json.dump(results, fp, indent=4, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=4, sort_keys=True)
+    if options.baseline:
+        with open(options.baseline) as fp:
+            baseline = json.load(fp)
+        regressions = compare(
+                results['results'], baseline['results'], options.tolerance)
+        for regression in regressions:
+            sys.stderr.write(regression.encode('utf-8') + '\n')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,129 @@
+#!/usr/bin/python
+
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from nmadb_contacts import instrumentation
+from nmadb_contacts import models
+from nmadb_contacts.test import generator
+
+
+HUMANS = 30
+
+
+class QueryBudgetTest(TestCase):
+    """ Checks that admin views stay within their query budgets.
+    """
+
+    urls = 'nmadb_contacts.test.urls'
+
+    def setUp(self):
+        generator.generate(HUMANS, dedupe_keys=False)
+        models.Segment.objects.create(title=u'Visi')
+        User.objects.create_superuser(
+                u'admin', u'admin@example.com', u'admin')
+        self.client.login(username=u'admin', password=u'admin')
+        # Content types cached by earlier tests would make query
+        # counts depend on test order, so the cache is filled here.
+        ContentType.objects.clear_cache()
+        for model, _ in self.get_model_admins():
+            ContentType.objects.get_for_model(model)
+
+    def get_model_admins(self):
+        """ Returns model admins of this application, which declare
+        query budgets.
+        """
+        return [
+                (model, model_admin)
+                for model, model_admin in admin.site._registry.items()
+                if model._meta.app_label == 'nmadb_contacts' and
+                getattr(model_admin, 'query_budgets', None)]
+
+    def assertWithinBudget(
+            self, model_admin, view, func, *args, **kwargs):
+        budget = instrumentation.get_budget(model_admin, view)
+        with instrumentation.Measurement() as measurement:
+            response = func(*args)
+            # Streamed responses execute queries while being read.
+            response.content
+        self.assertTrue(
+                response.status_code in kwargs.get('status_codes', (200,)),
+                u'{0}.{1}: status {2}'.format(
+                    type(model_admin).__name__, view,
+                    response.status_code))
+        self.assertTrue(
+                measurement.queries <= budget,
+                u'{0}.{1}: {2} queries, budget {3}:\n{4}'.format(
+                    type(model_admin).__name__, view,
+                    measurement.queries, budget,
+                    u'\n'.join(
+                        statement['sql']
+                        for statement in measurement.statements)))
+
+    def get_url(self, model, view, *args):
+        return reverse(
+                'admin:{0.app_label}_{0.module_name}_{1}'.format(
+                    model._meta, view),
+                args=args)
+
+    def test_changelists(self):
+        for model, model_admin in self.get_model_admins():
+            if 'changelist' in model_admin.query_budgets:
+                self.assertWithinBudget(
+                        model_admin, 'changelist', self.client.get,
+                        self.get_url(model, 'changelist'))
+
+    def test_changelist_rows_are_not_loaded_lazily(self):
+        for model, model_admin in self.get_model_admins():
+            url = self.get_url(model, 'changelist')
+            queries = []
+            old_per_page = model_admin.list_per_page
+            try:
+                for per_page in (2, HUMANS):
+                    model_admin.list_per_page = per_page
+                    # Cached facet counts would hide the difference.
+                    cache.clear()
+                    with instrumentation.Measurement() as measurement:
+                        self.client.get(url)
+                    queries.append(measurement.queries)
+            finally:
+                model_admin.list_per_page = old_per_page
+            self.assertEqual(
+                    queries[0], queries[1],
+                    u'{0}: {1}'.format(type(model_admin).__name__, queries))
+
+    def test_change_views(self):
+        for model, model_admin in self.get_model_admins():
+            obj = model.objects.order_by('id')[:1]
+            if 'change' in model_admin.query_budgets and obj:
+                self.assertWithinBudget(
+                        model_admin, 'change', self.client.get,
+                        self.get_url(model, 'change', obj[0].id))
+
+    def test_actions(self):
+        for model, model_admin in self.get_model_admins():
+            ids = list(model.objects.order_by('id').values_list(
+                'id', flat=True)[:model_admin.list_per_page])
+            for view in model_admin.query_budgets:
+                if view in ('changelist', 'change'):
+                    continue
+                self.assertTrue(
+                        view in (model_admin.actions or ()),
+                        u'{0}: budget of unknown action {1}'.format(
+                            type(model_admin).__name__, view))
+                self.assertWithinBudget(
+                        model_admin, view, self.client.post,
+                        self.get_url(model, 'changelist'),
+                        {
+                            'action': view,
+                            'index': 0,
+                            '_selected_action': ids,
+                            },
+                        # Actions without intermediate page redirect
+                        # back to change list.
+                        status_codes=(200, 302))
@@ -0,0 +1,95 @@
+#!/usr/bin/python
+
+
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from nmadb_contacts import changefeed
+from nmadb_contacts import models
+
+
+class ChangeFeedTest(TestCase):
+    """ Checks that change feed returns only changes after cursor.
+    """
+
+    def setUp(self):
+        # Entries of tests are settled as soon as they are written.
+        self.old_commit_lag = changefeed.COMMIT_LAG
+        changefeed.COMMIT_LAG = -1
+        self.human = models.Human.objects.create(
+                first_name=u'Jonas', last_name=u'Jonaitis', gender=u'M')
+        self.phone = models.Phone.objects.create(
+                human=self.human, number=u'+37061234567')
+        self.cursor = changefeed.get_cursor()
+
+    def tearDown(self):
+        changefeed.COMMIT_LAG = self.old_commit_lag
+
+    def test_no_changes(self):
+        page = changefeed.get_changes(self.cursor)
+        self.assertEqual((page.changed, page.deleted), ({}, {}))
+        self.assertEqual(page.cursor, self.cursor)
+        self.assertFalse(page.more)
+
+    def test_changes(self):
+        email = models.Email.objects.create(
+                human=self.human, address=u'jonas@example.com')
+        email.used = False
+        email.save()
+        phone_id = self.phone.id
+        self.phone.delete()
+        page = changefeed.get_changes(self.cursor)
+        self.assertEqual(
+                [row['id'] for row in page.changed['email']], [email.id])
+        self.assertEqual(page.changed['email'][0]['used'], False)
+        self.assertEqual(page.deleted, {'phone': [phone_id]})
+        self.assertEqual(
+                changefeed.get_changes(page.cursor).changed, {})
+
+    def test_pages(self):
+        for i in range(5):
+            models.Email.objects.create(
+                    human=self.human,
+                    address=u'jonas{0}@example.com'.format(i))
+        pages = list(changefeed.iter_changes(self.cursor, page_size=2))
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(
+                sum(len(page.changed['email']) for page in pages), 5)
+
+    def test_expired_cursor(self):
+        models.Email.objects.create(
+                human=self.human, address=u'jonas@example.com')
+        changefeed.prune(timezone.now() + datetime.timedelta(days=1))
+        models.Email.objects.create(
+                human=self.human, address=u'ona@example.com')
+        self.assertRaises(
+                changefeed.CursorExpired,
+                changefeed.get_changes, self.cursor)
+
+    def test_gap_is_not_expired(self):
+        models.Email.objects.create(
+                human=self.human, address=u'jonas@example.com')
+        # Entries of rolled back transactions leave gaps in ids.
+        models.ChangeFeedEntry.objects.filter(kind=u'email').delete()
+        email = models.Email.objects.create(
+                human=self.human, address=u'ona@example.com')
+        page = changefeed.get_changes(self.cursor)
+        self.assertEqual(
+                [row['id'] for row in page.changed['email']], [email.id])
+
+    def test_unsettled_entries_are_returned_again(self):
+        changefeed.COMMIT_LAG = 300
+        email = models.Email.objects.create(
+                human=self.human, address=u'jonas@example.com')
+        page = changefeed.get_changes(self.cursor)
+        self.assertEqual(
+                [row['id'] for row in page.changed['email']], [email.id])
+        self.assertEqual(page.cursor, self.cursor)
+        self.assertFalse(page.more)
+        changefeed.COMMIT_LAG = -1
+        page = changefeed.get_changes(page.cursor)
+        self.assertEqual(
+                [row['id'] for row in page.changed['email']], [email.id])
+        self.assertEqual(changefeed.get_changes(page.cursor).changed, {})
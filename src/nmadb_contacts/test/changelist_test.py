@@ -0,0 +1,81 @@
+#!/usr/bin/python
+
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from nmadb_contacts import counts
+from nmadb_contacts import models
+from nmadb_contacts.test import generator
+
+
+HUMANS = 35
+
+
+class HumanChangeListTest(TestCase):
+    """ Checks keyset pagination of human change list.
+    """
+
+    urls = 'nmadb_contacts.test.urls'
+
+    def setUp(self):
+        generator.generate(HUMANS, dedupe_keys=False)
+        User.objects.create_superuser(
+                u'admin', u'admin@example.com', u'admin')
+        self.client.login(username=u'admin', password=u'admin')
+        self.url = reverse('admin:nmadb_contacts_human_changelist')
+
+    def walk(self, params):
+        """ Returns ids of humans on all pages following next links.
+        """
+
+        ids = []
+        response = self.client.get(self.url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            cl = response.context['cl']
+            self.assertTrue(cl.keyset)
+            ids.extend(human.id for human in cl.result_list)
+            if not cl.next_url:
+                return ids
+            response = self.client.get(self.url + cl.next_url)
+
+    def get_expected(self, queryset):
+        return list(queryset.order_by(
+            'last_name', 'first_name', 'id').values_list('id', flat=True))
+
+    def test_all_pages(self):
+        self.assertEqual(
+                self.walk({}),
+                self.get_expected(models.Human.objects.all()))
+
+    def test_filter(self):
+        self.assertEqual(
+                self.walk({'has_contracts_info__exact': 1}),
+                self.get_expected(models.Human.objects.filter(
+                    has_contracts_info=True)))
+
+    def test_search(self):
+        self.assertEqual(
+                self.walk({'q': u'jonas'}),
+                self.get_expected(models.Human.objects.filter(
+                    first_name=u'Jonas')))
+
+    def test_bad_cursor(self):
+        response = self.client.get(self.url, {'after': u'bad'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_other_ordering_uses_offset(self):
+        response = self.client.get(self.url, {'o': u'1', 'p': u'1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['cl'].keyset)
+
+    def test_cached_count(self):
+        queryset = models.Human.objects.all()
+        self.assertEqual(
+                counts.get_count(queryset, threshold=1), (HUMANS, True))
+        if counts.estimate(queryset) is None:
+            self.assertEqual(
+                    counts.get_count(queryset, threshold=1),
+                    (HUMANS, False))
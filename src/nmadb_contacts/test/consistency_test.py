@@ -0,0 +1,66 @@
+#!/usr/bin/python
+
+
+from django.test import TestCase
+
+from nmadb_contacts import consistency
+from nmadb_contacts import models
+
+
+class ConsistencyTest(TestCase):
+    """ Checks that violations are found and main addresses fixed.
+    """
+
+    def setUp(self):
+        self.jonas, self.ona, self.petras = [
+                models.Human.objects.create(
+                    first_name=name, last_name=u'Pavarde', gender=u'M')
+                for name in (u'Jonas', u'Ona', u'Petras')]
+        self.address = models.Address.objects.create(
+                human=self.jonas, town=u'Vilnius', address=u'Gatve 1')
+        models.Address.objects.create(
+                human=self.ona, town=u'Kaunas', address=u'Gatve 2')
+        models.Human.objects.filter(id=self.petras.id).update(
+                main_address=self.address)
+        self.email = models.Email.objects.create(
+                human=self.jonas, address=u'jonas@example.com',
+                used=False)
+        models.Email.objects.create(
+                human=self.ona, address=u'ona@example.com', used=False)
+        models.Email.objects.create(
+                human=self.ona, address=u'ona2@example.com')
+
+    def test_check(self):
+        self.assertEqual(list(consistency.check()), [
+            (u'foreign_main_address', self.petras.id, self.address.id),
+            (u'missing_main_address', self.jonas.id, None),
+            (u'missing_main_address', self.ona.id, None),
+            (u'unused_only_email', self.email.id, self.jonas.id),
+            ])
+
+    def test_fix(self):
+        list(consistency.check(fix=True))
+        self.assertEqual(
+                [(name, object_id)
+                 for name, object_id, _ in consistency.check()],
+                [(u'unused_only_email', self.email.id)])
+        humans = dict(
+                (human.id, human) for human in models.Human.objects.all())
+        self.assertEqual(humans[self.petras.id].main_address_id, None)
+        self.assertEqual(
+                humans[self.jonas.id].main_address_text, u'Gatve 1')
+        self.assertEqual(
+                humans[self.ona.id].main_address.human_id, self.ona.id)
+
+    def test_fix_keeps_chosen_main_address(self):
+        address = models.Address.objects.create(
+                human=self.ona, town=u'Kaunas', address=u'Gatve 3')
+        models.Human.objects.filter(id=self.ona.id).update(
+                main_address=address)
+        consistency.fix_missing_main_addresses(
+                [(self.jonas.id, None), (self.ona.id, None)])
+        self.assertEqual(
+                dict(models.Human.objects.filter(
+                    id__in=(self.jonas.id, self.ona.id)).values_list(
+                    'id', 'main_address')),
+                {self.jonas.id: self.address.id, self.ona.id: address.id})
@@ -0,0 +1,82 @@
+#!/usr/bin/python
+
+
+import datetime
+
+from django.test import TestCase
+
+from nmadb_contacts import dedupe
+from nmadb_contacts import models
+
+
+class BlockingKeyTest(TestCase):
+    """ Checks building of blocking keys.
+    """
+
+    def test_keys(self):
+        keys = dedupe.get_keys(
+                u'Jonas', u'Jonaitis', None, datetime.date(1990, 1, 2),
+                None, [u'8 612 34567'], [u' Jonas@Example.com'])
+        self.assertEqual(keys, set([
+            u'name:jonas:jonaitis',
+            u'birth:1990-01-02:j',
+            u'phone:61234567',
+            u'email:jonas@example.com',
+            ]))
+
+
+class DuplicateScoreTest(TestCase):
+    """ Checks scoring of humans, who share blocking keys.
+    """
+
+    def create_human(self, first_name, last_name, **kwargs):
+        return models.Human.objects.create(
+                first_name=first_name, last_name=last_name, gender=u'M',
+                **kwargs)
+
+    def get_candidates(self):
+        return dict(
+                ((row[0], row[1]), row[2:])
+                for row in models.DuplicateCandidate.objects.values_list(
+                    'first', 'second', 'score', 'reasons'))
+
+    def test_scores(self):
+        born = datetime.date(1990, 1, 2)
+        first = self.create_human(
+                u'Jonas', u'Jonaitis', birth_date=datetime.date(1985, 5, 5))
+        second = self.create_human(
+                u'JONAS', u'Jonaitis', birth_date=datetime.date(1985, 5, 5))
+        third = self.create_human(u'Jonas', u'Petraitis', birth_date=born)
+        fourth = self.create_human(
+                u'Juozas', u'Kazlauskas', birth_date=born)
+        self.create_human(u'Petras', u'Petraitis')
+        dedupe.find_all()
+        self.assertEqual(self.get_candidates(), {
+            (first.id, second.id): (0.8, u'birth, name'),
+            })
+        self.assertEqual(
+                models.HumanBlockingKey.objects.filter(
+                    human__in=(third, fourth), key__startswith=u'birth:',
+                    ).count(),
+                2)
+
+    def test_different_identity_codes(self):
+        for code in (u'39001020002', u'39001020013'):
+            self.create_human(u'Jonas', u'Jonaitis', identity_code=code)
+        dedupe.find_all()
+        self.assertEqual(self.get_candidates(), {})
+
+    def test_dismissed_pair_is_kept(self):
+        first = self.create_human(u'Jonas', u'Jonaitis')
+        second = self.create_human(u'Jonas', u'Jonaitis')
+        dedupe.find_all()
+        models.DuplicateCandidate.objects.update(dismissed=True)
+        second.first_name = u'Jonas'
+        second.save()
+        dedupe.find_pending()
+        self.assertEqual(
+                list(models.DuplicateCandidate.objects.values_list(
+                    'first', 'second', 'dismissed')),
+                [(first.id, second.id, True)])
+        self.assertFalse(models.HumanBlockingKey.objects.filter(
+            pending=True).exists())
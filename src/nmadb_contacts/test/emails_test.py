@@ -0,0 +1,62 @@
+#!/usr/bin/python
+
+
+from StringIO import StringIO
+
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from nmadb_contacts import emails
+from nmadb_contacts import models
+
+
+BOUNCE_LOG = u"""address,status
+JONAS@example.com,5.1.1
+ona@example.com,4.2.2
+petras@example.com,delivered
+unknown@example.com,bounced
+""".encode('utf-8')
+
+
+class EmailResolverTest(TestCase):
+    """ Checks case insensitive resolution of addresses and bounces.
+    """
+
+    def setUp(self):
+        self.human = models.Human.objects.create(
+                first_name=u'Jonas', last_name=u'Jonaitis', gender=u'M')
+        for name in (u'Jonas', u'ona', u'petras'):
+            models.Email.objects.create(
+                    human=self.human,
+                    address=u'{0}@example.com'.format(name),
+                    used=True)
+
+    def test_key_is_kept_up_to_date(self):
+        self.assertEqual(
+                models.Email.objects.get(
+                    address=u'Jonas@example.com').address_key,
+                u'jonas@example.com')
+
+    def test_resolve(self):
+        with self.assertNumQueries(1):
+            resolved = emails.resolve_emails(
+                    [u'JONAS@EXAMPLE.COM', u'nobody@example.com'])
+        self.assertEqual(
+                resolved[u'JONAS@EXAMPLE.COM'].address,
+                u'Jonas@example.com')
+        self.assertEqual(resolved[u'nobody@example.com'], None)
+
+    def test_duplicate_is_rejected(self):
+        email = models.Email(human=self.human, address=u'ONA@example.com')
+        self.assertRaises(ValidationError, email.full_clean)
+
+    def test_process_bounces(self):
+        marked, unknown = emails.process_bounces(StringIO(BOUNCE_LOG))
+        self.assertEqual((marked, unknown), (1, 1))
+        self.assertEqual(
+                sorted(models.Email.objects.filter(
+                    used=True).values_list('address', flat=True)),
+                [u'ona@example.com', u'petras@example.com'])
+        self.assertEqual(
+                models.Human.objects.get().email_addresses,
+                u'ona@example.com, petras@example.com')
@@ -0,0 +1,126 @@
+#!/usr/bin/python
+
+
+import re
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import unittest
+
+from nmadb_contacts import models
+from nmadb_contacts import municipalities
+from nmadb_contacts import search
+
+
+SQLITE_FULL_SCAN_RE = re.compile(r'^SCAN (TABLE )?(?P<table>\w+)$')
+
+
+def explain(queryset):
+    """ Returns list of query plan lines of ``queryset``.
+    """
+
+    sql, params = queryset.query.sql_with_params()
+    cursor = connection.cursor()
+    if connection.vendor == 'sqlite':
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+    else:
+        cursor.execute('SET enable_seqscan = off')
+        try:
+            cursor.execute('EXPLAIN ' + sql, params)
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.execute('SET enable_seqscan = on')
+
+
+def full_scans(plan):
+    """ Returns tables, which are scanned without using any index.
+    """
+
+    tables = []
+    for line in plan:
+        line = line.strip()
+        if connection.vendor == 'sqlite':
+            match = SQLITE_FULL_SCAN_RE.match(line)
+            if match:
+                tables.append(match.group('table'))
+        elif 'Seq Scan on ' in line:
+            tables.append(line.split('Seq Scan on ', 1)[1].split()[0])
+    return tables
+
+
+@unittest.skipUnless(
+        connection.vendor in ('sqlite', 'postgresql'),
+        'Query plans are checked only on SQLite and PostgreSQL.')
+class QueryPlanTest(TestCase):
+    """ Checks that hot queries of admin, lists and exports use indexes.
+    """
+
+    def setUp(self):
+        municipalities.reset()
+        municipality = models.Municipality.objects.create(
+                town=u'Vilnius', municipality_type=u'T', code=13)
+        for i in range(20):
+            human = models.Human.objects.create(
+                    first_name=u'Jonas', last_name=u'Jonaitis{0}'.format(i),
+                    gender=u'M')
+            models.Address.objects.create(
+                    human=human, town=u'Vilnius', address=u'Gatve 1',
+                    municipality=municipality if i % 2 else None)
+            models.Email.objects.create(
+                    human=human, address=u'jonas{0}@example.com'.format(i),
+                    used=bool(i % 3))
+            models.Phone.objects.create(
+                    human=human, number=u'+3706000{0:04d}'.format(i))
+            models.Institution.objects.create(
+                    human=human, title=u'Licejus {0}'.format(i % 5))
+        if connection.vendor != 'sqlite':
+            # pysqlite commits the test transaction before ANALYZE, so
+            # rows would leak into later tests. Without statistics
+            # SQLite assumes that indexes are selective anyway.
+            connection.cursor().execute('ANALYZE')
+
+    def assertUsesIndexes(self, queryset):
+        plan = explain(queryset)
+        self.assertEqual(
+                [
+                    table for table in full_scans(plan)
+                    if table.startswith('nmadb_contacts_')],
+                [],
+                u'\n'.join(plan))
+
+    def test_human_change_list(self):
+        self.assertUsesIndexes(models.Human.objects.order_by(
+            'last_name', 'first_name', 'id')[:10])
+
+    def test_human_search(self):
+        self.assertUsesIndexes(search.search(
+            models.Human.objects.all(), u'Jon', (search.TOKEN_FIELD,)))
+
+    def test_used_contacts(self):
+        for model in (models.Email, models.Phone):
+            self.assertUsesIndexes(model.objects.filter(
+                human__in=[1, 2, 3]).exclude(used=False))
+
+    def test_stale_contacts(self):
+        for model in (models.Email, models.Phone):
+            self.assertUsesIndexes(model.objects.filter(
+                used=True).order_by('last_time_used')[:10])
+
+    def test_institutions(self):
+        self.assertUsesIndexes(
+                models.Institution.objects.order_by('title')[:10])
+
+    def test_export_chunk(self):
+        self.assertUsesIndexes(models.Address.objects.filter(
+            id__gt=5).order_by('id').values_list(
+            'id', 'human__first_name', 'human__last_name', 'town')[:5])
+
+    def test_unresolved_addresses(self):
+        self.assertUsesIndexes(models.Address.objects.filter(
+            municipality__isnull=True, town__in=[u'Vilnius']))
+
+    def test_pending_blocking_keys(self):
+        self.assertUsesIndexes(models.HumanBlockingKey.objects.filter(
+            pending=True).values_list('human_id', flat=True).distinct(
+            ).order_by('human_id')[:10])
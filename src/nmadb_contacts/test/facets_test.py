@@ -0,0 +1,60 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+
+from django.test import TestCase
+
+from nmadb_contacts import facets
+from nmadb_contacts import models
+from nmadb_contacts import municipalities
+
+
+class FacetTest(TestCase):
+    """ Checks facet counts and their invalidation.
+    """
+
+    def setUp(self):
+        # Counts cached by earlier tests belong to rolled back rows.
+        facets.cache.clear()
+        municipalities.reset()
+        self.municipality = models.Municipality.objects.create(
+                town=u'Vilnius', municipality_type=u'T', code=13)
+        models.CanonicalInstitution.objects.create(title=u'Licėjus')
+        for i, gender in enumerate((u'M', u'F', u'M')):
+            human = models.Human.objects.create(
+                    first_name=u'Vardas', last_name=u'Pavarde{0}'.format(i),
+                    gender=gender)
+            models.Institution.objects.create(
+                    human=human, title=u'licejus ')
+        self.human = human
+        address = models.Address.objects.create(
+                human=human, town=u'Vilnius', address=u'Gatve 1',
+                municipality=self.municipality)
+        human.main_address = address
+        human.save()
+        models.Email.objects.create(
+                human=human, address=u'vardas@example.com')
+
+    def test_counts(self):
+        municipalities.cache.all()
+        with self.assertNumQueries(4):
+            counts = facets.compute(models.Human.objects.all())
+        self.assertEqual(counts['total'], 3)
+        self.assertEqual(counts['gender'], {u'M': 2, u'F': 1})
+        self.assertEqual(
+                counts['municipality'],
+                {None: 2, self.municipality.id: 1})
+        self.assertEqual(counts['municipality_type'], {None: 2, u'T': 1})
+        self.assertEqual(counts['institution'], [(u'Licėjus', 3)])
+        self.assertEqual(counts['used_email'], 1)
+        self.assertEqual(counts['used_phone'], 0)
+
+    def test_cache_is_invalidated(self):
+        humans = models.Human.objects.filter(gender=u'M')
+        self.assertEqual(facets.get_counts(humans)['used_email'], 1)
+        with self.assertNumQueries(0):
+            facets.get_counts(humans)
+        email = models.Email.objects.get()
+        email.used = False
+        email.save()
+        self.assertEqual(facets.get_counts(humans)['used_email'], 0)
@@ -0,0 +1,236 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Generator of realistic synthetic contacts data.
+"""
+
+import datetime
+import random
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from nmadb_contacts import bulk
+from nmadb_contacts import dedupe
+from nmadb_contacts import identity
+from nmadb_contacts import models
+from nmadb_contacts import municipalities
+from nmadb_contacts import normalization
+from nmadb_contacts import search
+from nmadb_contacts import summaries
+
+
+MALE_FIRST_NAMES = (
+        u'Jonas', u'Petras', u'Antanas', u'Tomas', u'Mantas', u'Lukas',
+        u'Šarūnas', u'Žygimantas', u'Mindaugas', u'Vytautas', u'Gediminas',
+        u'Andrius', u'Darius', u'Paulius', u'Karolis', u'Dovydas',
+        )
+
+FEMALE_FIRST_NAMES = (
+        u'Ona', u'Rūta', u'Eglė', u'Giedrė', u'Austėja', u'Gabija',
+        u'Ieva', u'Kotryna', u'Milda', u'Žydrūnė', u'Aušra', u'Indrė',
+        u'Lina', u'Jurgita', u'Simona', u'Vaiva',
+        )
+
+LAST_NAME_STEMS = (
+        u'Kazlausk', u'Jankausk', u'Petrausk', u'Stankevič', u'Vasiliausk',
+        u'Žukausk', u'Butkev', u'Paulausk', u'Urbon', u'Kavaliausk',
+        u'Baranausk', u'Navick', u'Ramanausk', u'Šimkev', u'Savick',
+        )
+
+MALE_SUFFIX = u'as'
+MARRIED_SUFFIX = u'ienė'
+UNMARRIED_SUFFIX = u'aitė'
+
+MUNICIPALITIES = (
+        (u'Vilniaus', u'T', 13),
+        (u'Vilniaus', u'D', 41),
+        (u'Kauno', u'T', 15),
+        (u'Kauno', u'D', 52),
+        (u'Klaipėdos', u'T', 21),
+        (u'Klaipėdos', u'D', 55),
+        (u'Šiaulių', u'T', 29),
+        (u'Šiaulių', u'D', 91),
+        (u'Panevėžio', u'T', 27),
+        (u'Panevėžio', u'D', 66),
+        (u'Alytaus', u'T', 11),
+        (u'Marijampolės', u'', 56),
+        (u'Utenos', u'D', 94),
+        (u'Telšių', u'D', 89),
+        )
+
+STREETS = (
+        u'Gedimino pr.', u'Laisvės al.', u'Vilniaus g.', u'Ąžuolų g.',
+        u'Žalgirio g.', u'Kęstučio g.', u'Mokyklos g.', u'Liepų g.',
+        )
+
+INSTITUTIONS = (
+        u'Vilniaus licėjus', u'Kauno technologijos universiteto gimnazija',
+        u'Klaipėdos „Ąžuolyno“ gimnazija', u'Šiaulių Didždvario gimnazija',
+        u'Panevėžio J. Balčikonio gimnazija', u'Vilniaus universitetas',
+        )
+
+CHUNK_SIZE = 500
+
+BIRTH_DAYS = 50 * 365
+
+
+def make_identity_code(gender, birth_date, serial):
+    """ Returns valid identity code for ``gender`` and ``birth_date``.
+    """
+
+    first = (birth_date.year - 1800) // 100 * 2
+    first += 1 if gender == u'M' else 2
+    code = u'{0}{1:%y%m%d}{2:03d}'.format(first, birth_date, serial)
+    return code + unicode(identity.get_checksum(code))
+
+
+def make_human(rand, human_id):
+    """ Returns generated human and its contacts.
+    """
+
+    gender = rand.choice((u'M', u'F'))
+    stem = rand.choice(LAST_NAME_STEMS)
+    old_last_name = u''
+    if gender == u'M':
+        first_name = rand.choice(MALE_FIRST_NAMES)
+        last_name = stem + MALE_SUFFIX
+    else:
+        first_name = rand.choice(FEMALE_FIRST_NAMES)
+        if rand.random() < 0.4:
+            last_name = rand.choice(LAST_NAME_STEMS) + MARRIED_SUFFIX
+            old_last_name = stem + UNMARRIED_SUFFIX
+        else:
+            last_name = stem + UNMARRIED_SUFFIX
+    # Birth date and serial number are derived from id, so that
+    # identity codes are unique.
+    birth_date = datetime.date(1960, 1, 1) + datetime.timedelta(
+            days=human_id * 7919 % BIRTH_DAYS)
+    identity_code = None
+    if rand.random() < 0.7:
+        identity_code = make_identity_code(
+                gender, birth_date, human_id // BIRTH_DAYS % 1000)
+    human = models.Human(
+            id=human_id,
+            first_name=first_name,
+            last_name=last_name,
+            old_last_name=old_last_name,
+            gender=gender,
+            birth_date=birth_date if rand.random() < 0.8 else None,
+            identity_code=identity_code,
+            )
+    contacts = []
+    login = normalize_login(first_name, last_name)
+    for i in range(rand.randint(0, 3)):
+        address = u'{0}.{1}.{2}@example.com'.format(login, human_id, i)
+        contacts.append(models.Email(
+            human_id=human_id,
+            address=address,
+            address_key=normalization.normalize_email(address),
+            used=rand.choice((None, True, True, False)),
+            ))
+    for i in range(rand.randint(0, 2)):
+        number = u'+3706{0:07d}'.format(human_id * 3 + i)
+        contacts.append(models.Phone(
+            human_id=human_id,
+            number=number,
+            number_key=normalization.normalize_phone(number),
+            used=rand.choice((None, True, False)),
+            ))
+    for i in range(rand.randint(1, 2)):
+        town = rand.choice(MUNICIPALITIES)[0]
+        municipality = None
+        if rand.random() < 0.7:
+            municipality = municipalities.resolve_town(town)
+        contacts.append(models.Address(
+            human_id=human_id,
+            town=town,
+            municipality=municipality,
+            address=u'{0} {1}'.format(
+                rand.choice(STREETS), rand.randint(1, 120)),
+            ))
+    for i in range(rand.randint(0, 2)):
+        contacts.append(models.Institution(
+            human_id=human_id, title=rand.choice(INSTITUTIONS)))
+    if rand.random() < 0.3:
+        contacts.append(models.InfoForContracts(
+            human_id=human_id,
+            identity_card_number=u'{0:08d}'.format(human_id),
+            bank_account=u'LT{0:018d}'.format(human_id),
+            bank=u'AB bankas',
+            ))
+    return human, contacts
+
+
+def normalize_login(first_name, last_name):
+    """ Returns ASCII login made from name.
+    """
+
+    return u'{0}.{1}'.format(
+            u''.join(normalization.tokenize(first_name)),
+            u''.join(normalization.tokenize(last_name)))
+
+
+def create_municipalities():
+    """ Creates municipalities, which do not exist yet.
+    """
+
+    existing = set(models.Municipality.objects.values_list(
+        'code', flat=True))
+    bulk.bulk_create(models.Municipality, [
+        models.Municipality(town=town, municipality_type=kind, code=code)
+        for town, kind, code in MUNICIPALITIES
+        if code not in existing])
+    municipalities.reset()
+
+
+def generate(humans, seed=0, chunk_size=CHUNK_SIZE, dedupe_keys=True):
+    """ Creates ``humans`` humans with contacts and all derived data.
+    Generated data depends only on ``seed``.
+    """
+
+    rand = random.Random(seed)
+    create_municipalities()
+    first_id = (models.Human.objects.aggregate(
+        max_id=Max('id'))['max_id'] or 0) + 1
+    human_ids = range(first_id, first_id + humans)
+    for chunk in bulk.chunked(human_ids, chunk_size):
+        with transaction.commit_on_success():
+            new_humans = []
+            contacts = {}
+            for human_id in chunk:
+                human, human_contacts = make_human(rand, human_id)
+                new_humans.append(human)
+                for contact in human_contacts:
+                    contacts.setdefault(type(contact), []).append(contact)
+            bulk.bulk_create(models.Human, new_humans)
+            for model, objects in contacts.items():
+                bulk.bulk_create(model, objects)
+            search.rebuild_chunk([
+                (human.id, human.first_name, human.last_name,
+                 human.old_last_name)
+                for human in new_humans])
+            set_main_addresses(chunk)
+            summaries.rebuild(chunk)
+            if dedupe_keys:
+                dedupe.rebuild_keys(chunk)
+    cursor = connection.cursor()
+    for sql in connection.ops.sequence_reset_sql(
+            no_style(), [models.Human]):
+        cursor.execute(sql)
+    transaction.commit_unless_managed()
+
+
+def set_main_addresses(human_ids):
+    """ Sets first address of every human as the main one.
+    """
+
+    main_addresses = {}
+    for human_id, address_id in models.Address.objects.filter(
+            human__in=human_ids).order_by('-id').values_list(
+            'human_id', 'id'):
+        main_addresses[human_id] = address_id
+    for human_id, address_id in main_addresses.items():
+        models.Human.objects.filter(id=human_id).update(
+                main_address=address_id)
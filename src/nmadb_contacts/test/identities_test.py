@@ -0,0 +1,74 @@
+#!/usr/bin/python
+
+
+import datetime
+
+from django.test import TestCase
+
+from nmadb_contacts import identities
+from nmadb_contacts import identity
+from nmadb_contacts import models
+
+
+def make_code(prefix):
+    return prefix + unicode(identity.get_checksum(prefix))
+
+
+class IdentityCodeTest(TestCase):
+    """ Checks decoding of identity codes and bulk verification.
+    """
+
+    def setUp(self):
+        self.male = make_code(u'3950312123')
+        self.female = make_code(u'6011231004')
+
+    def test_decode(self):
+        self.assertEqual(
+                identity.decode(self.male),
+                (datetime.date(1995, 3, 12), u'M'))
+        self.assertEqual(
+                identity.decode(self.female),
+                (datetime.date(2001, 12, 31), u'F'))
+        self.assertEqual(
+                identity.decode(make_code(u'4011231004')),
+                (datetime.date(1901, 12, 31), u'F'))
+        invalid = self.male[:10] + unicode((int(self.male[10]) + 1) % 10)
+        self.assertEqual(identity.decode(invalid), None)
+        self.assertEqual(identity.decode(u'39503121'), None)
+
+    def test_filled_on_save(self):
+        human = models.Human.objects.create(
+                first_name=u'Jonas', last_name=u'Jonaitis',
+                identity_code=self.male)
+        self.assertEqual(
+                (human.birth_date, human.gender),
+                (datetime.date(1995, 3, 12), u'M'))
+
+    def test_check(self):
+        invalid = self.male[:10] + unicode((int(self.male[10]) + 1) % 10)
+        models.Human.objects.bulk_create([
+            models.Human(
+                id=1, first_name=u'Jonas', last_name=u'Jonaitis',
+                identity_code=self.male),
+            models.Human(
+                id=2, first_name=u'Ona', last_name=u'Onaite',
+                gender=u'M', identity_code=self.female),
+            models.Human(
+                id=3, first_name=u'Petras', last_name=u'Petraitis',
+                gender=u'M', identity_code=invalid),
+            ])
+        filled, mismatches = identities.check()
+        self.assertEqual(filled, 3)
+        self.assertEqual(
+                [(mismatch.human_id, mismatch.field)
+                 for mismatch in mismatches],
+                [(2, u'gender'), (3, u'identity_code')])
+        self.assertEqual(
+                models.Human.objects.filter(id=1).values_list(
+                    'birth_date', 'gender')[0],
+                (datetime.date(1995, 3, 12), u'M'))
+        self.assertEqual(
+                models.Human.objects.get(id=2).birth_date,
+                datetime.date(2001, 12, 31))
+        filled, mismatches = identities.check()
+        self.assertEqual((filled, len(mismatches)), (0, 2))
@@ -0,0 +1,141 @@
+#!/usr/bin/python
+
+
+import datetime
+import StringIO
+
+from django.db import IntegrityError
+from django.test import TestCase, TransactionTestCase
+
+from nmadb_contacts import identity
+from nmadb_contacts import importer
+from nmadb_contacts import models
+
+
+HEADER = (
+        'first_name,last_name,gender,birth_date,identity_code,'
+        'email,phone,town,address,institution\n')
+
+
+def make_code(prefix):
+    return prefix + unicode(identity.get_checksum(prefix))
+
+
+class FailingImporter(importer.Importer):
+    """ Importer, which fails chunks containing line 3 after importing
+    them.
+    """
+
+    def import_chunk(self, chunk):
+        super(FailingImporter, self).import_chunk(chunk)
+        if 3 in [line for line, _ in chunk]:
+            raise IntegrityError(u'duplicate key')
+
+
+def run_import(lines, importer_class=importer.Importer,
+               chunk_size=importer.CHUNK_SIZE):
+    contacts_importer = importer_class(chunk_size)
+    contacts_importer.import_csv(
+            StringIO.StringIO((HEADER + u''.join(lines)).encode('utf-8')))
+    return contacts_importer
+
+
+class ImporterTest(TestCase):
+    """ Checks bulk import of humans and their contacts.
+    """
+
+    def setUp(self):
+        self.male = make_code(u'3950312123')
+        self.female = make_code(u'4011231004')
+
+    def test_import(self):
+        lyceum = models.CanonicalInstitution.objects.create(
+                title=u'Vilniaus licejus')
+        result = run_import([
+            u'Jonas,Jonaitis,,,{0},jonas@example.com,,Vilnius,'
+            u'Gatve 1,Vilniaus Licejus\n'.format(self.male),
+            u'Ona,Onaite,F,2001-12-31,,ona@example.com,,,,\n',
+            u'Jonas,Jonaitis,,,,JONAS@example.com,861234567,,,\n',
+            u'Petras,,M,,,,,Kaunas,,\n',
+            ])
+        self.assertEqual((result.created, result.attached), (2, 0))
+        self.assertEqual([line for line, _ in result.errors], [5])
+        jonas = models.Human.objects.get(identity_code=self.male)
+        self.assertEqual(
+                (jonas.birth_date, jonas.gender),
+                (datetime.date(1995, 3, 12), u'M'))
+        self.assertEqual(jonas.phone_set.get().number_key, u'+37061234567')
+        self.assertEqual(jonas.institution_set.get().canonical, lyceum)
+        self.assertEqual(
+                sorted(models.AuditEntry.objects.filter(
+                    human_id=jonas.id).values_list('model', 'action')),
+                [(u'address', u'C'), (u'email', u'C'), (u'human', u'C'),
+                 (u'institution', u'C'), (u'phone', u'C')])
+        human = models.Human.objects.create(
+                first_name=u'Antanas', last_name=u'Antanaitis',
+                gender=u'M')
+        self.assertTrue(human.id > jonas.id)
+        email = models.Email.objects.create(
+                human=human, address=u'antanas@example.com')
+        self.assertTrue(email.id > jonas.email_set.get().id)
+
+    def test_attach(self):
+        human = models.Human.objects.create(
+                first_name=u'Jonas', last_name=u'Jonaitis', gender=u'M',
+                identity_code=self.male)
+        models.Email.objects.create(
+                human=human, address=u'jonas@example.com')
+        result = run_import([
+            u'Jonas,Jonaitis,,,{0},,861234567,,,\n'.format(self.male),
+            u',,,,,jonas@example.com,,,,Licejus\n',
+            ])
+        self.assertEqual((result.created, result.attached, result.errors),
+                         (0, 2, []))
+        self.assertEqual(human.phone_set.count(), 1)
+        self.assertEqual(human.institution_set.count(), 1)
+
+    def test_identity_code_conflicts(self):
+        human = models.Human.objects.create(
+                first_name=u'Jonas', last_name=u'Jonaitis', gender=u'M',
+                identity_code=self.male)
+        models.Email.objects.create(
+                human=human, address=u'jonas@example.com')
+        result = run_import([
+            u'Ona,Onaite,,,{0},jonas@example.com,,,,\n'.format(
+                self.female),
+            u'Ona,Onaite,,,{0},ona@example.com,,,,\n'.format(self.female),
+            u'Jonas,Petraitis,M,,,ona@example.com,,,,\n',
+            u'Jonas,Petraitis,,,{0},ona@example.com,,,,\n'.format(
+                make_code(u'3800101000')),
+            ])
+        self.assertEqual((result.created, result.attached), (1, 0))
+        self.assertEqual([line for line, _ in result.errors], [2, 5])
+        self.assertEqual(human.email_set.count(), 1)
+        self.assertEqual(
+                models.Human.objects.get(
+                    identity_code=self.female).email_set.get().address,
+                u'ona@example.com')
+
+
+class FailedChunkTest(TransactionTestCase):
+    """ Checks that chunk, which violates constraints, is rolled back
+    and reported. Needs real transactions.
+    """
+
+    def test_failed_chunk(self):
+        result = run_import([
+            u'Jonas,Jonaitis,M,,,,,,,\n',
+            u'Ona,Onaite,F,,,,,,,\n',
+            u'Petras,,M,,,,,,,\n',
+            u'Antanas,Antanaitis,M,,,,,,,\n',
+            ], importer_class=FailingImporter, chunk_size=3)
+        self.assertEqual(result.created, 1)
+        self.assertEqual(
+                [line for line, _ in result.errors], [4, 2, 3])
+        self.assertEqual(
+                list(models.Human.objects.values_list(
+                    'first_name', flat=True)),
+                [u'Antanas'])
+        self.assertEqual(
+                models.AuditEntry.objects.filter(model=u'human').count(),
+                1)
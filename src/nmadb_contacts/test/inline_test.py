@@ -0,0 +1,94 @@
+#!/usr/bin/python
+
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.forms import widgets
+from django.test import TestCase
+from django.test.client import RequestFactory
+
+import nmadb_contacts.admin                 # Registers model admins.
+from nmadb_contacts import models
+
+
+EMAILS = 25
+
+
+def get_data(formset):
+    """ Returns POST data, which submits unbound ``formset`` unchanged.
+    """
+
+    data = {}
+    management_form = formset.management_form
+    for name in management_form.fields:
+        data[management_form.add_prefix(name)] = unicode(
+                management_form.initial[name])
+    for form in formset.forms:
+        for name, field in form.fields.items():
+            value = form[name].value()
+            if isinstance(field.widget, widgets.NullBooleanSelect):
+                value = {True: u'2', False: u'3'}.get(value, u'1')
+            elif isinstance(field.widget, widgets.CheckboxInput):
+                if not value:
+                    continue
+                value = u'on'
+            elif value is None:
+                continue
+            data[form.add_prefix(name)] = unicode(value)
+    return data
+
+
+class PaginatedInlineTest(TestCase):
+    """ Checks pagination and validation of human change view inlines.
+    """
+
+    def setUp(self):
+        self.human = models.Human.objects.create(
+                first_name=u'Jonas', last_name=u'Jonaitis', gender=u'M')
+        for i in range(EMAILS):
+            models.Email.objects.create(
+                    human=self.human,
+                    address=u'jonas{0}@example.com'.format(i))
+        self.user = User.objects.create_superuser(
+                u'admin', u'admin@example.com', u'admin')
+        human_admin = admin.site._registry[models.Human]
+        self.inline = [
+                inline for inline in human_admin.get_inline_instances(None)
+                if inline.model == models.Email][0]
+
+    def get_formset_class(self, page=None):
+        params = {}
+        if page is not None:
+            params['email_set-page'] = page
+        request = RequestFactory().get('/', params)
+        request.user = self.user
+        return self.inline.get_formset(request, self.human)
+
+    def test_pages(self):
+        formset = self.get_formset_class()(instance=self.human)
+        self.assertEqual(len(formset.forms), 10)
+        self.assertEqual(formset.total, EMAILS)
+        self.assertEqual(formset.page_count, 3)
+        formset = self.get_formset_class(3)(instance=self.human)
+        self.assertEqual(len(formset.forms), 5)
+        self.assertEqual(
+                [page['current'] for page in formset.get_pages()],
+                [False, False, True])
+
+    def test_only_changed_rows_are_validated(self):
+        broken = models.Email.objects.order_by('id')[10]
+        models.Email.objects.filter(id=broken.id).update(address=u'broken')
+        FormSet = self.get_formset_class(2)
+        data = get_data(FormSet(instance=self.human))
+        changed = models.Email.objects.order_by('id')[11]
+        for key, value in data.items():
+            if value == changed.address:
+                data[key] = u'changed@example.com'
+        formset = FormSet(data, instance=self.human)
+        self.assertTrue(formset.is_valid(), formset.errors)
+        formset.save()
+        self.assertEqual(
+                models.Email.objects.get(id=changed.id).address,
+                u'changed@example.com')
+        self.assertEqual(
+                models.Email.objects.get(id=broken.id).address, u'broken')
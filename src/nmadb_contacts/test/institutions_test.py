@@ -0,0 +1,95 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from nmadb_contacts import institutions
+from nmadb_contacts import models
+
+
+class InstitutionMatchTest(TestCase):
+    """ Checks linking of institution titles to canonical institutions.
+    """
+
+    def setUp(self):
+        self.human = models.Human.objects.create(
+                first_name=u'Jonas', last_name=u'Jonaitis', gender=u'M')
+        self.lyceum = models.CanonicalInstitution.objects.create(
+                title=u'Vilniaus licėjus')
+
+    def create(self, title):
+        return models.Institution.objects.create(
+                human=self.human, title=title)
+
+    def test_linked_on_save_by_key(self):
+        self.assertEqual(
+                self.create(u'Vilniaus Licejus ').canonical, self.lyceum)
+        self.assertEqual(self.create(u'Kauno licėjus').canonical, None)
+
+    def test_suggest(self):
+        suggestions = institutions.suggest(u'vilniaus lic')
+        self.assertEqual(suggestions[0][0], self.lyceum)
+        self.assertEqual(institutions.suggest(u'Kaunas'), [])
+
+    def test_match_keys(self):
+        models.CanonicalInstitution.objects.create(title=u'Kauno licėjus')
+        with self.assertNumQueries(3):
+            matched = institutions.match_keys([
+                u'vilniaus licejus', u'vilniaus licejuss',
+                u'kauno licejuss', u'klaipedos gimnazija'])
+        self.assertEqual(
+                dict((key, canonical.title)
+                     for key, canonical in matched.items()),
+                {
+                    u'vilniaus licejus': u'Vilniaus licėjus',
+                    u'vilniaus licejuss': u'Vilniaus licėjus',
+                    u'kauno licejuss': u'Kauno licėjus',
+                    })
+
+    def test_match_all(self):
+        models.Institution.objects.bulk_create([
+            models.Institution(human=self.human, title=title)
+            for title in (
+                u'Vilniaus licėjus', u'Vilniaus licejuss',
+                u'Kauno licėjus', u'kauno Licėjus.')])
+        self.assertEqual(
+                institutions.match_all(),
+                (2, 0, [u'Kauno licėjus', u'kauno Licėjus.']))
+        self.assertEqual(
+                institutions.match_all(create=True), (2, 1, []))
+        self.assertEqual(
+                models.Institution.objects.filter(
+                    canonical__isnull=True).count(), 0)
+
+
+class InstitutionAutocompleteTest(TestCase):
+    """ Checks that autocomplete requires permission to change
+    institutions.
+    """
+
+    urls = 'nmadb_contacts.test.urls'
+
+    def setUp(self):
+        models.CanonicalInstitution.objects.create(
+                title=u'Vilniaus licėjus')
+        self.user = User.objects.create_user(
+                u'staff', u'staff@example.com', u'staff')
+        self.user.is_staff = True
+        self.user.save()
+        self.client.login(username=u'staff', password=u'staff')
+        self.url = reverse(
+                'admin:nmadb_contacts_canonicalinstitution_autocomplete')
+
+    def test_permission_required(self):
+        response = self.client.get(self.url, {'term': u'vilniaus'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_suggestions(self):
+        self.user.is_superuser = True
+        self.user.save()
+        response = self.client.get(self.url, {'term': u'vilniaus'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(u'Vilniaus lic' in response.content.decode('utf-8'))
@@ -0,0 +1,153 @@
+#!/usr/bin/python
+
+
+import datetime
+import smtplib
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from nmadb_contacts import mailqueue
+from nmadb_contacts import models
+from nmadb_contacts.test import generator
+
+
+HUMANS = 20
+
+
+class FlakyBackend(locmem.EmailBackend):
+    """ Email backend, which fails every second message.
+    """
+
+    calls = 0
+
+    def send_messages(self, messages):
+        FlakyBackend.calls += 1
+        if FlakyBackend.calls % 2:
+            raise smtplib.SMTPServerDisconnected(u'Try again.')
+        return super(FlakyBackend, self).send_messages(messages)
+
+
+class FailingBackend(locmem.EmailBackend):
+    """ Email backend, which fails every message.
+    """
+
+    def send_messages(self, messages):
+        raise smtplib.SMTPServerDisconnected(u'Try again.')
+
+
+class CountingBackend(locmem.EmailBackend):
+    """ Email backend, which counts opened connections.
+    """
+
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+
+
+class MailQueueTest(TestCase):
+    """ Checks that mail actions only queue jobs and workers send them.
+    """
+
+    urls = 'nmadb_contacts.test.urls'
+
+    def setUp(self):
+        generator.generate(HUMANS, dedupe_keys=False)
+        User.objects.create_superuser(
+                u'admin', u'admin@example.com', u'admin')
+        self.client.login(username=u'admin', password=u'admin')
+        self.human_ids = list(models.Human.objects.values_list(
+            'id', flat=True))
+        self.addresses = set(models.Email.objects.filter(
+            human__in=self.human_ids).exclude(used=False).values_list(
+            'address', flat=True))
+
+    def queue(self):
+        response = self.client.post(
+                reverse('admin:nmadb_contacts_human_changelist'),
+                {
+                    'action': 'queue_mail',
+                    'index': 0,
+                    '_selected_action': self.human_ids,
+                    'subject': u'Hello {{ human.first_name }}',
+                    'body': u'Dear {{ human }}, & welcome.',
+                    'apply': u'1',
+                    })
+        self.assertEqual(response.status_code, 302)
+        return models.MailDispatchJob.objects.get()
+
+    def work(self, **kwargs):
+        mailqueue.work(mailqueue.RateLimiter(0), retry_delay=0, **kwargs)
+        return models.MailDispatchJob.objects.get()
+
+    def test_action_only_queues(self):
+        job = self.queue()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(job.status, models.MailDispatchJob.STATUS_PENDING)
+        self.assertEqual(job.get_object_ids(), sorted(self.human_ids))
+
+    def test_worker_sends_in_chunks(self):
+        self.queue()
+        job = self.work(chunk_size=3)
+        self.assertEqual(job.status, models.MailDispatchJob.STATUS_DONE)
+        self.assertEqual(job.processed, HUMANS)
+        self.assertEqual(job.sent, len(self.addresses))
+        self.assertEqual(
+                set(message.to[0] for message in mail.outbox),
+                self.addresses)
+        message = mail.outbox[0]
+        self.assertTrue(message.subject.startswith(u'Hello '))
+        self.assertTrue(message.body.endswith(u'& welcome.'))
+        self.assertFalse(models.Email.objects.filter(
+            address__in=self.addresses, last_time_used=None).exists())
+        self.assertEqual(mailqueue.claim(), None)
+
+    @override_settings(
+            EMAIL_BACKEND='nmadb_contacts.test.mailqueue_test.FlakyBackend')
+    def test_worker_retries(self):
+        self.queue()
+        job = self.work(retries=1)
+        self.assertEqual(job.sent, len(self.addresses))
+        self.assertEqual(job.failed, 0)
+        job.status = models.MailDispatchJob.STATUS_PENDING
+        job.processed = job.sent = 0
+        job.save()
+        job = self.work(retries=0)
+        self.assertEqual(job.sent + job.failed, len(self.addresses))
+        self.assertTrue(job.failed > 0)
+
+    @override_settings(
+            EMAIL_BACKEND='nmadb_contacts.test.mailqueue_test.'
+                          'FailingBackend')
+    def test_failed_emails_are_not_marked(self):
+        self.queue()
+        job = self.work(retries=0)
+        self.assertEqual(job.failed, len(self.addresses))
+        self.assertFalse(models.Email.objects.filter(
+            address__in=self.addresses,
+            last_time_used__isnull=False).exists())
+
+    @override_settings(
+            EMAIL_BACKEND='nmadb_contacts.test.mailqueue_test.'
+                          'CountingBackend')
+    def test_connection_per_chunk(self):
+        CountingBackend.opened = 0
+        self.queue()
+        self.work(chunk_size=5)
+        self.assertEqual(CountingBackend.opened, HUMANS // 5)
+
+    def test_expired_lease_is_reclaimed(self):
+        queued = self.queue()
+        self.assertEqual(mailqueue.claim().id, queued.id)
+        self.assertEqual(mailqueue.claim(), None)
+        models.MailDispatchJob.objects.update(
+                leased_until=timezone.now() - datetime.timedelta(seconds=1))
+        job = mailqueue.claim()
+        self.assertEqual(job.id, queued.id)
+        self.assertTrue(job.leased_until > timezone.now())
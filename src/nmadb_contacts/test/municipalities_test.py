@@ -0,0 +1,92 @@
+#!/usr/bin/python
+
+
+from django.test import TestCase
+
+from nmadb_contacts import models
+from nmadb_contacts import municipalities
+
+
+class MunicipalityCacheTest(TestCase):
+    """ Checks that municipalities are loaded once and reloaded after
+    changes.
+    """
+
+    def setUp(self):
+        municipalities.reset()
+        self.town = models.Municipality.objects.create(
+                town=u'Vilnius', municipality_type=u'T', code=13)
+        self.district = models.Municipality.objects.create(
+                town=u'Vilnius', municipality_type=u'D', code=41)
+        municipalities.reset()
+
+    def test_loaded_once(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(municipalities.get(self.town.id), self.town)
+            self.assertEqual(municipalities.get_by_code(41), self.district)
+            self.assertEqual(
+                    len(municipalities.cache.find_by_town(u' vilnius ')),
+                    2)
+            self.assertEqual(len(municipalities.cache.all()), 2)
+
+    def test_dictionaries_are_replaced_together(self):
+        data = municipalities.cache._load()
+        self.assertTrue(municipalities.cache._load() is data)
+        municipalities.cache.invalidate()
+        self.assertTrue(municipalities.cache._data is None)
+        self.assertFalse(municipalities.cache._load() is data)
+
+    def test_invalidated_on_save(self):
+        municipalities.cache.all()
+        kaunas = models.Municipality.objects.create(
+                town=u'Kaunas', municipality_type=u'T', code=19)
+        self.assertEqual(municipalities.get_by_code(19), kaunas)
+        kaunas.delete()
+        self.assertEqual(municipalities.get_by_code(19), None)
+
+
+class ResolveAddressTest(TestCase):
+    """ Checks resolving of address municipalities by town.
+    """
+
+    def setUp(self):
+        municipalities.reset()
+        self.town = models.Municipality.objects.create(
+                town=u'Vilnius', municipality_type=u'T', code=13)
+        models.Municipality.objects.create(
+                town=u'Vilnius', municipality_type=u'D', code=41)
+        self.alytus = models.Municipality.objects.create(
+                town=u'Alytus', municipality_type=u'D', code=33)
+        self.human = models.Human.objects.create(
+                first_name=u'Jonas', last_name=u'Jonaitis', gender=u'M')
+
+    def test_resolve_town(self):
+        resolve_town = municipalities.resolve_town
+        self.assertEqual(resolve_town(u'VILNIUS'), self.town)
+        self.assertEqual(resolve_town(u'Alytus'), self.alytus)
+        self.assertEqual(resolve_town(u'Kaunas'), None)
+
+    def test_resolved_on_save(self):
+        address = models.Address.objects.create(
+                human=self.human, town=u'vilnius', address=u'Gatve 1')
+        self.assertEqual(address.municipality, self.town)
+
+    def test_resolve_addresses(self):
+        models.Address.objects.bulk_create([
+            models.Address(human=self.human, town=town, address=address)
+            for town, address in (
+                (u'Vilnius', u'Gatve 1'),
+                (u'vilnius', u'Gatve 2'),
+                (u'Alytus', u'Gatve 3'),
+                (u'Kaunas', u'Gatve 4'))])
+        count, unresolved = municipalities.resolve_addresses()
+        self.assertEqual((count, unresolved), (3, [u'Kaunas']))
+        self.assertEqual(
+                dict(models.Address.objects.values_list(
+                    'address', 'municipality')),
+                {
+                    u'Gatve 1': self.town.id,
+                    u'Gatve 2': self.town.id,
+                    u'Gatve 3': self.alytus.id,
+                    u'Gatve 4': None,
+                    })
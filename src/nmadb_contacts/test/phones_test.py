@@ -0,0 +1,96 @@
+#!/usr/bin/python
+
+
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from nmadb_contacts import models
+from nmadb_contacts import phones
+from nmadb_contacts.normalization import normalize_phone
+
+
+class NormalizePhoneTest(TestCase):
+    """ Checks conversion of phone numbers to E.164.
+    """
+
+    def test_formats(self):
+        for number in (
+                u'+370 612 34567', u'+37061234567', u'861234567',
+                u'8 (612) 345-67', u'00370 612 34567', u'61234567',
+                u'370 612 34567'):
+            self.assertEqual(normalize_phone(number), u'+37061234567')
+
+    def test_foreign(self):
+        self.assertEqual(
+                normalize_phone(u'+44 20 7946 0958'), u'+442079460958')
+        self.assertEqual(
+                normalize_phone(u'0044 20 7946 0958'), u'+442079460958')
+
+    def test_invalid(self):
+        for number in (None, u'', u'12345', u'call me', u'8612'):
+            self.assertEqual(normalize_phone(number), None)
+
+
+class PhoneLookupTest(TestCase):
+    """ Checks lookup of humans by differently written numbers.
+    """
+
+    def setUp(self):
+        self.human = models.Human.objects.create(
+                first_name=u'Jonas', last_name=u'Jonaitis', gender=u'M')
+        self.phone = models.Phone.objects.create(
+                human=self.human, number=u'+370 612 34567')
+
+    def test_key_is_kept_up_to_date(self):
+        self.assertEqual(
+                models.Phone.objects.get().number_key, u'+37061234567')
+
+    def test_lookup(self):
+        with self.assertNumQueries(1):
+            humans = phones.lookup_phones(
+                    [u'861234567', u'8 612 00000', u'garbage'])
+        self.assertEqual(humans, {
+            u'861234567': self.human,
+            u'8 612 00000': None,
+            u'garbage': None,
+            })
+
+    def test_duplicate_is_rejected(self):
+        phone = models.Phone(human=self.human, number=u'861234567')
+        self.assertRaises(ValidationError, phone.full_clean)
+
+    def test_backfill(self):
+        other = models.Human.objects.create(
+                first_name=u'Ona', last_name=u'Onaite', gender=u'F')
+        models.Phone.objects.update(number_key=None)
+        models.Phone.objects.bulk_create([
+            models.Phone(human=other, number=u'861234567')])
+        duplicate = models.Phone.objects.get(number=u'861234567')
+        conflicts = phones.backfill(chunk_size=1)
+        self.assertEqual(
+                conflicts,
+                [(duplicate.id, u'861234567', u'+37061234567')])
+        self.assertEqual(
+                models.Phone.objects.get(id=self.phone.id).number_key,
+                u'+37061234567')
+
+    def test_backfill_exchanged_keys(self):
+        other = models.Human.objects.create(
+                first_name=u'Ona', last_name=u'Onaite', gender=u'F')
+        phone = models.Phone.objects.create(
+                human=other, number=u'+370 612 00000')
+        models.Phone.objects.filter(id=self.phone.id).update(
+                number_key=None)
+        models.Phone.objects.filter(id=phone.id).update(
+                number_key=u'+37061234567')
+        models.Phone.objects.filter(id=self.phone.id).update(
+                number_key=u'+37061200000')
+        with self.assertNumQueries(5):
+            conflicts = phones.backfill()
+        self.assertEqual(conflicts, [])
+        self.assertEqual(
+                dict(models.Phone.objects.values_list('id', 'number_key')),
+                {
+                    self.phone.id: u'+37061234567',
+                    phone.id: u'+37061200000',
+                    })
@@ -0,0 +1,67 @@
+#!/usr/bin/python
+
+
+from django.test import TestCase
+
+from nmadb_contacts import changefeed
+from nmadb_contacts import mailqueue
+from nmadb_contacts import models
+from nmadb_contacts import segments
+
+
+class SegmentTest(TestCase):
+    """ Checks that segment members follow contact changes.
+    """
+
+    def setUp(self):
+        # Entries of tests are settled as soon as they are written.
+        self.old_commit_lag = changefeed.COMMIT_LAG
+        changefeed.COMMIT_LAG = -1
+        self.municipality = models.Municipality.objects.create(
+                town=u'Vilnius', municipality_type=u'T', code=13)
+        self.humans = []
+        for i, gender in enumerate((u'M', u'F', u'M')):
+            human = models.Human.objects.create(
+                    first_name=u'Vardas', last_name=u'Pavarde{0}'.format(i),
+                    gender=gender)
+            models.Email.objects.create(
+                    human=human, address=u'{0}@example.com'.format(i))
+            self.humans.append(human)
+        address = models.Address.objects.create(
+                human=self.humans[0], town=u'Vilnius', address=u'Gatve 1',
+                municipality=self.municipality)
+        self.humans[0].main_address = address
+        self.humans[0].save()
+        self.segment = models.Segment.objects.create(
+                title=u'Vilniaus vyrai', gender=u'M',
+                municipality_type=u'T', with_used_email=True)
+
+    def tearDown(self):
+        changefeed.COMMIT_LAG = self.old_commit_lag
+
+    def get_member_ids(self):
+        return sorted(self.segment.members.values_list(
+            'human_id', flat=True))
+
+    def test_rebuild_on_save(self):
+        self.assertEqual(self.get_member_ids(), [self.humans[0].id])
+        self.assertEqual(self.segment.size, 1)
+
+    def test_refresh(self):
+        human = self.humans[2]
+        address = models.Address.objects.create(
+                human=human, town=u'Vilnius', address=u'Gatve 2',
+                municipality=self.municipality)
+        human.main_address = address
+        human.save()
+        models.Email.objects.filter(human=self.humans[0]).update(used=False)
+        models.Email.objects.get(human=self.humans[0]).save()
+        self.assertEqual(segments.refresh(self.segment), 2)
+        self.assertEqual(self.get_member_ids(), [human.id])
+        self.assertEqual(segments.refresh(self.segment), 0)
+
+    def test_queue_mail(self):
+        job = mailqueue.queue(
+                u'human', segments.get_members([self.segment]),
+                u'Subject', u'Body')
+        self.assertEqual(job.get_object_ids(), [self.humans[0].id])
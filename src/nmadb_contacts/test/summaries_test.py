@@ -0,0 +1,85 @@
+#!/usr/bin/python
+
+
+from django.test import TestCase
+
+from nmadb_contacts import models
+from nmadb_contacts import summaries
+
+
+class SummaryTest(TestCase):
+    """ Checks that contact summaries stored on humans follow their
+    contacts.
+    """
+
+    def setUp(self):
+        self.human = models.Human.objects.create(
+                first_name=u'Jonas', last_name=u'Jonaitis', gender=u'M')
+
+    def get_human(self):
+        return models.Human.objects.get(id=self.human.id)
+
+    def test_contacts(self):
+        models.Phone.objects.create(
+                human=self.human, number=u'+37061234567')
+        models.Phone.objects.create(
+                human=self.human, number=u'+37061200000', used=False)
+        email = models.Email.objects.create(
+                human=self.human, address=u'jonas@example.com')
+        models.Email.objects.create(
+                human=self.human, address=u'jonas@example.org')
+        human = self.get_human()
+        self.assertEqual(human.phone_numbers, u'+37061234567')
+        self.assertEqual(
+                human.email_addresses,
+                u'jonas@example.com, jonas@example.org')
+        email.delete()
+        self.assertEqual(
+                self.get_human().email_addresses, u'jonas@example.org')
+
+    def test_main_address_and_contracts_info(self):
+        address = models.Address.objects.create(
+                human=self.human, town=u'Vilnius', address=u'Gatve 1')
+        self.human.main_address = address
+        self.human.save()
+        models.InfoForContracts.objects.create(human=self.human)
+        human = self.get_human()
+        self.assertEqual(human.main_address_text, u'Gatve 1')
+        self.assertTrue(human.has_contracts_info)
+        address.address = u'Gatve 2'
+        address.save()
+        self.assertEqual(self.get_human().main_address_text, u'Gatve 2')
+
+    def test_rebuild_all(self):
+        models.Phone.objects.bulk_create([
+            models.Phone(human=self.human, number=u'+37061234567')])
+        self.assertEqual(self.get_human().phone_numbers, u'')
+        summaries.rebuild_all()
+        self.assertEqual(self.get_human().phone_numbers, u'+37061234567')
+        with self.assertNumQueries(4):
+            # Unchanged summaries are not updated.
+            summaries.rebuild([self.human.id])
+
+    def test_rebuild_updates_chunk_with_one_query(self):
+        other = models.Human.objects.create(
+                first_name=u'Ona', last_name=u'Onaite', gender=u'F')
+        models.Phone.objects.bulk_create([
+            models.Phone(human=self.human, number=u'+37061234567'),
+            models.Phone(human=other, number=u'+37061200000')])
+        with self.assertNumQueries(5):
+            summaries.rebuild([self.human.id, other.id])
+        self.assertEqual(
+                models.Human.objects.get(id=other.id).phone_numbers,
+                u'+37061200000')
+
+    def test_long_summary_is_marked(self):
+        addresses = [
+                u'jonas{0}@example.com'.format(i) for i in range(20)]
+        summary = summaries.join(addresses, 'email_addresses')
+        max_length = models.Human._meta.get_field(
+                'email_addresses').max_length
+        self.assertEqual(len(summary), max_length)
+        self.assertTrue(summary.endswith(summaries.ELLIPSIS))
+        self.assertEqual(
+                summaries.join(addresses[:2], 'email_addresses'),
+                u'jonas0@example.com, jonas1@example.com')
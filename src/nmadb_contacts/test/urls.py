@@ -0,0 +1,13 @@
+""" URL configuration used by tests, which request admin pages.
+"""
+
+from django.conf.urls import include, patterns, url
+from django.contrib import admin
+
+import nmadb_contacts.admin                 # Registers model admins.
+
+
+urlpatterns = patterns(
+        '',
+        url(r'^admin/', include(admin.site.urls)),
+        )